@@ -0,0 +1,241 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from pagination import (
+    KEYSET_SORTS,
+    decode_cursor,
+    encode_cursor,
+    keyset_order,
+    keyset_where,
+)
+from search import SEARCH_RANK, SEARCH_WHERE
+
+# JSON catalog API (/api/v1): query building and serialization. Clients pick
+# the fields they need (?fields=id,title,price), so only those columns are
+# read and sent; lists page with opaque ?after= cursors (keyset, no OFFSET
+# scan) and come back as {"data": [...], "next": cursor or null}.
+
+MAX_LIMIT = 100
+DEFAULT_LIMIT = 24
+MAX_OFFSET = 2**63 - 1  # OFFSET is a bigint
+
+# field -> SQL over books b / authors a / categories c
+BOOK_FIELDS = {
+    "id": "b.id",
+    "title": "b.title",
+    "author_id": "b.author_id",
+    "author": "a.name",
+    "category_id": "b.category_id",
+    "category": "c.name",
+    "price": "b.price",
+    "description": "b.description",
+    "date_added": "b.date_added",
+    # stored upload names; the caller turns them into URLs
+    "cover_url": "b.cover",
+    "file_url": "b.file",
+}
+DEFAULT_BOOK_FIELDS = ("id", "title", "author", "category", "price", "cover_url")
+
+AUTHOR_FIELDS = {
+    "id": "a.id",
+    "name": "a.name",
+    "book_count": "(SELECT COUNT(*) FROM books b WHERE b.author_id = a.id)",
+}
+DEFAULT_AUTHOR_FIELDS = ("id", "name")
+
+CATEGORY_FIELDS = ("id", "name", "book_count")
+
+
+class BadRequest(ValueError):
+    """Invalid query parameter; the message is shown to the client."""
+
+
+def parse_fields(raw, allowed, default):
+    if not raw:
+        return list(default)
+    fields = list(dict.fromkeys(f.strip() for f in raw.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown or not fields:
+        raise BadRequest(f"unknown field(s): {', '.join(unknown)}; allowed: {', '.join(allowed)}")
+    return fields
+
+
+def is_number(raw):
+    """Plain ASCII digits: str.isdigit() also accepts "²" and friends, which int() rejects."""
+    return raw.isascii() and raw.isdigit()
+
+
+def _is_int(value):
+    # JSON true/false decode to bool, a subclass of int
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_limit(raw):
+    if not raw:
+        return DEFAULT_LIMIT
+    if not is_number(raw) or not 1 <= int(raw) <= MAX_LIMIT:
+        raise BadRequest(f"limit must be between 1 and {MAX_LIMIT}")
+    return int(raw)
+
+
+def parse_cursor(raw):
+    if not raw:
+        return None
+    values = decode_cursor(raw)
+    if values is None:
+        raise BadRequest("malformed cursor")
+    return values
+
+
+def _select(fields, field_sql, internal):
+    """SELECT list: requested fields, then internal keys prefixed with "_"."""
+    cols = [f"{field_sql[f]} AS {f}" for f in fields]
+    cols += [f"{sql} AS _{name}" for name, sql in internal]
+    return ", ".join(cols)
+
+
+# --- Books ---
+def books_query(fields, tsquery, category_id, author_id, sort, cursor, limit):
+    """(sql, params, sort) for one page of books plus one extra row to detect more.
+
+    Rows carry the requested fields and the "_"-prefixed keys that
+    page_result() needs to build the next cursor.
+    """
+    if sort == "relevance" and not tsquery:
+        sort = "newest"
+    if sort != "relevance" and sort not in KEYSET_SORTS:
+        raise BadRequest(f"sort must be one of: relevance, {', '.join(KEYSET_SORTS)}")
+
+    where, params = [], []
+    if tsquery:
+        where.append(SEARCH_WHERE)
+        params.append(tsquery)
+    if category_id:
+        where.append("b.category_id = %s")
+        params.append(category_id)
+    if author_id:
+        where.append("b.author_id = %s")
+        params.append(author_id)
+
+    offset = 0
+    internal = [("id", "b.id")]
+    if sort == "relevance":
+        # ranks are floats: page by position instead of by value
+        if cursor is not None:
+            if len(cursor) != 1 or not _is_int(cursor[0]) or not 0 <= cursor[0] <= MAX_OFFSET:
+                raise BadRequest("cursor does not match this sort")
+            offset = cursor[0]
+        order_sql = f"{SEARCH_RANK} DESC, b.id DESC"
+        order_params = [tsquery]
+    else:
+        spec = KEYSET_SORTS[sort]
+        if spec.column is not None:
+            internal.append(("key", spec.column))
+        if cursor is not None:
+            keyset = keyset_where(spec, cursor)
+            if keyset is None:
+                raise BadRequest("cursor does not match this sort")
+            clause, cursor_params = keyset
+            where.append(clause)
+            params += cursor_params
+        order_sql = keyset_order(spec)
+        order_params = []
+
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    sql = f"""
+        SELECT {_select(fields, BOOK_FIELDS, internal)}
+        FROM books b
+        JOIN authors a ON a.id = b.author_id
+        JOIN categories c ON c.id = b.category_id
+        {where_sql}
+        ORDER BY {order_sql}
+        LIMIT %s OFFSET %s
+    """
+    return sql, params + order_params + [limit + 1, offset], sort
+
+
+def book_query(fields, book_id):
+    sql = f"""
+        SELECT {_select(fields, BOOK_FIELDS, [("id", "b.id")])}
+        FROM books b
+        JOIN authors a ON a.id = b.author_id
+        JOIN categories c ON c.id = b.category_id
+        WHERE b.id = %s
+    """
+    return sql, [book_id]
+
+
+def wishlist_query(fields, user_id, cursor, limit, sort_spec):
+    """A user's wishlisted books, newest first (sort_spec: keyset on w.created_at)."""
+    clause, cursor_params = "TRUE", []
+    if cursor is not None:
+        keyset = keyset_where(sort_spec, cursor)
+        if keyset is None:
+            raise BadRequest("malformed cursor")
+        clause, cursor_params = keyset
+    internal = [("id", "b.id"), ("key", sort_spec.column)]
+    sql = f"""
+        SELECT {_select(fields, dict(BOOK_FIELDS, wishlisted_at="w.created_at"), internal)}
+        FROM wishlists w
+        JOIN books b ON b.id = w.book_id
+        JOIN authors a ON a.id = b.author_id
+        JOIN categories c ON c.id = b.category_id
+        WHERE w.user_id = %s AND {clause}
+        ORDER BY {keyset_order(sort_spec)}
+        LIMIT %s
+    """
+    return sql, [user_id, *cursor_params, limit + 1]
+
+
+# --- Authors ---
+def authors_query(fields, q, cursor, limit):
+    where, params = [], []
+    if q:
+        where.append("LOWER(a.name) LIKE %s")
+        params.append("%" + q.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+    if cursor is not None:
+        if len(cursor) != 1 or not _is_int(cursor[0]):
+            raise BadRequest("malformed cursor")
+        where.append("a.id > %s")
+        params.append(cursor[0])
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    sql = f"""
+        SELECT {_select(fields, AUTHOR_FIELDS, [("id", "a.id")])}
+        FROM authors a
+        {where_sql}
+        ORDER BY a.id
+        LIMIT %s
+    """
+    return sql, params + [limit + 1]
+
+
+# --- Results ---
+def page_result(rows, limit, sort=None, cursor=None):
+    """Split the limit+1 rows into (items without "_" keys, next cursor or None)."""
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if more and rows:
+        last = rows[-1]
+        if sort == "relevance":
+            next_cursor = encode_cursor([(cursor[0] if cursor else 0) + limit])
+        elif "_key" in last:
+            next_cursor = encode_cursor([last["_key"], last["_id"]])
+        else:
+            next_cursor = encode_cursor([last["_id"]])
+    items = [{k: v for k, v in r.items() if not k.startswith("_")} for r in rows]
+    return items, next_cursor
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """Compact JSON (no spaces, UTF-8 kept as is)."""
+    return json.dumps(payload, default=_default, separators=(",", ":"), ensure_ascii=False)
@@ -8,25 +8,82 @@ from flask import (
     redirect,
     session,
     flash,
-    current_app,
     abort,
+    send_file,
+    stream_with_context,
+    g,
+    has_app_context,
+    has_request_context,
+    jsonify,
+    before_render_template,
+    template_rendered,
 )
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash, safe_join
+from werkzeug.middleware.proxy_fix import ProxyFix
 from functools import wraps
 from psycopg2 import errors
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import uuid
 from pathlib import Path
 from werkzeug.utils import secure_filename
-import itertools
 from flask_wtf import CSRFProtect
-from datetime import date
+from datetime import date, datetime
+import click
+import csv
+import io
+import json
+import math
+import signal
+import time
+import mimetypes
+import api
+import auth
+import compress
+import images
+import importer
+import jobs
+import mail
+import metrics
+import migrate
+import outbox
+import related
+import replicas
+import storage
+import wishlist
+from dbpool import PoolTimeout, get_pool
+from cache import TTLCache
+from batch import QueryBatch
+from httpcache import (
+    IMMUTABLE,
+    NO_STORE,
+    REVALIDATE_PRIVATE,
+    VersionClock,
+    cache_policy,
+    make_etag,
+    policy_for,
+    source_fingerprint,
+)
+from search import SEARCH_RANK, SEARCH_WHERE, build_tsquery
+from pagination import (
+    KEYSET_SORTS,
+    KeysetSort,
+    count_query,
+    cursor_for,
+    decode_cursor,
+    keyset_order,
+    keyset_where,
+)
 
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "COUGS")
 
 csrf = CSRFProtect(app)
 
+# Behind a load balancer (Render, nginx): trust this many X-Forwarded-* hops,
+# so request.remote_addr (used by the login throttle) is the client's address
+if os.getenv("PROXY_HOPS"):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.getenv("PROXY_HOPS")), x_proto=1)
+
 is_prod = os.getenv("FLASK_ENV") == "production"
 app.config.update(
     WTF_CSRF_TIME_LIMIT=None,
@@ -39,12 +96,20 @@ app.config.update(
 BASE_DIR = Path(__file__).resolve().parent
 COVERS_DIR = BASE_DIR / "static" / "uploads" / "covers"
 FILES_DIR = BASE_DIR / "static" / "uploads" / "files"
+STATIC_DIR = BASE_DIR / "static"
+# Uploads are spooled here while hashed (same filesystem, so placing them is a rename)
+UPLOAD_TMP_DIR = Path(app.instance_path) / "uploads-tmp"
 COVERS_DIR.mkdir(parents=True, exist_ok=True)
 FILES_DIR.mkdir(parents=True, exist_ok=True)
 
 # Max upload size (e.g., 16 MB)
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024
 
+# Store result counts: "exact", "estimate" (planner rows) or "auto"
+# (exact unless the planner expects more than STORE_EXACT_COUNT_LIMIT rows)
+STORE_COUNT_MODE = os.getenv("STORE_COUNT_MODE", "auto")
+STORE_EXACT_COUNT_LIMIT = int(os.getenv("STORE_EXACT_COUNT_LIMIT", "10000"))
+
 ALLOWED_COVER_EXTS = {"png", "jpg", "jpeg", "gif", "webp"}
 ALLOWED_FILE_EXTS = {"pdf", "epub", "mobi", "txt"}
 
@@ -58,33 +123,326 @@ def allowed(filename: str, allowed_set: set[str]) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in allowed_set
 
 
-def save_unique(dirpath, original):
-    safe = secure_filename(original)
-    stem, ext = os.path.splitext(safe)
-    candidate = safe
-    for i in itertools.count(1):
-        path = dirpath / candidate
-        if not path.exists():
-            return candidate, path
-        candidate = f"{stem}_{i}{ext}"
+def upload_rel_path(value, folder):
+    """books.cover/file value -> path relative to /static (same rules as the template macros)."""
+    f = value or ""
+    if f.startswith("static/"):
+        f = f[7:]
+    if not f:
+        return ""
+    return f if f.startswith("uploads/") else f"uploads/{folder}/{f}"
+
+
+# --- Upload storage ---
+# Uploads are stored under their sha256 (uploads/<folder>/ab/<hash>.<ext>) and
+# reference-counted in upload_blobs, so a repeat upload costs nothing and two
+# workers can never pick the same name for different files.
+def spool_upload(file_storage):
+    """Hash an upload into a temp file; leftovers are removed at request teardown."""
+    ext = file_storage.filename.rsplit(".", 1)[1].lower()  # checked by allowed()
+    spooled = storage.spool(file_storage.stream, UPLOAD_TMP_DIR, ext)
+    g.setdefault("spooled_uploads", []).append(spooled)
+    return spooled
+
+
+@app.teardown_request
+def discard_spooled_uploads(exc):
+    for spooled in g.pop("spooled_uploads", []):
+        storage.discard(spooled)  # no-op once placed
+
+
+def release_upload(cur, value, folder):
+    """Drop a book's reference to an upload (inside the caller's transaction).
+
+    The last reference queues the file's deletion as a background job.
+    """
+    rel = upload_rel_path(value, folder)
+    if storage.release(cur, rel):
+        jobs.enqueue(cur, "uploads.collect", {"path": rel, "folder": folder})
+
+
+def release_book_uploads(cur, books):
+    """release_upload() for the cover and file of many deleted books at once."""
+    rels = [upload_rel_path(b["cover"], "covers") for b in books]
+    rels += [upload_rel_path(b["file"], "files") for b in books]
+    unreferenced = storage.release_many(cur, rels)
+    jobs.enqueue_many(
+        cur,
+        "uploads.collect",
+        [{"path": rel, "folder": rel.split("/")[1]} for rel in unreferenced],
+    )
+
+
+# --- Metrics ---
+# Per-request timings (SQL, pool wait, templates) feed Prometheus histograms
+# served at /metrics and a Server-Timing header; see metrics.py.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+registry = metrics.Registry()
+metrics_snapshots = metrics.SnapshotDir(
+    Path(app.instance_path) / "metrics",
+    registry,
+    every=float(os.getenv("METRICS_FLUSH_INTERVAL", "10")),
+)
+slow_queries = metrics.SlowQueryLog(threshold=SLOW_QUERY_MS / 1000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 20, 50, 100)
+
+
+def metrics_endpoint():
+    if not has_request_context():
+        return "-"  # CLI commands and background jobs
+    return request.endpoint or "unmatched"
+
+
+def record_query(seconds, sql):
+    """Called by every pooled cursor after each statement."""
+    endpoint = metrics_endpoint()
+    registry.observe(
+        "db_query_duration_seconds",
+        "SQL statement duration",
+        seconds,
+        metrics.QUERY_BUCKETS,
+        endpoint=endpoint,
+    )
+    if has_request_context():
+        g.db_time = g.get("db_time", 0.0) + seconds
+        g.db_queries = g.get("db_queries", 0) + 1
+    slow = slow_queries.maybe_add(seconds, sql, endpoint=endpoint)
+    if slow:
+        registry.inc("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", endpoint=endpoint)
+        print(f"Slow query ({slow['ms']} ms, {endpoint}): {slow['sql'][:500]}")
+
+
+def timed_cursor(factory):
+    return metrics.timed_cursor(factory, record_query)
+
+
+@before_render_template.connect_via(app)
+def start_template_timer(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault("template_starts", []).append(time.perf_counter())
+
+
+@template_rendered.connect_via(app)
+def stop_template_timer(sender, template, context, **extra):
+    if not has_request_context() or not g.get("template_starts"):
+        return
+    seconds = time.perf_counter() - g.template_starts.pop()
+    registry.observe(
+        "template_render_seconds", "render_template duration", seconds, template=template.name or "-"
+    )
+    if not g.template_starts:  # nested renders are already inside the outer one
+        g.template_time = g.get("template_time", 0.0) + seconds
 
 
-def get_db_connection():
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get("request_started")
+    if started is None:
+        return response
+    total = time.perf_counter() - started
+    endpoint = metrics_endpoint()
+    registry.inc(
+        "http_requests_total",
+        "Requests by endpoint, method and status",
+        endpoint=endpoint,
+        method=request.method,
+        status=str(response.status_code),
+    )
+    registry.observe(
+        "http_request_duration_seconds",
+        "Time until the response is returned (streamed bodies excluded)",
+        total,
+        endpoint=endpoint,
+    )
+    registry.observe(
+        "db_queries_per_request",
+        "SQL statements per request",
+        g.get("db_queries", 0),
+        QUERY_COUNT_BUCKETS,
+        endpoint=endpoint,
+    )
+    if g.get("pool_wait") is not None:
+        registry.observe("db_pool_wait_seconds", "Time to check a connection out of the pool", g.pool_wait)
+
+    if SERVER_TIMING:
+        parts = [f'db;dur={g.get("db_time", 0.0) * 1000:.1f};desc="{g.get("db_queries", 0)} queries"']
+        if g.get("pool_wait") is not None:
+            parts.append(f"pool;dur={g.pool_wait * 1000:.1f}")
+        if g.get("template_time") is not None:
+            parts.append(f"tpl;dur={g.template_time * 1000:.1f}")
+        parts.append(f"app;dur={total * 1000:.1f}")
+        response.headers.add("Server-Timing", ", ".join(parts))
+
+    try:
+        metrics_snapshots.maybe_write()
+    except OSError as e:
+        print(f"Error writing metrics snapshot: {e}")
+    return response
+
+
+# Prometheus scrape target: sums the snapshots of every live worker
+@app.route("/metrics")
+def metrics_page():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        abort(401)
+    return app.response_class(
+        metrics.render(metrics_snapshots.collect()),
+        mimetype="text/plain; version=0.0.4",
+    )
+
+
+def with_param(url, name, value):
+    """Add ?name=value to a postgresql:// URL unless it already sets it."""
+    if f"{name}=" not in url:
+        sep = "&" if "?" in url else "?"
+        url = f"{url}{sep}{name}={value}"
+    return url
+
+
+def with_sslmode(url):
+    return with_param(url, "sslmode", "require")
+
+
+def database_dsn():
     url = os.getenv("DATABASE_URL")
     if url:
-        if "sslmode=" not in url:
-            sep = "&" if "?" in url else "?"
-            url = f"{url}{sep}sslmode=require"
-        conn = psycopg2.connect(url)
-    else:
-        conn = psycopg2.connect(
-            host="localhost", database="flask_db", user="postgres", password="Lalo"
-        )
-    with conn.cursor() as cur:
-        cur.execute("SET search_path TO public;")
+        return with_sslmode(url)
+    return "host=localhost dbname=flask_db user=postgres password=Lalo"
+
+
+# Per-worker pool settings (each gunicorn worker gets its own pool)
+DB_POOL_OPTIONS = dict(
+    minconn=int(os.getenv("DB_POOL_MIN", "1")),
+    maxconn=int(os.getenv("DB_POOL_MAX", "5")),
+    timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    max_idle=float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+    max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+    check_after=float(os.getenv("DB_POOL_CHECK_AFTER", "30")),
+    cursor_wrapper=timed_cursor,
+)
+
+# Optional read replicas (comma-separated DSNs) for the public catalog pages;
+# everything else, and anything a replica can't serve fresh enough, reads
+# from the primary. See replicas.py.
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("REPLICA_CONNECT_TIMEOUT", "2"))
+replica_set = replicas.ReplicaSet(
+    [
+        # an unreachable replica must not hold a request for the OS TCP timeout
+        with_param(with_sslmode(u.strip()), "connect_timeout", REPLICA_CONNECT_TIMEOUT)
+        for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+        if u.strip()
+    ],
+    max_lag=float(os.getenv("REPLICA_MAX_LAG", "5")),
+    check_interval=float(os.getenv("REPLICA_CHECK_INTERVAL", "2")),
+    retry_after=float(os.getenv("REPLICA_RETRY_AFTER", "30")),
+    probe_timeout=REPLICA_CONNECT_TIMEOUT,
+)
+# After a signed-in user's write, their reads stay on the primary this long
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "15"))
+
+
+def get_db_connection(primary=False):
+    """Check a connection out of this worker's pool.
+
+    conn.close() returns it to the pool; anything a route forgets to close
+    is handed back at the end of the request. On public catalog pages the
+    connection may come from a read replica unless primary=True.
+    """
+    started = time.perf_counter()
+    dsn = database_dsn()
+    replica = None
+    if not primary and has_request_context() and g.get("replica_reads"):
+        # a replica that has replayed at least the catalog version this worker knows
+        replica = replica_set.pick(catalog_clock.get()[0])
+    try:
+        conn = get_pool(replica or dsn, **DB_POOL_OPTIONS).getconn()
+    except psycopg2.OperationalError as e:
+        if replica is None:
+            raise
+        if not isinstance(e, PoolTimeout):  # busy is not down: just use the primary this time
+            replica_set.mark_down(replica, e)
+        replica = None
+        conn = get_pool(dsn, **DB_POOL_OPTIONS).getconn()
+    registry.inc(
+        "db_checkouts_total",
+        "Connections checked out, by server",
+        target="replica" if replica else "primary",
+    )
+    if has_request_context():
+        g.pool_wait = g.get("pool_wait", 0.0) + time.perf_counter() - started
+    if has_app_context():
+        g.setdefault("db_conns", []).append((conn, conn.lease))
     return conn
 
 
+@app.teardown_appcontext
+def release_db_connections(exc):
+    for conn, lease in g.pop("db_conns", []):
+        conn.release(lease)
+
+
+@app.before_request
+def route_reads():
+    """Let public catalog GETs read from a replica, unless this session just wrote."""
+    if not replica_set:
+        return
+    kind, _ = policy_for(app.view_functions.get(request.endpoint))
+    g.replica_reads = (
+        kind == "public"
+        and request.method in ("GET", "HEAD")
+        and session.get("primary_until", 0) < time.time()
+    )
+
+
+@app.after_request
+def stick_to_primary(response):
+    # read-your-writes: e.g. the book page edit_book redirects to shows the edit
+    if (
+        replica_set
+        and session.get("user_id")
+        and request.method not in ("GET", "HEAD", "OPTIONS")
+        and response.status_code < 400
+    ):
+        session["primary_until"] = time.time() + REPLICA_STICKY_SECONDS
+    return response
+
+
+# --- Passwords and login throttling ---
+# werkzeug hash method for new hashes; older hashes are upgraded at login
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+hash_pool = auth.HashPool(
+    workers=int(os.getenv("HASH_WORKERS", "2")),
+    queue=int(os.getenv("HASH_QUEUE", "8")),
+    timeout=float(os.getenv("HASH_TIMEOUT", "10")),
+)
+LOGIN_THROTTLE_WINDOW = int(os.getenv("LOGIN_THROTTLE_WINDOW", "900"))
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "5"))  # per account
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "20"))
+REGISTER_MAX_PER_IP = int(os.getenv("REGISTER_MAX_PER_IP", "10"))  # per hour
+
+
+def login_limits(email):
+    return [
+        (f"login:account:{email}", LOGIN_MAX_FAILURES, LOGIN_THROTTLE_WINDOW),
+        (f"login:ip:{request.remote_addr}", LOGIN_MAX_FAILURES_PER_IP, LOGIN_THROTTLE_WINDOW),
+    ]
+
+
+HASHING_BUSY = "We're handling a lot of sign-ins right now. Please try again in a moment."
+
+
+def try_again_in(wait):
+    minutes = max(1, round(wait / 60))
+    return f"Try again in {minutes} minute{'s' if minutes != 1 else ''}."
+
+
 # --- INSERT ONE ADMIN (run once, then comment it out) ---
 def seed_admin(full_name, email, raw_password, conn):
     cur = conn.cursor()
@@ -92,35 +450,12 @@ def seed_admin(full_name, email, raw_password, conn):
     if not cur.fetchone():
         cur.execute(
             "INSERT INTO admin (full_name, email, password_hash) VALUES (%s, %s, %s);",
-            (full_name, email, generate_password_hash(raw_password)),
+            (full_name, email, generate_password_hash(raw_password, PASSWORD_HASH_METHOD)),
         )
         conn.commit()
     cur.close()
 
 
-# --- Fetchers ---
-def get_admin_by_email(conn, email):
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, full_name, email, password_hash FROM admin WHERE email=%s;",
-        (email,),
-    )
-    row = cur.fetchone()
-    cur.close()
-    return row  # (id, full_name, email, password_hash) or None
-
-
-def get_user_by_email(conn, email):
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, full_name, email, password_hash FROM users WHERE email=%s;",
-        (email,),
-    )
-    row = cur.fetchone()
-    cur.close()
-    return row
-
-
 # --- Session guards ---
 def login_required(f):
     @wraps(f)
@@ -146,6 +481,156 @@ def role_required(required_role):
     return deco
 
 
+# --- Catalog reference data (cached per worker) ---
+catalog_cache = TTLCache(ttl=float(os.getenv("CATALOG_CACHE_TTL", "300")))
+
+CATEGORY_COUNTS_SQL = """
+    SELECT c.id, c.name, COUNT(b.id) AS book_count
+    FROM categories c
+    LEFT JOIN books b ON b.category_id = c.id
+    GROUP BY c.id, c.name
+    ORDER BY c.name;
+"""
+CATALOG_COUNTS_SQL = """
+    SELECT (SELECT COUNT(*) FROM books) AS books,
+           (SELECT COUNT(*) FROM authors) AS authors,
+           (SELECT COUNT(*) FROM categories) AS categories;
+"""
+AUTHOR_OPTIONS_SQL = "SELECT id, name FROM authors ORDER BY name;"
+CATEGORY_OPTIONS_SQL = "SELECT id, name FROM categories ORDER BY name;"
+
+# Which cached entries each kind of write makes stale
+BOOK_KEYS = ("category_counts", "catalog_counts")
+AUTHOR_KEYS = ("author_options", "catalog_counts")
+CATEGORY_KEYS = ("category_options", "category_counts", "catalog_counts")
+
+
+# key -> (batch kind, SQL); "rows" = list of rows, "one" = single row
+CATALOG_QUERIES = {
+    "category_counts": ("rows", CATEGORY_COUNTS_SQL),
+    "catalog_counts": ("one", CATALOG_COUNTS_SQL),
+    "author_options": ("rows", AUTHOR_OPTIONS_SQL),
+    "category_options": ("rows", CATEGORY_OPTIONS_SQL),
+}
+
+
+def queue_catalog(batch, *keys):
+    """Add cached reference data to a batch; only cache misses hit the DB."""
+    for key in keys:
+        kind, sql = CATALOG_QUERIES[key]
+        batch.cached(catalog_cache, key, kind, sql)
+    return batch
+
+
+def load_catalog(key):
+    value = catalog_cache.get(key)
+    if value is None:
+        conn = get_db_connection()
+        with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            value = queue_catalog(QueryBatch(), key).run(cur)[key]
+        conn.close()
+    return value
+
+
+def get_category_counts():
+    return load_catalog("category_counts")
+
+
+def get_catalog_counts():
+    """{"books": n, "authors": n, "categories": n}"""
+    return load_catalog("catalog_counts")
+
+
+def get_author_options():
+    return load_catalog("author_options")
+
+
+def get_category_options():
+    return load_catalog("category_options")
+
+
+def invalidate_catalog(*keys):
+    catalog_cache.invalidate(*keys)
+    clear_render_cache()
+    catalog_clock.expire()
+
+
+def catalog_changed():
+    catalog_cache.invalidate()
+    clear_render_cache()
+
+
+# --- HTTP caching ---
+# Public catalog pages: seconds browsers/proxies may reuse a page before revalidating
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "60"))
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "86400"))
+BUILD_ID = source_fingerprint(BASE_DIR)
+
+
+def load_catalog_state():
+    """(version, updated_at) of the catalog, bumped by triggers on every write."""
+    conn = get_db_connection(primary=True)
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT version, updated_at FROM catalog_state WHERE id = 1;")
+        row = cur.fetchone()
+    conn.close()
+    return tuple(row) if row else (0, None)
+
+
+# Re-read every few seconds; a version moved by another worker also clears
+# this worker's reference-data cache
+catalog_clock = VersionClock(
+    load_catalog_state,
+    ttl=float(os.getenv("CATALOG_VERSION_TTL", "5")),
+    on_change=catalog_changed,
+)
+
+
+# --- Render cache ---
+# Anonymous catalog pages and book card fragments, rendered once per catalog
+# version. Keys carry the version, so a write seen through catalog_clock (from
+# any worker) retires old entries; clearing them just frees the memory.
+page_cache = TTLCache(
+    ttl=float(os.getenv("PAGE_CACHE_TTL", "300")),
+    maxsize=int(os.getenv("PAGE_CACHE_SIZE", "200")),
+)
+fragment_cache = TTLCache(
+    ttl=float(os.getenv("PAGE_CACHE_TTL", "300")),
+    maxsize=int(os.getenv("FRAGMENT_CACHE_SIZE", "5000")),
+)
+
+
+def clear_render_cache():
+    page_cache.invalidate()
+    fragment_cache.invalidate()
+    compressed_pages.invalidate()
+
+
+def shared_render():
+    """True when this request renders the same HTML for every visitor."""
+    return not session.get("user_id") and "_flashes" not in session
+
+
+def page_cache_key(version):
+    # Normalized: argument order and empty values (?q=&sort=) don't matter
+    args = sorted((k, v) for k, v in request.args.items(multi=True) if v.strip())
+    view_args = sorted((request.view_args or {}).items())
+    return (request.endpoint, tuple(view_args), tuple(args), version, BUILD_ID)
+
+
+def cached_fragment(*key, caller):
+    """{% call cached_fragment(name, ...) %}...{% endcall %} renders the body once per catalog version."""
+    full_key = key + (catalog_clock.get()[0], BUILD_ID)
+    html = fragment_cache.get(full_key)
+    if html is None:
+        html = caller()
+        fragment_cache.set(full_key, html)
+    return html
+
+
+app.jinja_env.globals["cached_fragment"] = cached_fragment
+
+
 # try:
 #     conn = get_db_connection()
 #     seed_admin("Eduardo Flores", "admin@example.com", "admin", conn)
@@ -154,146 +639,306 @@ def role_required(required_role):
 #     print("Admin seed error:", e)
 
 
+# --- Compression ---
+# gzip/brotli for text responses above COMPRESS_MIN_SIZE (see compress.py).
+# Registered before the page cache and cache-policy hooks, so it runs after
+# them: the page cache keeps plain HTML, and cached pages keep their
+# compressed bodies in compressed_pages instead of being recompressed.
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVELS = {
+    "gzip": int(os.getenv("GZIP_LEVEL", "6")),
+    "br": int(os.getenv("BROTLI_QUALITY", "5")),
+}
+compressed_pages = TTLCache(
+    ttl=float(os.getenv("PAGE_CACHE_TTL", "300")),
+    maxsize=2 * int(os.getenv("PAGE_CACHE_SIZE", "200")),
+)
+
+
+@app.before_request
+def serve_precompressed_static():
+    """static/foo.css as foo.css.br / foo.css.gz when `flask compress-static` wrote them."""
+    if request.endpoint != "static" or request.method not in ("GET", "HEAD"):
+        return None
+    filename = (request.view_args or {}).get("filename", "")
+    path = safe_join(str(STATIC_DIR), filename)
+    if not path:
+        return None
+    encoding = compress.negotiate(request.accept_encodings)
+    sibling = compress.precompressed(path, encoding) if encoding else None
+    if not sibling:
+        if any(compress.precompressed(path, e) for e in compress.available()):
+            # plain copy of a file that has compressed variants: shared caches must key on it
+            response = app.send_static_file(filename)
+            response.vary.add("Accept-Encoding")
+            return response
+        return None
+    response = send_file(
+        sibling,
+        mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream",
+        conditional=True,
+    )
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    if (
+        response.status_code != 200
+        or response.direct_passthrough  # files: precompressed siblings or sent as is
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or not compress.compressible(response.mimetype)
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    encoding = compress.negotiate(request.accept_encodings)
+    if len(data) < COMPRESS_MIN_SIZE or not encoding:
+        return response
+
+    def packed():
+        return compress.compress(data, encoding, COMPRESS_LEVELS[encoding])
+
+    cache_state = response.headers.get("X-Cache")
+    if cache_state == "HIT":
+        body = compressed_pages.get_or_load((g.page_cache_key, encoding), packed)
+    else:
+        body = packed()
+        if cache_state == "MISS":  # this exact body was just stored in the page cache
+            compressed_pages.set((g.page_cache_key, encoding), body)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+@app.cli.command("compress-static")
+@click.option("--force", is_flag=True, help="Rewrite siblings that are up to date.")
+def compress_static_command(force):
+    """Write .br/.gz copies of static text assets (run on deploy)."""
+    if "br" not in compress.available():
+        print("Brotli is not installed: writing .gz files only.")
+    saved = 0
+    for rel, encoding, size, packed in compress.precompress_tree(
+        STATIC_DIR, exclude=("uploads",), min_size=COMPRESS_MIN_SIZE, force=force
+    ):
+        saved += size - packed
+        print(f"{rel}.{'br' if encoding == 'br' else 'gz'}: {size} -> {packed} bytes")
+    print(f"Done ({saved} bytes saved per full download).")
+
+
 # --- Dashboards ---
 
 
 # Home page (fetches books)
 @app.route("/")
+@cache_policy("public")
 def index():
-    conn = get_db_connection()
-    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        # New arrivals / main grid (newest first)
-        cur.execute(
-            """
-            SELECT b.id, b.title,
-                   a.name AS author,
-                   c.name AS category,
-                   b.description, b.price, b.cover, b.file, b.id AS sort_id
-            FROM books b
-            JOIN authors a ON a.id = b.author_id
-            JOIN categories c ON c.id = b.category_id
-            ORDER BY sort_id DESC
-            LIMIT 24;
+    # One round trip: new arrivals plus whatever reference data isn't cached
+    batch = QueryBatch().rows(
+        "new_books",
         """
-        )
-        new_books = cur.fetchall()
-
-        # Featured (use newest 5 for now)
-        cur.execute(
-            """
-            SELECT b.id, b.title,
-                   a.name AS author,
-                   c.name AS category,
-                   b.description, b.price, b.cover, b.file
-            FROM books b
-            JOIN authors a ON a.id = b.author_id
-            JOIN categories c ON c.id = b.category_id
-            ORDER BY b.id DESC
-            LIMIT 5;
-        """
-        )
-        featured_books = cur.fetchall()
-
-        # Categories for hero chips (with counts)
-        cur.execute(
-            """
-            SELECT c.id, c.name, COUNT(b.id) AS book_count
-            FROM categories c
-            LEFT JOIN books b ON b.category_id = c.id
-            GROUP BY c.id, c.name
-            ORDER BY c.name;
-        """
-        )
-        categories = cur.fetchall()
-
-        # Simple counts
-        cur.execute("SELECT COUNT(*) AS n FROM books;")
-        books_count = cur.fetchone()["n"]
-        cur.execute("SELECT COUNT(*) AS n FROM authors;")
-        authors_count = cur.fetchone()["n"]
-        cur.execute("SELECT COUNT(*) AS n FROM categories;")
-        categories_count = cur.fetchone()["n"]
+        SELECT b.id, b.title,
+               a.name AS author,
+               c.name AS category,
+               b.description, b.price, b.cover, b.file
+        FROM books b
+        JOIN authors a ON a.id = b.author_id
+        JOIN categories c ON c.id = b.category_id
+        ORDER BY b.id DESC
+        LIMIT 24
+        """,
+    )
+    queue_catalog(batch, "category_counts", "catalog_counts")
 
+    conn = get_db_connection()
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        data = batch.run(cur)
     conn.close()
+
+    new_books = data["new_books"]
+    # Featured (use newest 5 for now): same ordering, so reuse the new arrivals
+    featured_books = new_books[:5]
+    counts = data["catalog_counts"]
     return render_template(
         "index.html",
         # The template looks for these:
         books=new_books,  # fallback collection
         new_books=new_books,  # "New Arrivals" grid
         featured_books=featured_books,  # carousel + editor's pick
-        categories=categories,  # chips
-        books_count=books_count,
-        authors_count=authors_count,
-        categories_count=categories_count,
+        categories=data["category_counts"],  # chips
+        books_count=counts["books"],
+        authors_count=counts["authors"],
+        categories_count=counts["categories"],
         current_year=date.today().year,
     )
 
 
+# --- Book listings ---
+def page_number(name="page"):
+    try:
+        return max(1, int(request.args.get(name, "1")))
+    except ValueError:
+        return 1
+
+
+def fetch_book_page(
+    cur,
+    columns,
+    where,
+    params,
+    tsquery,
+    sort,
+    page,
+    per_page,
+    count_mode="exact",
+    extra=None,
+):
+    """One page of books (b/a/c joined) for the store and the admin dashboard.
+
+    Sorts from KEYSET_SORTS page with the ?after/?before cursors in the URL,
+    "relevance" (needs a tsquery) and numbered links with OFFSET. The count,
+    the rows and whatever `extra(batch)` queues go in one round trip; the
+    batch results are returned under "data".
+    """
+    # Safe ORDER BY map (b.id breaks ties so pages never overlap)
+    order_map = {name: keyset_order(spec) for name, spec in KEYSET_SORTS.items()}
+    order_map["relevance"] = f"{SEARCH_RANK} DESC, b.id DESC"
+    if sort == "relevance" and not tsquery:
+        sort = "newest"
+    if sort not in order_map:
+        sort = "newest"
+    order_params = [tsquery] if sort == "relevance" else []
+
+    # Keyset mode: ?after=<cursor> / ?before=<cursor> from the Next/Previous links
+    keyset = KEYSET_SORTS.get(sort)
+    backward = bool(request.args.get("before"))
+    cursor_values = decode_cursor(request.args.get("before") or request.args.get("after"))
+    keyset_filter = None
+    if keyset and cursor_values is not None:
+        keyset_filter = keyset_where(keyset, cursor_values, backward)
+
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+    from_sql = f"""
+        FROM books b
+        JOIN authors a ON a.id = b.author_id
+        JOIN categories c ON c.id = b.category_id
+        {where_sql}
+    """
+
+    # ---- Count for pagination (planner estimate for huge result sets) ----
+    count_sql, count_params = count_query(
+        cur, from_sql, params, count_mode, STORE_EXACT_COUNT_LIMIT
+    )
+    select_sql = f"SELECT {columns} {from_sql}"
+
+    def fetch(page):
+        batch = QueryBatch().one("total", count_sql, count_params)
+        if keyset_filter:
+            # ---- Books after/before the cursor (no OFFSET scan) ----
+            clause, cursor_params = keyset_filter
+            joiner = " AND " if where_sql else "WHERE "
+            batch.rows(
+                "books",
+                f"""
+                {select_sql} {joiner} {clause}
+                ORDER BY {keyset_order(keyset, backward)}
+                LIMIT %s
+                """,
+                params + cursor_params + [per_page + 1],
+            )
+        else:
+            # ---- Books (paged) ----
+            batch.rows(
+                "books",
+                f"""
+                {select_sql}
+                ORDER BY {order_map[sort]}
+                LIMIT %s OFFSET %s
+                """,
+                params + order_params + [per_page + 1, (page - 1) * per_page],
+            )
+        if extra:
+            extra(batch)
+        return batch.run(cur)
+
+    data = fetch(page)
+    total_count = data["total"]["n"]
+    count_is_estimate = data["total"]["estimated"]
+    total_pages = max(1, (total_count + per_page - 1) // per_page)
+    books = data["books"]
+
+    if keyset_filter:
+        more = len(books) > per_page
+        books = books[:per_page]
+        if backward:
+            books.reverse()
+        has_prev, has_next = (more, True) if backward else (True, more)
+        if backward and not more:
+            page = 1
+    else:
+        # Page past the end: clamp to the last page and fetch again
+        if not books and page > total_pages and not count_is_estimate:
+            page = total_pages
+            books = fetch(page)["books"]
+        has_prev, has_next = page > 1, len(books) > per_page
+        books = books[:per_page]
+
+    # Cursor links for Previous / Next (relevance pages stay offset-based)
+    prev_cursor = next_cursor = None
+    if keyset and books:
+        if has_prev:
+            prev_cursor = cursor_for(keyset, books[0])
+        if has_next:
+            next_cursor = cursor_for(keyset, books[-1])
+
+    return dict(
+        books=books,
+        total_pages=total_pages,
+        books_total=total_count,
+        count_is_estimate=count_is_estimate,
+        has_prev=has_prev,
+        has_next=has_next,
+        prev_cursor=prev_cursor,
+        next_cursor=next_cursor,
+        page=page,
+        sort=sort,
+        data=data,
+    )
+
+
 # Store page (separate from index if you want a dedicated list view)
 @app.route("/store")
+@cache_policy("public")
 def store():
     # ---- Query params ----
     q = (request.args.get("q") or "").strip()
-    sort = request.args.get("sort", "newest")
-    page = request.args.get("page", "1")
-    try:
-        page = max(1, int(page))
-    except ValueError:
-        page = 1
+    tsquery = build_tsquery(q)
+    sort = request.args.get("sort") or ("relevance" if tsquery else "newest")
+    page = page_number()
 
     category_id_raw = request.args.get("category_id")
     category_id = None
-    if category_id_raw and category_id_raw.isdigit():
+    if category_id_raw and api.is_number(category_id_raw):
         category_id = int(category_id_raw)
 
-    per_page = 12
-
-    # Safe ORDER BY map
-    order_map = {
-        "newest": "b.id DESC",
-        "title_asc": "b.title ASC",
-        "price_asc": "b.price ASC NULLS LAST",
-        "price_desc": "b.price DESC NULLS LAST",
-    }
-    order_by = order_map.get(sort, order_map["newest"])
+    # ---- Build WHERE + params ----
+    where = []
+    params = []
+    if tsquery:
+        where.append(SEARCH_WHERE)
+        params.append(tsquery)
+    if category_id:
+        where.append("b.category_id = %s")
+        params.append(category_id)
 
     conn = get_db_connection()
     with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        # ---- Build WHERE + params ----
-        where = []
-        params = []
-        if q:
-            where.append("(b.title ILIKE %s OR a.name ILIKE %s OR c.name ILIKE %s)")
-            like = f"%{q}%"
-            params += [like, like, like]
-        if category_id:
-            where.append("b.category_id = %s")
-            params.append(category_id)
-
-        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
-
-        # ---- Count for pagination ----
-        cur.execute(
-            f"""
-            SELECT COUNT(*) AS n
-            FROM books b
-            JOIN authors a ON a.id = b.author_id
-            JOIN categories c ON c.id = b.category_id
-            {where_sql}
-            """,
-            params,
-        )
-        total_count = cur.fetchone()["n"]
-        total_pages = max(1, (total_count + per_page - 1) // per_page)
-
-        # Clamp page to range and recompute offset
-        page = min(page, total_pages)
-        offset = (page - 1) * per_page
-
-        # ---- Fetch books (paged) ----
-        cur.execute(
-            f"""
-            SELECT
+        listing = fetch_book_page(
+            cur,
+            """
               b.id,
               b.title,
               a.name AS author,
@@ -302,40 +947,24 @@ def store():
               b.price,
               b.cover,
               b.file
-            FROM books b
-            JOIN authors a ON a.id = b.author_id
-            JOIN categories c ON c.id = b.category_id
-            {where_sql}
-            ORDER BY {order_by}
-            LIMIT %s OFFSET %s;
             """,
-            params + [per_page, offset],
-        )
-        books = cur.fetchall()
-
-        # ---- Categories for chips (global counts) ----
-        cur.execute(
-            """
-            SELECT c.id, c.name, COUNT(b.id) AS book_count
-            FROM categories c
-            LEFT JOIN books b ON b.category_id = c.id
-            GROUP BY c.id, c.name
-            ORDER BY c.name;
-            """
+            where,
+            params,
+            tsquery,
+            sort,
+            page,
+            per_page=12,
+            count_mode=STORE_COUNT_MODE,
+            # ---- Categories for chips (global counts) ----
+            extra=lambda batch: queue_catalog(batch, "category_counts"),
         )
-        categories = cur.fetchall()
-
     conn.close()
 
+    data = listing.pop("data")
     return render_template(
         "store.html",
-        books=books,
-        categories=categories,
-        total_pages=total_pages,
-        books_total=total_count,
-        # these are optional; template reads from request.args, but passing doesn't hurt
-        page=page,
-        sort=sort,
+        categories=data["category_counts"],
+        **listing,
     )
 
 
@@ -345,10 +974,13 @@ def current_user_id():
 
 
 @app.route("/book/<int:book_id>")
+@cache_policy("public")
 def book_view(book_id):
-    conn = get_db_connection()
-    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
+    # Book + its precomputed neighbours (book_neighbors) in one round trip
+    batch = (
+        QueryBatch()
+        .one(
+            "book",
             """
             SELECT b.id, b.title, b.description, b.price, b.cover, b.file,
                    b.author_id, b.category_id,
@@ -356,88 +988,204 @@ def book_view(book_id):
             FROM books b
             JOIN authors a ON a.id = b.author_id
             JOIN categories c ON c.id = b.category_id
-            WHERE b.id = %s;
-        """,
+            WHERE b.id = %s
+            """,
             (book_id,),
         )
-        book = cur.fetchone()
-        if not book:
-            conn.close()
-            abort(404)
-
-        cur.execute(
+        .rows(
+            "related",
             """
             SELECT b.id, b.title, b.description, b.price, b.cover, b.file,
                    a.name AS author, c.name AS category
-            FROM books b
+            FROM book_neighbors n
+            JOIN books b ON b.id = n.neighbor_id
             JOIN authors a ON a.id = b.author_id
             JOIN categories c ON c.id = b.category_id
-            WHERE b.category_id = %s AND b.id <> %s
-            ORDER BY b.id DESC
-            LIMIT 8;
-        """,
-            (book["category_id"], book_id),
+            WHERE n.book_id = %s
+            ORDER BY n.rank
+            LIMIT 8
+            """,
+            (book_id,),
         )
-        related = cur.fetchall()
+    )
+    conn = get_db_connection()
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        data = batch.run(cur)
+        book, related_books = data["book"], data["related"]
+        if book and not related_books:
+            # Not computed yet (new book, worker behind): newest in the same category
+            cur.execute(
+                """
+                SELECT b.id, b.title, b.description, b.price, b.cover, b.file,
+                       a.name AS author, c.name AS category
+                FROM books b
+                JOIN authors a ON a.id = b.author_id
+                JOIN categories c ON c.id = b.category_id
+                WHERE b.category_id = %s AND b.id <> %s
+                ORDER BY b.id DESC
+                LIMIT 8
+                """,
+                (book["category_id"], book_id),
+            )
+            related_books = cur.fetchall()
     conn.close()
 
-    return render_template("view.html", book=book, related=related)
+    if not book:
+        abort(404)
 
+    return render_template("view.html", book=book, related=related_books)
 
-@app.post("/wishlist/toggle/<int:book_id>")
-@login_required
-def wishlist_toggle(book_id):
+
+# --- Wishlist ---
+# Each worker caches a user's wishlisted ids under (user id, revision); the
+# revision lives in the user's session and changes on every toggle, so the
+# next request sees fresh state whichever worker serves it.
+wishlist_cache = TTLCache(
+    ttl=float(os.getenv("WISHLIST_CACHE_TTL", "300")),
+    maxsize=int(os.getenv("WISHLIST_CACHE_SIZE", "1000")),
+)
+WISHLIST_PER_PAGE = 24
+WISHLIST_SORT = KeysetSort("w.created_at", "created_at", True, False, "timestamp")
+
+
+def wishlist_rev():
+    """Changes on every wishlist toggle in this session (cache key and ETag part)."""
+    rev = session.get("wishlist_rev")
+    if rev is None:
+        # New session: never trust an entry cached for an older one
+        rev = session["wishlist_rev"] = uuid.uuid4().hex
+    return rev
+
+
+def wishlist_ids():
+    """Book ids on the signed-in user's wishlist (empty for visitors)."""
     uid = current_user_id()
-    next_url = request.form.get("next") or request.referrer or url_for("me")
+    if not uid:
+        return frozenset()
+    if "wishlist_ids" not in g:
+        rev = wishlist_rev()
+        conn = get_db_connection(primary=True)  # cached per wishlist_rev: must not be stale
+        with conn, conn.cursor() as cur:
+            g.wishlist_ids = wishlist_cache.get_or_load(
+                (uid, rev), lambda: wishlist.book_ids(cur, uid)
+            )
+        conn.close()
+    return g.wishlist_ids
+
 
+app.jinja_env.globals["wishlist_ids"] = wishlist_ids
+
+
+def toggle_wishlist(book_id):
+    """Toggle for the signed-in user; returns the new state (None: no such book)."""
+    uid = current_user_id()
     conn = get_db_connection()
-    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
-            "SELECT 1 FROM wishlists WHERE user_id=%s AND book_id=%s;", (uid, book_id)
-        )
-        exists = cur.fetchone()
-        if exists:
-            cur.execute(
-                "DELETE FROM wishlists WHERE user_id=%s AND book_id=%s;", (uid, book_id)
-            )
-            flash("Removed from wishlist.", "info")
-        else:
-            cur.execute(
-                """
-                INSERT INTO wishlists (user_id, book_id)
-                VALUES (%s, %s)
-                ON CONFLICT DO NOTHING;
-            """,
-                (uid, book_id),
-            )
-            flash("Added to wishlist.", "success")
+    with conn, conn.cursor() as cur:
+        state = wishlist.toggle(cur, uid, book_id)
     conn.close()
+    if state is not None:
+        wishlist_cache.invalidate((uid, session.get("wishlist_rev")))
+        session["wishlist_rev"] = uuid.uuid4().hex
+        g.pop("wishlist_ids", None)
+    return state
+
+
+@app.post("/wishlist/toggle/<int:book_id>")
+@login_required
+def wishlist_toggle(book_id):
+    next_url = request.form.get("next") or request.referrer or url_for("me")
+    state = toggle_wishlist(book_id)
+    if state is None:
+        flash("Book not found.", "danger")
+    elif state:
+        flash("Added to wishlist.", "success")
+    else:
+        flash("Removed from wishlist.", "info")
     return redirect(next_url)
 
 
+# JSON variant for in-page toggling (send the CSRF token as X-CSRFToken)
+@app.route("/api/wishlist", methods=["GET"])
+@app.route("/api/wishlist/<int:book_id>", methods=["POST"])
+def wishlist_api(book_id=None):
+    if not current_user_id():
+        return jsonify(error="login required"), 401
+    if book_id is None:
+        # ?ids=1,2,3 -> which of these are wishlisted
+        ids = {int(v) for v in request.args.get("ids", "").split(",") if api.is_number(v.strip())}
+        return jsonify(wishlisted=sorted(ids & wishlist_ids()))
+    state = toggle_wishlist(book_id)
+    if state is None:
+        return jsonify(error="book not found"), 404
+    return jsonify(book_id=book_id, wishlisted=state, count=len(wishlist_ids()))
+
+
 @app.route("/me")
 @login_required
 def me():
     uid = current_user_id()
-    conn = get_db_connection()
-    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(
-            """
+    page = page_number()
+    backward = bool(request.args.get("before"))
+    cursor_values = decode_cursor(request.args.get("before") or request.args.get("after"))
+    keyset_filter = None
+    if cursor_values is not None:
+        keyset_filter = keyset_where(WISHLIST_SORT, cursor_values, backward)
+    offset = 0
+    if keyset_filter is None:
+        # No (usable) cursor: numbered page links use OFFSET
+        backward = False
+        offset = (page - 1) * WISHLIST_PER_PAGE
+        keyset_filter = ("TRUE", [])
+    clause, cursor_params = keyset_filter
+
+    batch = (
+        QueryBatch()
+        .one("total", "SELECT COUNT(*) AS n FROM wishlists WHERE user_id = %s", (uid,))
+        .rows(
+            "books",
+            f"""
             SELECT b.id, b.title, a.name AS author, c.name AS category,
                    b.description, b.price, b.cover, b.file, w.created_at
             FROM wishlists w
             JOIN books b ON b.id = w.book_id
             JOIN authors a ON a.id = b.author_id
             JOIN categories c ON c.id = b.category_id
-            WHERE w.user_id = %s
-            ORDER BY w.created_at DESC
-            LIMIT 24;
-        """,
-            (uid,),
+            WHERE w.user_id = %s AND {clause}
+            ORDER BY {keyset_order(WISHLIST_SORT, backward)}
+            LIMIT %s OFFSET %s
+            """,
+            [uid, *cursor_params, WISHLIST_PER_PAGE + 1, offset],
         )
-        wishlist = cur.fetchall()
+    )
+    conn = get_db_connection()
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        data = batch.run(cur)
     conn.close()
-    return render_template("user.html", wishlist=wishlist)
+
+    books = data["books"]
+    if not books and page > 1:
+        return redirect(url_for("me"))  # e.g. removed the last book on this page
+    more = len(books) > WISHLIST_PER_PAGE
+    books = books[:WISHLIST_PER_PAGE]
+    if backward:
+        books.reverse()
+        has_prev, has_next = more, True
+        if not more:
+            page = 1
+    else:
+        has_prev, has_next = page > 1, more
+    total = data["total"]["n"]
+    return render_template(
+        "user.html",
+        wishlist=books,
+        wishlist_total=total,
+        page=page,
+        total_pages=max(1, (total + WISHLIST_PER_PAGE - 1) // WISHLIST_PER_PAGE),
+        has_prev=has_prev,
+        has_next=has_next,
+        prev_cursor=cursor_for(WISHLIST_SORT, books[0]) if has_prev and books else None,
+        next_cursor=cursor_for(WISHLIST_SORT, books[-1]) if has_next and books else None,
+    )
 
 
 # Login page
@@ -448,39 +1196,68 @@ def login():
         password = request.form.get("password") or ""
         # honor ?next=/path and also allow a hidden input in the form
         next_url = request.args.get("next") or request.form.get("next")
+        limits = login_limits(email)
 
         conn = get_db_connection()
         try:
-            # 1) Check admin table first
-            row = get_admin_by_email(
-                conn, email
-            )  # expected: (id, name, email, password_hash, ...)
-            if row and check_password_hash(row[3], password):
-                session.clear()  # prevent session fixation
-                session.permanent = True  # optional: use permanent sessions
-                session["user_id"] = row[0]
-                session["role"] = "admin"
-                session["name"] = row[1]
-                return redirect(next_url or url_for("admin"))
-
-            # 2) Else check users table
-            row = get_user_by_email(
-                conn, email
-            )  # expected: (id, name, email, password_hash, ...)
-            if row and check_password_hash(row[3], password):
-                session.clear()
-                session.permanent = True
-                session["user_id"] = row[0]
-                session["role"] = "user"
-                session["name"] = row[1]
-                # 👇 send regular users to the profile page we created
-                return redirect(next_url or url_for("me"))
+            # Admin and user rows plus the throttle counters, in one round trip
+            with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+                data = (
+                    QueryBatch()
+                    .rows("accounts", auth.ACCOUNT_SQL, (email, email))
+                    .rows("throttle", auth.THROTTLE_SQL, auth.throttle_params(limits))
+                    .run(cur)
+                )
+            wait = auth.retry_after(data["throttle"], limits)
+            if wait:
+                flash(f"Too many failed sign-ins. {try_again_in(wait)}", "danger")
+                html = render_template("login.html", next=next_url)
+                return html, 429, {"Retry-After": str(wait)}
+
+            account = None
+            try:
+                for row in data["accounts"] or [None]:
+                    pwhash = row["password_hash"] if row else auth.dummy_hash(PASSWORD_HASH_METHOD)
+                    if hash_pool.check(pwhash, password) and row:
+                        account = row
+                        break
+            except auth.Busy:
+                flash(HASHING_BUSY, "warning")
+                html = render_template("login.html", next=next_url)
+                return html, 503, {"Retry-After": "5"}
+
+            with conn, conn.cursor() as cur:
+                if account is None:
+                    auth.hit(cur, limits)
+                else:
+                    auth.clear(cur, [limits[0][0]])
+                    if auth.needs_rehash(account["password_hash"], PASSWORD_HASH_METHOD):
+                        try:
+                            auth.set_password_hash(
+                                cur,
+                                account["role"],
+                                account["id"],
+                                hash_pool.generate(password, PASSWORD_HASH_METHOD),
+                            )
+                        except auth.Busy:
+                            pass  # upgrade it next time
+        finally:
+            conn.close()
 
+        if account is None:
             # Invalid credentials
             flash("Invalid email or password.", "danger")
             return redirect(url_for("login"))
-        finally:
-            conn.close()
+
+        session.clear()  # prevent session fixation
+        session.permanent = True  # optional: use permanent sessions
+        session["user_id"] = account["id"]
+        session["role"] = account["role"]
+        session["name"] = account["full_name"]
+        if account["role"] == "admin":
+            return redirect(next_url or url_for("admin"))
+        # 👇 send regular users to the profile page we created
+        return redirect(next_url or url_for("me"))
 
     # GET: render page and pass through ?next= so the form can keep it
     return render_template("login.html", next=request.args.get("next"))
@@ -488,26 +1265,194 @@ def login():
 
 # About page
 @app.route("/about")
+@cache_policy("public")
 def about():
+    counts = get_catalog_counts()
+    return render_template(
+        "about.html",
+        books_count=counts["books"],
+        authors_count=counts["authors"],
+        categories_count=counts["categories"],
+        current_year=date.today().year,
+    )
+
+
+# --- JSON API (v1) ---
+# Read-only catalog API for the mobile app and infinite scroll; see api.py.
+# Catalog endpoints are public (ETag + 304, page cache, replicas) like the
+# HTML pages they mirror.
+def api_response(payload, status=200):
+    return app.response_class(api.dumps(payload), status=status, mimetype="application/json")
+
+
+def api_error(message, status=400):
+    return api_response({"error": message}, status)
+
+
+def api_book_urls(rows):
+    """Stored upload names -> URLs for the cover_url/file_url fields."""
+    for r in rows:
+        if "cover_url" in r:
+            rel = upload_rel_path(r["cover_url"], "covers")
+            r["cover_url"] = url_for("static", filename=rel) if rel else None
+        if "file_url" in r:
+            r["file_url"] = url_for("download_book", book_id=r["_id"]) if r["file_url"] else None
+    return rows
+
+
+def api_rows(sql, params):
     conn = get_db_connection()
     with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("SELECT COUNT(*) AS n FROM books;")
-        books_count = cur.fetchone()["n"]
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    conn.close()
+    return rows
+
+
+def optional_id(name):
+    raw = request.args.get(name)
+    if raw and not api.is_number(raw):
+        raise api.BadRequest(f"{name} must be a number")
+    return int(raw) if raw else None
+
+
+@app.errorhandler(api.BadRequest)
+def api_bad_request(e):
+    return api_error(str(e))
+
+
+# GET /api/v1/books?q=&category_id=&author_id=&sort=&fields=&limit=&after=
+@app.route("/api/v1/books")
+@cache_policy("public")
+def api_books():
+    fields = api.parse_fields(request.args.get("fields"), api.BOOK_FIELDS, api.DEFAULT_BOOK_FIELDS)
+    limit = api.parse_limit(request.args.get("limit"))
+    cursor = api.parse_cursor(request.args.get("after"))
+    tsquery = build_tsquery(request.args.get("q"))
+    sql, params, sort = api.books_query(
+        fields,
+        tsquery,
+        optional_id("category_id"),
+        optional_id("author_id"),
+        request.args.get("sort") or ("relevance" if tsquery else "newest"),
+        cursor,
+        limit,
+    )
+    items, next_cursor = api.page_result(api_book_urls(api_rows(sql, params)), limit, sort, cursor)
+    return api_response({"data": items, "next": next_cursor})
+
+
+@app.route("/api/v1/books/<int:book_id>")
+@cache_policy("public")
+def api_book(book_id):
+    fields = api.parse_fields(request.args.get("fields"), api.BOOK_FIELDS, api.BOOK_FIELDS)
+    rows = api_book_urls(api_rows(*api.book_query(fields, book_id)))
+    if not rows:
+        return api_error("book not found", 404)
+    items, _ = api.page_result(rows, 1)
+    return api_response({"data": items[0]})
+
+
+# GET /api/v1/authors?q=&fields=id,name,book_count&limit=&after=
+@app.route("/api/v1/authors")
+@cache_policy("public")
+def api_authors():
+    fields = api.parse_fields(request.args.get("fields"), api.AUTHOR_FIELDS, api.DEFAULT_AUTHOR_FIELDS)
+    limit = api.parse_limit(request.args.get("limit"))
+    cursor = api.parse_cursor(request.args.get("after"))
+    q = (request.args.get("q") or "").strip()
+    items, next_cursor = api.page_result(
+        api_rows(*api.authors_query(fields, q, cursor, limit)), limit
+    )
+    return api_response({"data": items, "next": next_cursor})
 
-        cur.execute("SELECT COUNT(*) AS n FROM authors;")
-        authors_count = cur.fetchone()["n"]
 
-        cur.execute("SELECT COUNT(*) AS n FROM categories;")
-        categories_count = cur.fetchone()["n"]
-    conn.close()
+# All categories with their book counts (from the catalog cache)
+@app.route("/api/v1/categories")
+@cache_policy("public")
+def api_categories():
+    fields = api.parse_fields(request.args.get("fields"), api.CATEGORY_FIELDS, api.CATEGORY_FIELDS)
+    items = [{f: c[f] for f in fields} for c in get_category_counts()]
+    return api_response({"data": items, "next": None})
 
-    return render_template(
-        "about.html",
-        books_count=books_count,
-        authors_count=authors_count,
-        categories_count=categories_count,
-        current_year=date.today().year,
+
+# The signed-in user's wishlist, newest first
+@app.route("/api/v1/wishlist")
+def api_wishlist():
+    uid = current_user_id()
+    if not uid:
+        return api_error("login required", 401)
+    allowed = dict(api.BOOK_FIELDS, wishlisted_at=None)
+    fields = api.parse_fields(
+        request.args.get("fields"), allowed, (*api.DEFAULT_BOOK_FIELDS, "wishlisted_at")
     )
+    limit = api.parse_limit(request.args.get("limit"))
+    cursor = api.parse_cursor(request.args.get("after"))
+    sql, params = api.wishlist_query(fields, uid, cursor, limit, WISHLIST_SORT)
+    conn = get_db_connection(primary=True)  # toggles must show up right away
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    conn.close()
+    items, next_cursor = api.page_result(api_book_urls(rows), limit)
+    return api_response({"data": items, "next": next_cursor})
+
+
+# --- Contact messages ---
+# The form writes to a local outbox (no DB connection per message); each
+# worker's flusher thread inserts them in batches and queues the copy emails.
+CONTACT_OUTBOX_DIR = Path(app.instance_path) / "outbox" / "contact"
+CONTACT_FIELD_LIMITS = {"name": 150, "email": 255, "subject": 200, "message": 5000}
+MAIL_FROM = os.getenv("MAIL_FROM", "Bookstore <no-reply@localhost>")
+mailer = mail.backend_from_url(os.getenv("MAIL_URL", "console"))
+
+
+def store_contact_messages(records):
+    """Outbox flush: insert a batch (re-sent records are skipped) and queue the copies."""
+    conn = get_db_connection()
+    try:
+        with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            rows = execute_values(
+                cur,
+                """
+                INSERT INTO contact_messages
+                  (outbox_id, name, email, subject, message, want_copy, ip, user_agent, created_at)
+                VALUES %s
+                ON CONFLICT (outbox_id) DO NOTHING
+                RETURNING id, want_copy;
+                """,
+                [
+                    (
+                        r["outbox_id"],
+                        r["name"],
+                        r["email"],
+                        r["subject"],
+                        r["message"],
+                        r["want_copy"],
+                        r["ip"],
+                        r["user_agent"],
+                        r["created_at"],
+                    )
+                    for r in records
+                ],
+                page_size=len(records),
+                fetch=True,
+            )
+            jobs.enqueue_many(
+                cur, "contact.copy", [{"id": r["id"]} for r in rows if r["want_copy"]]
+            )
+    finally:
+        conn.close()
+
+
+contact_outbox = outbox.Outbox(
+    CONTACT_OUTBOX_DIR,
+    store_contact_messages,
+    batch_size=int(os.getenv("CONTACT_BATCH_SIZE", "100")),
+    interval=float(os.getenv("CONTACT_FLUSH_INTERVAL", "5")),
+    max_pending=int(os.getenv("CONTACT_OUTBOX_MAX", "10000")),
+)
+contact_outbox.resume()  # messages spooled before a restart go out without waiting for a new one
 
 
 # Contact page
@@ -527,22 +1472,34 @@ def contact():
         if not (name and email and subject and message):
             flash("Please complete all fields.", "warning")
             return redirect(url_for("contact"))
+        if "@" not in email or any(
+            len(value) > CONTACT_FIELD_LIMITS[field]
+            for field, value in (("name", name), ("email", email), ("subject", subject), ("message", message))
+        ):
+            flash(
+                "Please enter a valid email and keep the message under "
+                f"{CONTACT_FIELD_LIMITS['message']} characters.",
+                "warning",
+            )
+            return redirect(url_for("contact"))
 
-        ip = request.remote_addr
-        ua = request.headers.get("User-Agent", "")
-
-        conn = get_db_connection()
-        with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """
-                INSERT INTO contact_messages (name, email, subject, message, want_copy, ip, user_agent)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                RETURNING id;
-            """,
-                (name, email, subject, message, want_copy, ip, ua),
+        try:
+            contact_outbox.put(
+                {
+                    "name": name,
+                    "email": email,
+                    "subject": subject,
+                    "message": message,
+                    "want_copy": want_copy,
+                    "ip": request.remote_addr,
+                    "user_agent": request.headers.get("User-Agent", "")[:500],
+                    "created_at": datetime.now().astimezone().isoformat(),
+                }
             )
-            msg_id = cur.fetchone()["id"]
-        conn.close()
+        except (outbox.Full, OSError) as e:
+            print("Contact outbox error:", e)
+            flash("We couldn't take your message right now. Please try again later.", "danger")
+            return redirect(url_for("contact"))
 
         flash("Message sent! We'll get back to you soon.", "success")
         return redirect(url_for("contact"))
@@ -550,100 +1507,175 @@ def contact():
     return render_template("contact.html", current_year=date.today().year)
 
 
-# Admin page
+@app.cli.command("flush-outbox")
+def flush_outbox_command():
+    """Store spooled contact messages now (e.g. before moving the instance folder)."""
+    click.echo(f"Stored {contact_outbox.flush()} contact message(s)")
+
+
+# Admin page: every table is paged and sorted in the database
+ADMIN_BOOKS_PER_PAGE = 50
+ADMIN_NAMES_PER_PAGE = 25  # categories / authors
+
+# Lean projection: no full descriptions, just enough to recognize a book
+ADMIN_BOOK_COLUMNS = """
+  b.id,
+  b.title,
+  a.name AS author,
+  LEFT(b.description, 160) AS description,
+  c.name AS category,
+  b.price,
+  b.cover,
+  b.file
+"""
+
+
+def queue_name_page(batch, key, table, fk_column, page):
+    """Queue one page of categories/authors with their book counts, plus the table size."""
+    batch.rows(
+        key,
+        f"""
+        SELECT t.id, t.name,
+               (SELECT COUNT(*) FROM books b WHERE b.{fk_column} = t.id) AS book_count
+        FROM {table} t
+        ORDER BY t.name, t.id
+        LIMIT %s OFFSET %s
+        """,
+        [ADMIN_NAMES_PER_PAGE, (page - 1) * ADMIN_NAMES_PER_PAGE],
+    )
+    batch.scalar(f"{key}_total", f"SELECT COUNT(*) FROM {table}")
+
+
 @app.route("/admin")
 @login_required
 @role_required("admin")
 def admin():
     q = (request.args.get("q") or "").strip()
+    tsquery = build_tsquery(q)
+    sort = request.args.get("sort") or ("relevance" if tsquery else "newest")
+    cpage, apage = page_number("cpage"), page_number("apage")
+
+    def extra(batch):
+        queue_name_page(batch, "categories", "categories", "category_id", cpage)
+        queue_name_page(batch, "authors", "authors", "author_id", apage)
 
     conn = get_db_connection()
     with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        # --- Books (searchable) ---
-        if q:
-            cur.execute(
-                """
-                SELECT
-                  b.id,
-                  b.title,
-                  a.name AS author,
-                  b.description,
-                  c.name AS category,
-                  b.price,
-                  b.cover,
-                  b.file
-                FROM books b
-                JOIN authors a ON a.id = b.author_id
-                JOIN categories c ON c.id = b.category_id
-                WHERE b.title ILIKE %s
-                   OR a.name ILIKE %s
-                   OR c.name ILIKE %s
-                ORDER BY b.id;
-                """,
-                (f"%{q}%", f"%{q}%", f"%{q}%"),
-            )
-        else:
-            cur.execute(
-                """
-                SELECT
-                  b.id,
-                  b.title,
-                  a.name AS author,
-                  b.description,
-                  c.name AS category,
-                  b.price,
-                  b.cover,
-                  b.file
-                FROM books b
-                JOIN authors a ON a.id = b.author_id
-                JOIN categories c ON c.id = b.category_id
-                ORDER BY b.id;
-                """
-            )
-        books = cur.fetchall()
-
-        # --- Categories (not filtered) ---
-        cur.execute(
-            """
-            SELECT
-              c.id,
-              c.name,
-              COUNT(b.id) AS book_count
-            FROM categories c
-            LEFT JOIN books b ON b.category_id = c.id
-            GROUP BY c.id, c.name
-            ORDER BY c.id;
-            """
+        # --- Books (searchable, best matches first) ---
+        listing = fetch_book_page(
+            cur,
+            ADMIN_BOOK_COLUMNS,
+            [SEARCH_WHERE] if tsquery else [],
+            [tsquery] if tsquery else [],
+            tsquery,
+            sort,
+            page_number(),
+            ADMIN_BOOKS_PER_PAGE,
+            count_mode=STORE_COUNT_MODE,
+            extra=extra,
         )
-        categories = cur.fetchall()
+    conn.close()
 
-        # --- Authors (not filtered) ---
-        cur.execute(
-            """
-            SELECT
-              a.id,
-              a.name,
-              COUNT(b.id) AS book_count
-            FROM authors a
-            LEFT JOIN books b ON b.author_id = a.id
-            GROUP BY a.id, a.name
-            ORDER BY a.id;
-            """
-        )
-        authors = cur.fetchall()
+    data = listing.pop("data")
 
-    conn.close()
+    def pages(total):
+        return max(1, (total + ADMIN_NAMES_PER_PAGE - 1) // ADMIN_NAMES_PER_PAGE)
 
     return render_template(
         "admin.html",
-        books=books,
-        categories=categories,
-        authors=authors,
         search_query=q,  # pass current q to template
-        books_count=len(books),  # handy if you want to show "X results"
+        per_page=ADMIN_BOOKS_PER_PAGE,
+        categories=data["categories"],
+        cpage=cpage,
+        category_pages=pages(data["categories_total"]),
+        authors=data["authors"],
+        apage=apage,
+        author_pages=pages(data["authors_total"]),
+        names_per_page=ADMIN_NAMES_PER_PAGE,
+        category_options=get_category_options(),
+        **listing,
+    )
+
+
+# Whole (filtered) book list as CSV, in the import manifest's column layout.
+# Streams from a server-side cursor, so memory stays flat for any catalog size.
+@app.route("/admin/books.csv")
+@login_required
+@role_required("admin")
+def export_books():
+    tsquery = build_tsquery((request.args.get("q") or "").strip())
+    where_sql = f"WHERE {SEARCH_WHERE}" if tsquery else ""
+    params = [tsquery] if tsquery else []
+
+    def rows():
+        conn = get_db_connection()
+        try:
+            with conn, conn.cursor(name="admin_books_export") as cur:
+                cur.itersize = 2000  # rows per network fetch
+                cur.execute(
+                    f"""
+                    SELECT b.id, b.title, a.name, c.name, b.description, b.price, b.cover, b.file
+                    FROM books b
+                    JOIN authors a ON a.id = b.author_id
+                    JOIN categories c ON c.id = b.category_id
+                    {where_sql}
+                    ORDER BY b.id;
+                    """,
+                    params,
+                )
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                writer.writerow(("id",) + importer.FIELDS)
+                for i, row in enumerate(cur, 1):
+                    writer.writerow(row)
+                    if i % 500 == 0:
+                        yield buf.getvalue()
+                        buf.seek(0)
+                        buf.truncate()
+                yield buf.getvalue()
+        finally:
+            conn.close()
+
+    return app.response_class(
+        stream_with_context(rows()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=books.csv"},
     )
 
 
+# Connection pool statistics for this worker
+@app.route("/admin/pool")
+@login_required
+@role_required("admin")
+def pool_stats():
+    stats = get_pool(database_dsn(), **DB_POOL_OPTIONS).stats()
+    stats["replicas"] = [
+        dict(status, pool=get_pool(r.dsn, **DB_POOL_OPTIONS).stats())
+        for r, status in zip(replica_set.replicas, replica_set.status())
+    ]
+    return jsonify(stats)
+
+
+# Catalog cache statistics for this worker
+@app.route("/admin/cache")
+@login_required
+@role_required("admin")
+def cache_stats():
+    return jsonify(
+        catalog=catalog_cache.stats(),
+        pages=page_cache.stats(),
+        fragments=fragment_cache.stats(),
+    )
+
+
+# Recent slow statements seen by this worker (SLOW_QUERY_MS)
+@app.route("/admin/slow-queries")
+@login_required
+@role_required("admin")
+def slow_query_log():
+    return jsonify(threshold_ms=SLOW_QUERY_MS, pid=os.getpid(), queries=slow_queries.entries())
+
+
 # User page
 @app.route("/user")
 @login_required
@@ -679,27 +1711,49 @@ def register():
                 "register.html", errors=errors, full_name=full_name, email=email
             )
 
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT 1 FROM users WHERE email=%s;", (email,))
-        if cur.fetchone():
-            cur.close()
+        limits = [(f"register:ip:{request.remote_addr}", REGISTER_MAX_PER_IP, 3600)]
+        form = dict(full_name=full_name, email=email)
+        conn = get_db_connection()
+        try:
+            with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+                data = (
+                    QueryBatch()
+                    .scalar("taken", "SELECT EXISTS (SELECT 1 FROM users WHERE email = %s)", (email,))
+                    .rows("throttle", auth.THROTTLE_SQL, auth.throttle_params(limits))
+                    .run(cur)
+                )
+                if data["taken"]:
+                    return render_template(
+                        "register.html", errors=["Email is already registered."], **form
+                    )
+                wait = auth.retry_after(data["throttle"], limits)
+                if wait:
+                    errors = [f"Too many sign-ups from your network. {try_again_in(wait)}"]
+                    html = render_template("register.html", errors=errors, **form)
+                    return html, 429, {"Retry-After": str(wait)}
+                auth.hit(cur, limits)
+
+            try:
+                pwd_hash = hash_pool.generate(password, PASSWORD_HASH_METHOD)
+            except auth.Busy:
+                html = render_template("register.html", errors=[HASHING_BUSY], **form)
+                return html, 503, {"Retry-After": "5"}
+
+            with conn, conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO users (full_name, email, password_hash) VALUES (%s, %s, %s)
+                    ON CONFLICT (email) DO NOTHING;
+                    """,
+                    (full_name, email, pwd_hash),
+                )
+                created = cur.rowcount
+        finally:
             conn.close()
+        if not created:  # registered between our check and the insert
             return render_template(
-                "register.html",
-                errors=["Email is already registered."],
-                full_name=full_name,
-                email=email,
+                "register.html", errors=["Email is already registered."], **form
             )
-
-        pwd_hash = generate_password_hash(password)
-        cur.execute(
-            "INSERT INTO users (full_name, email, password_hash) VALUES (%s, %s, %s);",
-            (full_name, email, pwd_hash),
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
         flash("Account created successfully. Please log in.", "success")
         return redirect(url_for("login"))
 
@@ -714,16 +1768,238 @@ def logout():
     return redirect(url_for("index"))
 
 
-@app.after_request
-def add_no_cache_headers(response):
-    response.headers["Cache-Control"] = (
-        "no-store, no-cache, must-revalidate, max-age=0, private"
+@app.before_request
+def conditional_get():
+    """Answer revalidations of public catalog pages with 304 before any query runs."""
+    kind, _ = policy_for(app.view_functions.get(request.endpoint))
+    if kind != "public" or request.method not in ("GET", "HEAD"):
+        return None
+    if "_flashes" in session:  # the page must render to show them
+        return None
+
+    version, updated_at = catalog_clock.get()
+    g.etag = make_etag(
+        request.endpoint,
+        sorted((request.view_args or {}).items()),
+        sorted(request.args.items(multi=True)),
+        version,
+        BUILD_ID,
+        session.get("user_id"),
+        session.get("csrf_token"),
+        # listings show the signed-in user's wishlist hearts
+        wishlist_rev() if session.get("user_id") else None,
     )
+    g.last_modified = updated_at
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(g.etag)
+    else:
+        fresh = bool(
+            updated_at
+            and not session.get("user_id")  # Last-Modified only tracks the catalog
+            and request.if_modified_since
+            and request.if_modified_since >= updated_at.replace(microsecond=0)
+        )
+    if fresh:
+        return app.response_class(status=304)
+    return None
+
+
+@app.before_request
+def serve_cached_page():
+    """Anonymous catalog pages straight from the render cache (no queries, no templates)."""
+    kind, _ = policy_for(app.view_functions.get(request.endpoint))
+    if kind != "public" or request.method != "GET" or not shared_render():
+        return None
+    g.page_cache_key = page_cache_key(catalog_clock.get()[0])
+    cached = page_cache.get(g.page_cache_key)
+    if cached is None:
+        return None
+    g.page_cache_hit = True
+    body, mimetype = cached
+    return app.response_class(body, mimetype=mimetype)
+
+
+@app.after_request
+def fill_page_cache(response):
+    key = g.get("page_cache_key")
+    if key is None:
+        return response
+    if g.get("page_cache_hit"):
+        response.headers["X-Cache"] = "HIT"
+    elif (
+        response.status_code == 200
+        and not response.direct_passthrough
+        and not session.modified  # rendering touched the session: not shareable
+    ):
+        page_cache.set(key, (response.get_data(), response.mimetype))
+        response.headers["X-Cache"] = "MISS"
+    return response
+
+
+@app.after_request
+def apply_cache_policy(response):
+    if request.endpoint == "static":
+        filename = (request.view_args or {}).get("filename", "")
+        if filename.startswith("uploads/"):
+            # uploads never get overwritten (new content gets a new, hash-based name)
+            response.headers["Cache-Control"] = IMMUTABLE
+        else:
+            response.headers["Cache-Control"] = f"public, max-age={STATIC_MAX_AGE}"
+        return response
+
+    kind, _ = policy_for(app.view_functions.get(request.endpoint))
+    if kind == "immutable" and response.status_code in (200, 304):
+        response.headers["Cache-Control"] = IMMUTABLE
+        return response
+    if kind == "revalidate" and response.status_code in (200, 206, 304):
+        # the URL stays the same when the content changes: keep the file's own validators
+        response.headers["Cache-Control"] = "public, no-cache"
+        return response
+
+    etag = g.get("etag")
+    if etag and response.status_code in (200, 304):
+        response.set_etag(etag, weak=True)
+        response.vary.add("Cookie")
+        anonymous = not session.get("user_id") and not session.modified
+        if anonymous:
+            _, max_age = policy_for(app.view_functions.get(request.endpoint))
+            max_age = CATALOG_MAX_AGE if max_age is None else max_age
+            response.headers["Cache-Control"] = (
+                f"public, max-age={max_age}, must-revalidate"
+            )
+            if g.get("last_modified"):
+                response.last_modified = g.last_modified
+        else:
+            response.headers["Cache-Control"] = REVALIDATE_PRIVATE
+        return response
+
+    response.headers["Cache-Control"] = NO_STORE
     response.headers["Pragma"] = "no-cache"
     response.headers["Expires"] = "0"
     return response
 
 
+# --- Cover images (resized variants, see images.py) ---
+def cover_src(item, width=240):
+    rel = images.cover_rel_path(item.get("cover"))
+    if not rel:
+        return url_for("static", filename="img/placeholder_cover.png")
+    if not images.enabled():
+        return url_for("static", filename=rel)
+    return url_for("cover_variant", width=width, fmt="jpeg", cover=rel)
+
+
+def cover_srcset(item, fmt):
+    rel = images.cover_rel_path(item.get("cover"))
+    return ", ".join(
+        f"{url_for('cover_variant', width=w, fmt=fmt, cover=rel)} {w}w"
+        for w in images.VARIANT_WIDTHS
+    )
+
+
+def cover_placeholder(item):
+    return images.placeholder_data_uri(
+        STATIC_DIR, images.cover_rel_path(item.get("cover"))
+    )
+
+
+app.jinja_env.globals.update(
+    cover_src=cover_src,
+    cover_srcset=cover_srcset,
+    cover_placeholder=cover_placeholder,
+    cover_variants_enabled=images.enabled,
+)
+
+
+# Resized cover, generated on first request and cached on disk
+@app.route("/covers/<int:width>.<fmt>/<path:cover>")
+@cache_policy("immutable")
+def cover_variant(width, fmt, cover):
+    # Only the sizes the templates link to, and only for uploaded covers:
+    # anything else would let clients write arbitrary new files
+    if width not in images.VARIANT_WIDTHS or fmt not in images.VARIANT_FORMATS:
+        abort(404)
+    rel = images.cover_rel_path(cover)
+    if not images.is_cover(rel) or safe_join(str(COVERS_DIR), rel[len(images.COVERS_PREFIX):]) is None:
+        abort(404)
+    try:
+        path = images.make_variant(STATIC_DIR, rel, width, fmt)
+    except OSError:
+        path = None
+    if not path:
+        abort(404)
+    return send_file(path, mimetype=f"image/{fmt}", conditional=True)
+
+
+@app.cli.command("backfill-covers")
+@click.option("--force", is_flag=True, help="Regenerate variants that already exist.")
+def backfill_covers(force):
+    """Generate resized variants and placeholders for every stored cover."""
+    if not images.enabled():
+        raise click.ClickException("Pillow is not installed.")
+    done = failed = 0
+    for path in sorted(COVERS_DIR.rglob("*")):  # hashed uploads sit in ab/ subfolders
+        if not path.is_file() or not allowed(path.name, ALLOWED_COVER_EXTS):
+            continue
+        try:
+            images.make_all(STATIC_DIR, path.relative_to(STATIC_DIR).as_posix(), force=force)
+            done += 1
+        except OSError as e:
+            failed += 1
+            click.echo(f"{path.name}: {e}", err=True)
+    click.echo(f"Covers processed: {done}, failed: {failed}")
+
+
+# --- Book file delivery ---
+# "x-sendfile" (Apache/lighttpd) or "x-accel" (nginx) hands the transfer to the
+# front server; otherwise gunicorn streams it (sendfile) with Range support
+FILE_OFFLOAD = os.getenv("FILE_OFFLOAD", "").lower()
+# nginx `internal` location that aliases the static/ directory
+FILE_OFFLOAD_PREFIX = os.getenv("FILE_OFFLOAD_PREFIX", "/_static_internal/")
+app.config["USE_X_SENDFILE"] = FILE_OFFLOAD == "x-sendfile"
+
+
+@app.route("/book/<int:book_id>/download")
+@cache_policy("revalidate")
+def download_book(book_id):
+    conn = get_db_connection()
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT title, file FROM books WHERE id = %s;", (book_id,))
+        book = cur.fetchone()
+    conn.close()
+    if not book or not book["file"]:
+        abort(404)
+
+    rel = upload_rel_path(book["file"], "files")
+    path = safe_join(str(STATIC_DIR), rel)
+    if not path or not os.path.isfile(path):
+        abort(404)
+
+    ext = os.path.splitext(path)[1]
+    download_name = (secure_filename(book["title"] or "") or "book") + ext
+    as_attachment = not request.args.get("inline")
+
+    if FILE_OFFLOAD == "x-accel":
+        # nginx serves the bytes (Range, conditional GET) from its internal location
+        response = app.response_class(
+            mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream"
+        )
+        response.headers["X-Accel-Redirect"] = FILE_OFFLOAD_PREFIX + rel
+        response.headers["Content-Disposition"] = (
+            f'{"attachment" if as_attachment else "inline"}; filename="{download_name}"'
+        )
+        return response
+
+    return send_file(
+        path,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=True,  # Range, If-Range, If-None-Match, If-Modified-Since
+        etag=True,
+    )
+
+
 # Add Book page (add new book)
 @app.route("/add_book", methods=["GET", "POST"])
 @login_required
@@ -731,12 +2007,6 @@ def add_no_cache_headers(response):
 def add_book():
     conn = get_db_connection()
     with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        # Dropdown data
-        cur.execute("SELECT id, name FROM authors ORDER BY name;")
-        authors = cur.fetchall()
-        cur.execute("SELECT id, name FROM categories ORDER BY name;")
-        categories = cur.fetchall()
-
         if request.method == "POST":
             form = request.form
             files = request.files
@@ -774,7 +2044,7 @@ def add_book():
             if price_raw:
                 try:
                     price = float(price_raw)
-                    if price < 0:
+                    if not math.isfinite(price) or price < 0:
                         raise ValueError
                 except ValueError:
                     flash("Price must be a valid non-negative number.", "danger")
@@ -801,25 +2071,20 @@ def add_book():
                 )
                 return redirect(url_for("add_book"))
 
-            # --- Generate unique safe filenames and absolute paths ---
-            cover_name, cover_path = save_unique(COVERS_DIR, cover_file.filename)
-            file_name, file_path = save_unique(FILES_DIR, book_file.filename)
-
-            # --- Save files to disk ---
+            # --- Hash uploads to temp files (placed once the row is in) ---
             try:
-                cover_file.save(cover_path)
-                book_file.save(file_path)
-            except Exception as e:
+                cover_blob = spool_upload(cover_file)
+                file_blob = spool_upload(book_file)
+            except OSError as e:
                 print("Upload save error:", e)
                 flash("Failed to save uploaded files.", "danger")
                 return redirect(url_for("add_book"))
 
-            # Paths stored in DB relative to /static
-            cover_rel = f"uploads/covers/{cover_name}"
-            file_rel = f"uploads/files/{file_name}"
-
             # --- Insert DB row ---
             try:
+                # Paths stored in DB relative to /static
+                cover_rel = storage.place(cur, cover_blob, STATIC_DIR, "covers")
+                file_rel = storage.place(cur, file_blob, STATIC_DIR, "files")
                 cur.execute(
                     """
                     INSERT INTO books (title, author_id, category_id, description, price, cover, file)
@@ -836,25 +2101,27 @@ def add_book():
                         file_rel,
                     ),
                 )
+                new_id = cur.fetchone()["id"]
+                jobs.enqueue(cur, "covers.variants", {"cover": cover_rel})
+                jobs.enqueue(cur, "related.refresh", {"book_ids": [new_id]})
                 conn.commit()
+                invalidate_catalog(*BOOK_KEYS)
                 flash(f"Book '{title}' added successfully!", "success")
                 return redirect(url_for("add_book"))
-            except psycopg2.Error as e:
-                # Roll back and clean up saved files if DB insert failed
+            except (psycopg2.Error, OSError) as e:
+                # Placed files stay: they are content-addressed and harmless
                 conn.rollback()
-                try:
-                    if cover_path.exists():
-                        cover_path.unlink()
-                    if file_path.exists():
-                        file_path.unlink()
-                except Exception:
-                    pass
                 print("DB error:", e)
                 flash("Database error while adding the book.", "danger")
                 return redirect(url_for("add_book"))
 
     conn.close()
-    return render_template("add_book.html", authors=authors, categories=categories)
+    # Dropdown data
+    return render_template(
+        "add_book.html",
+        authors=get_author_options(),
+        categories=get_category_options(),
+    )
 
 
 # Add author page
@@ -887,6 +2154,7 @@ def add_author():
                     (author_name,),
                 )
                 conn.commit()
+                invalidate_catalog(*AUTHOR_KEYS)
 
                 flash(f"Author '{author_name}' added successfully!", "success")
                 return redirect(url_for("add_author"))
@@ -933,6 +2201,7 @@ def add_category():
                     (category_name,),
                 )
                 conn.commit()
+                invalidate_catalog(*CATEGORY_KEYS)
                 flash(f"Category '{category_name}' added successfully!", "success")
                 return redirect(url_for("add_category"))
 
@@ -984,6 +2253,7 @@ def edit_category(category_id):
                             (new_name, category_id),
                         )
                         conn.commit()
+                        invalidate_catalog(*CATEGORY_KEYS)
                         flash("Category updated successfully.", "success")
                         category["name"] = new_name  # update object for template
                     except Exception:
@@ -1031,6 +2301,7 @@ def edit_author(author_id):
                             (new_name, author_id),
                         )
                         conn.commit()
+                        invalidate_catalog(*AUTHOR_KEYS)
                         flash("Author updated successfully.", "success")
                         author["name"] = new_name  # keep the edited value on the page
                     except Exception:
@@ -1051,14 +2322,12 @@ def edit_book(book_id):
         except Exception:
             return None
 
+    # Dropdowns (cached; loaded before checking out this route's connection)
+    authors = get_author_options()
+    categories = get_category_options()
+
     conn = get_db_connection()
     with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        # Dropdowns
-        cur.execute("SELECT id, name FROM authors ORDER BY name;")
-        authors = cur.fetchall()
-        cur.execute("SELECT id, name FROM categories ORDER BY name;")
-        categories = cur.fetchall()
-
         # Current book
         cur.execute(
             """
@@ -1109,7 +2378,7 @@ def edit_book(book_id):
             else:
                 try:
                     new_price = float(price_raw)
-                    if new_price < 0:
+                    if not math.isfinite(new_price) or new_price < 0:
                         raise ValueError
                 except ValueError:
                     flash("Price must be a valid non-negative number.", "danger")
@@ -1121,7 +2390,7 @@ def edit_book(book_id):
                     )
 
             # --- Optional uploads (keep existing if nothing uploaded) ---
-            new_cover_rel = book["cover"]
+            new_cover_rel, cover_blob = book["cover"], None
             if cover_file and cover_file.filename:
                 if not allowed(cover_file.filename, ALLOWED_COVER_EXTS):
                     flash(
@@ -1129,16 +2398,15 @@ def edit_book(book_id):
                         "warning",
                     )
                 else:
-                    cover_name, cover_path = save_unique(
-                        COVERS_DIR, cover_file.filename
-                    )
                     try:
-                        cover_file.save(cover_path)
-                        new_cover_rel = f"uploads/covers/{cover_name}"
-                    except Exception:
+                        cover_blob = spool_upload(cover_file)
+                        new_cover_rel = storage.blob_rel_path(
+                            "covers", cover_blob.sha256, cover_blob.ext
+                        )
+                    except OSError:
                         flash("Failed to save new cover.", "danger")
 
-            new_file_rel = book["file"]
+            new_file_rel, file_blob = book["file"], None
             if book_file and book_file.filename:
                 if not allowed(book_file.filename, ALLOWED_FILE_EXTS):
                     flash(
@@ -1146,11 +2414,12 @@ def edit_book(book_id):
                         "warning",
                     )
                 else:
-                    file_name, file_path = save_unique(FILES_DIR, book_file.filename)
                     try:
-                        book_file.save(file_path)
-                        new_file_rel = f"uploads/files/{file_name}"
-                    except Exception:
+                        file_blob = spool_upload(book_file)
+                        new_file_rel = storage.blob_rel_path(
+                            "files", file_blob.sha256, file_blob.ext
+                        )
+                    except OSError:
                         flash("Failed to save new file.", "danger")
 
             # --- No-change detection ---
@@ -1187,6 +2456,13 @@ def edit_book(book_id):
 
             # --- Update ---
             try:
+                # Re-uploading the current file hashes to the same path: nothing to swap
+                cover_changed = new_cover_rel != book["cover"]
+                file_changed = new_file_rel != book["file"]
+                if cover_changed:
+                    storage.place(cur, cover_blob, STATIC_DIR, "covers")
+                if file_changed:
+                    storage.place(cur, file_blob, STATIC_DIR, "files")
                 cur.execute(
                     """
                     UPDATE books
@@ -1210,7 +2486,21 @@ def edit_book(book_id):
                         book_id,
                     ),
                 )
+                if cover_changed:
+                    release_upload(cur, book["cover"], "covers")
+                if file_changed:
+                    release_upload(cur, book["file"], "files")
+                if cover_changed:
+                    jobs.enqueue(cur, "covers.variants", {"cover": new_cover_rel})
+                if (
+                    new_title != book["title"]
+                    or new_desc != (book["description"] or "")
+                    or new_author_id != book["author_id"]
+                    or new_category_id != book["category_id"]
+                ):
+                    jobs.enqueue(cur, "related.refresh", {"book_ids": [book_id]})
                 conn.commit()
+                invalidate_catalog(*BOOK_KEYS)
 
                 # reflect new values in memory so the page shows them
                 book["title"] = new_title
@@ -1245,25 +2535,19 @@ def delete_book(book_id):
                 flash("Book not found.", "danger")
                 return redirect(url_for("admin"))
 
+            # Books listing this one lose a neighbour (the rows cascade away)
+            refresh_ids = related.dependents(cur, [book_id])
+
             # Delete row first (if FK blocks, files won't be touched)
             cur.execute("DELETE FROM books WHERE id = %s;", (book_id,))
+            if refresh_ids:
+                jobs.enqueue(cur, "related.refresh", {"book_ids": refresh_ids})
 
-        # Remove files on disk: DB paths are relative to /static
-        static_dir = Path(current_app.root_path) / "static"
-
-        def rm_static(rel_path: str | None):
-            if not rel_path:
-                return
-            p = static_dir / rel_path.lstrip("/\\")
-            try:
-                p.unlink(
-                    missing_ok=True
-                )  # Python 3.8+: you can emulate with exists()+unlink()
-            except Exception:
-                pass  # Don't block UI if file is missing/locked
+            # Files go only when no other book shares them
+            release_upload(cur, book.get("cover"), "covers")
+            release_upload(cur, book.get("file"), "files")
 
-        rm_static(book.get("cover"))  # e.g. "uploads/covers/<name>"
-        rm_static(book.get("file"))  # e.g. "uploads/files/<name>"
+        invalidate_catalog(*BOOK_KEYS)
 
         flash("Book deleted successfully.", "success")
     except errors.ForeignKeyViolation:
@@ -1319,6 +2603,7 @@ def delete_category(category_id):
             # Safe to delete
             cur.execute("DELETE FROM categories WHERE id = %s;", (category_id,))
 
+        invalidate_catalog(*CATEGORY_KEYS)
         flash(f"Category '{cat['name']}' deleted.", "success")
     except errors.ForeignKeyViolation:
         conn.rollback()
@@ -1353,6 +2638,7 @@ def delete_author(author_id):
 
             # Delete author
             cur.execute("DELETE FROM authors WHERE id=%s;", (author_id,))
+        invalidate_catalog(*AUTHOR_KEYS)
         flash("Author deleted.", "success")
     except Exception as e:
         conn.rollback()
@@ -1362,5 +2648,552 @@ def delete_author(author_id):
     return redirect(url_for("admin"))
 
 
+# --- Bulk admin actions ---
+# The admin tables post the checked row ids as "ids"; each action is one
+# set-based statement per table, all in a single transaction.
+def selected_ids():
+    return sorted({int(v) for v in request.form.getlist("ids") if api.is_number(v)})
+
+
+def back_to_admin():
+    q = (request.form.get("q") or "").strip()
+    return redirect(url_for("admin", q=q) if q else url_for("admin"))
+
+
+@app.route("/admin/books/bulk", methods=["POST"])
+@login_required
+@role_required("admin")
+def bulk_books():
+    ids = selected_ids()
+    action = request.form.get("action")
+    if not ids:
+        flash("Select at least one book.", "warning")
+        return back_to_admin()
+
+    # Validate the parameters before touching the database
+    if action == "recategorize":
+        try:
+            category_id = int(request.form.get("category_id") or "")
+        except ValueError:
+            flash("Please select a category.", "danger")
+            return back_to_admin()
+    elif action == "reprice":
+        price_mode = request.form.get("price_mode")
+        try:
+            price_value = float(request.form.get("price_value") or "")
+            if not math.isfinite(price_value):  # float() also reads "nan" and "inf"
+                raise ValueError
+            if price_mode == "set" and price_value < 0:
+                raise ValueError
+            if price_mode == "percent" and price_value <= -100:
+                raise ValueError
+        except ValueError:
+            flash("Enter a valid price (or a percentage above -100).", "danger")
+            return back_to_admin()
+        if price_mode not in ("set", "percent"):
+            flash("Unknown price change.", "danger")
+            return back_to_admin()
+    elif action != "delete":
+        flash("Unknown bulk action.", "danger")
+        return back_to_admin()
+
+    conn = get_db_connection()
+    try:
+        with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if action == "delete":
+                refresh_ids = related.dependents(cur, ids)
+                cur.execute(
+                    "DELETE FROM books WHERE id = ANY(%s) RETURNING cover, file;",
+                    (ids,),
+                )
+                deleted = cur.fetchall()
+                release_book_uploads(cur, deleted)
+                if refresh_ids:
+                    jobs.enqueue(cur, "related.refresh", {"book_ids": refresh_ids})
+                message = f"Deleted {len(deleted)} book(s)."
+            elif action == "recategorize":
+                cur.execute(
+                    """
+                    UPDATE books b SET category_id = c.id
+                    FROM categories c
+                    WHERE c.id = %s AND b.id = ANY(%s) AND b.category_id <> c.id
+                    RETURNING b.id, c.name;
+                    """,
+                    (category_id, ids),
+                )
+                moved = cur.fetchall()
+                if moved:
+                    jobs.enqueue(
+                        cur, "related.refresh", {"book_ids": [r["id"] for r in moved]}
+                    )
+                    message = f"Moved {len(moved)} book(s) to '{moved[0]['name']}'."
+                else:
+                    message = "No books needed moving."
+            elif price_mode == "set":
+                cur.execute(
+                    "UPDATE books SET price = %s WHERE id = ANY(%s);",
+                    (price_value, ids),
+                )
+                message = f"Repriced {cur.rowcount} book(s)."
+            else:
+                cur.execute(
+                    """
+                    UPDATE books SET price = ROUND(price * (100 + %s) / 100, 2)
+                    WHERE id = ANY(%s) AND price IS NOT NULL;
+                    """,
+                    (price_value, ids),
+                )
+                message = f"Repriced {cur.rowcount} book(s) (books without a price were skipped)."
+        invalidate_catalog(*BOOK_KEYS)
+        flash(message, "success")
+    except errors.ForeignKeyViolation:
+        conn.rollback()
+        flash(
+            "Some of these books are referenced elsewhere (inventory/sales); nothing was deleted.",
+            "warning",
+        )
+    except Exception as e:
+        conn.rollback()
+        flash(f"Bulk update failed: {e}", "danger")
+    finally:
+        conn.close()
+    return back_to_admin()
+
+
+def delete_unused(cur, table, fk_column, ids):
+    """Delete the rows in `ids` that no book uses; returns (deleted, in_use) rows."""
+    cur.execute(
+        f"""
+        SELECT t.id, t.name, COUNT(b.id) AS book_count
+        FROM {table} t
+        LEFT JOIN books b ON b.{fk_column} = t.id
+        WHERE t.id = ANY(%s)
+        GROUP BY t.id, t.name
+        ORDER BY t.name;
+        """,
+        (ids,),
+    )
+    rows = cur.fetchall()
+    in_use = [r for r in rows if r["book_count"]]
+    deleted = [r for r in rows if not r["book_count"]]
+    if deleted:
+        cur.execute(
+            f"DELETE FROM {table} WHERE id = ANY(%s);", ([r["id"] for r in deleted],)
+        )
+    return deleted, in_use
+
+
+def bulk_delete_unused(table, fk_column, label, cache_keys):
+    ids = selected_ids()
+    if not ids:
+        flash(f"Select at least one {label}.", "warning")
+        return back_to_admin()
+    conn = get_db_connection()
+    try:
+        with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            deleted, in_use = delete_unused(cur, table, fk_column, ids)
+        if deleted:
+            invalidate_catalog(*cache_keys)
+            noun = label if len(deleted) == 1 else table
+            flash(f"Deleted {len(deleted)} {noun}.", "success")
+        if in_use:
+            kept = ", ".join(f"{r['name']} ({r['book_count']})" for r in in_use)
+            flash(f"Kept {len(in_use)} that still have books: {kept}.", "warning")
+    except errors.ForeignKeyViolation:
+        conn.rollback()
+        flash("A book was just assigned to one of these; nothing was deleted.", "warning")
+    except Exception as e:
+        conn.rollback()
+        flash(f"Delete failed: {e}", "danger")
+    finally:
+        conn.close()
+    return back_to_admin()
+
+
+@app.route("/admin/categories/bulk_delete", methods=["POST"])
+@login_required
+@role_required("admin")
+def bulk_delete_categories():
+    return bulk_delete_unused("categories", "category_id", "category", CATEGORY_KEYS)
+
+
+@app.route("/admin/authors/bulk_delete", methods=["POST"])
+@login_required
+@role_required("admin")
+def bulk_delete_authors():
+    return bulk_delete_unused("authors", "author_id", "author", AUTHOR_KEYS)
+
+
+# --- Background jobs ---
+# Run by `flask worker` (the Procfile's worker process), never by gunicorn.
+@jobs.job("covers.variants")
+def covers_variants_job(payload):
+    images.make_all(STATIC_DIR, payload["cover"])
+
+
+@jobs.job("uploads.collect")
+def uploads_collect_job(payload):
+    rel = payload["path"]
+    conn = get_db_connection()
+    with conn, conn.cursor() as cur:
+        removed = storage.collect(cur, rel, STATIC_DIR)
+    conn.close()
+    if removed and payload.get("folder") == "covers":
+        images.remove_variants(STATIC_DIR, rel)
+
+
+@jobs.job("uploads.sweep")
+def uploads_sweep_job(payload):
+    """Unreferenced blobs whose collect job never ran, and abandoned temp uploads."""
+    conn = get_db_connection()
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT path FROM upload_blobs WHERE refcount <= 0 LIMIT 500;")
+        paths = [r[0] for r in cur.fetchall()]
+    conn.close()
+    for rel in paths:
+        folder = rel.split("/")[1]
+        uploads_collect_job({"path": rel, "folder": folder})
+
+    cutoff = time.time() - 86400
+    if UPLOAD_TMP_DIR.is_dir():
+        for path in UPLOAD_TMP_DIR.iterdir():
+            if path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+
+
+@jobs.job("jobs.purge")
+def jobs_purge_job(payload):
+    conn = get_db_connection()
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        jobs.purge(cur, payload.get("keep_days", 7))
+    conn.close()
+
+
+@jobs.job("related.refresh")
+def related_refresh_job(payload):
+    conn = get_db_connection()
+    try:
+        related.refresh(conn, payload["book_ids"])
+    finally:
+        conn.close()
+
+
+@jobs.job("related.rebuild", max_attempts=2)
+def related_rebuild_job(payload):
+    conn = get_db_connection()
+    try:
+        related.rebuild(conn)
+    finally:
+        conn.close()
+
+
+@jobs.job("contact.copy")
+def contact_copy_job(payload):
+    """Email the sender a copy of their message (once: copy_sent_at marks it)."""
+    conn = get_db_connection()
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            """
+            SELECT id, name, email, subject, message FROM contact_messages
+            WHERE id = %s AND want_copy AND copy_sent_at IS NULL
+            FOR UPDATE;
+            """,
+            (payload["id"],),
+        )
+        msg = cur.fetchone()
+        if msg:
+            mailer.send(
+                mail.build_message(
+                    MAIL_FROM,
+                    msg["email"],
+                    f"Copy of your message: {msg['subject']}",
+                    f"Hi {msg['name']},\n\nThanks for writing to us. Here is a copy of your message:\n\n"
+                    f"{msg['message']}\n",
+                )
+            )
+            cur.execute(
+                "UPDATE contact_messages SET copy_sent_at = now() WHERE id = %s;", (msg["id"],)
+            )
+    conn.close()
+
+
+@jobs.job("auth.purge_throttle")
+def purge_throttle_job(payload):
+    conn = get_db_connection()
+    with conn, conn.cursor() as cur:
+        auth.purge(cur)
+    conn.close()
+
+
+jobs.periodic("uploads-sweep", 3600, "uploads.sweep")
+jobs.periodic("jobs-purge", 86400, "jobs.purge", {"keep_days": 7})
+jobs.periodic("related-rebuild", 86400, "related.rebuild")
+jobs.periodic("throttle-purge", 3600, "auth.purge_throttle")
+
+
+def run_in_app_context(func, payload):
+    with app.app_context():  # fresh g per job: its DB connections go back to the pool
+        func(payload)
+
+
+@app.cli.command("worker")
+@click.option("--poll", default=5.0, help="Seconds between queue polls (NOTIFY wakes it sooner).")
+def run_worker(poll):
+    """Run background jobs until interrupted."""
+    worker = jobs.Worker(database_dsn(), run_job=run_in_app_context, poll_interval=poll)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    click.echo(f"Job worker {worker.name} started")
+    worker.run()
+
+
+@app.cli.command("rebuild-related")
+def rebuild_related_command():
+    """Recompute every book's related titles now (the worker also does it daily)."""
+    started = time.monotonic()
+    conn = get_db_connection()
+    try:
+        count = related.rebuild(conn)
+    finally:
+        conn.close()
+    click.echo(f"Stored {count} neighbours in {time.monotonic() - started:.1f}s")
+
+
+# Job queue status
+@app.route("/admin/jobs")
+@login_required
+@role_required("admin")
+def job_stats():
+    conn = get_db_connection()
+    with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        stats = jobs.stats(cur)
+    conn.close()
+    return jsonify(stats)
+
+
+# --- Catalog import ---
+# Asset folders the admin import form may read from (the CLI accepts any path)
+IMPORT_ROOT = Path(os.getenv("IMPORT_ROOT", BASE_DIR)).resolve()
+# Manifests uploaded through the admin form, each with a <token>.report.json
+IMPORT_DIR = Path(app.instance_path) / "imports"
+
+
+def import_catalog(manifest, asset_dir, workers=8, dry_run=False):
+    """Run a bulk import (see importer.py); raises ValueError for an unreadable manifest."""
+    rows = importer.read_manifest(manifest)
+    conn = get_db_connection()
+    try:
+        report = importer.run_import(
+            conn,
+            rows,
+            asset_dir,
+            STATIC_DIR,
+            UPLOAD_TMP_DIR,
+            ALLOWED_COVER_EXTS,
+            ALLOWED_FILE_EXTS,
+            workers=workers,
+            dry_run=dry_run,
+        )
+    finally:
+        conn.close()
+    if report["inserted"] and not dry_run:
+        invalidate_catalog(*BOOK_KEYS, *AUTHOR_KEYS, *CATEGORY_KEYS)
+    return report
+
+
+def write_import_status(token, status):
+    IMPORT_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = IMPORT_DIR / f"{token}.report.json.tmp"
+    tmp.write_text(json.dumps(status, default=str))
+    os.replace(tmp, IMPORT_DIR / f"{token}.report.json")
+
+
+@app.cli.command("import-books")
+@click.argument("manifest", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option(
+    "--assets",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+    help="Folder the cover/file columns are relative to (default: the manifest's folder).",
+)
+@click.option("--workers", default=8, help="Threads hashing/copying asset files.")
+@click.option("--dry-run", is_flag=True, help="Validate everything, change nothing.")
+def import_books_command(manifest, assets, workers, dry_run):
+    """Bulk-load books from a CSV/JSON manifest and an asset folder."""
+    try:
+        report = import_catalog(manifest, assets or manifest.parent, workers, dry_run)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for err in report["errors"]:
+        click.echo(f"line {err['line']}: {err['error']}", err=True)
+    click.echo(
+        f"{'Would insert' if dry_run else 'Inserted'} {report['inserted']} of "
+        f"{report['rows']} books ({len(report['errors'])} errors); "
+        f"new authors: {report['authors_created']}, "
+        f"new categories: {report['categories_created']}, files: {report['assets']}"
+    )
+
+
+@jobs.job("catalog.import", max_attempts=1)
+def catalog_import_job(payload):
+    token = payload["token"]
+    status = dict(payload, status="running")
+    write_import_status(token, status)
+    try:
+        report = import_catalog(
+            IMPORT_DIR / payload["manifest"], payload["assets"], dry_run=payload["dry_run"]
+        )
+    except ValueError as e:
+        status.update(status="failed", error=str(e))
+    except Exception as e:
+        write_import_status(token, dict(status, status="failed", error=str(e)))
+        raise
+    else:
+        status.update(status="done", report=report)
+    write_import_status(token, status)
+
+
+@app.route("/admin/import", methods=["GET", "POST"])
+@login_required
+@role_required("admin")
+def import_books():
+    if request.method == "POST":
+        manifest = request.files.get("manifest")
+        assets_raw = (request.form.get("assets") or "").strip()
+        dry_run = bool(request.form.get("dry_run"))
+
+        if not manifest or not allowed(manifest.filename, {"csv", "json"}):
+            flash("Please upload a .csv or .json manifest.", "danger")
+            return redirect(url_for("import_books"))
+        asset_dir = safe_join(str(IMPORT_ROOT), assets_raw) if assets_raw else None
+        if not asset_dir or not os.path.isdir(asset_dir):
+            flash("Asset folder not found on the server.", "danger")
+            return redirect(url_for("import_books"))
+
+        token = uuid.uuid4().hex
+        ext = manifest.filename.rsplit(".", 1)[1].lower()
+        IMPORT_DIR.mkdir(parents=True, exist_ok=True)
+        manifest.save(IMPORT_DIR / f"{token}.{ext}")
+        payload = {
+            "token": token,
+            "manifest": f"{token}.{ext}",
+            "filename": secure_filename(manifest.filename),
+            "assets": asset_dir,
+            "dry_run": dry_run,
+            "queued_at": datetime.now().isoformat(),
+        }
+        write_import_status(token, dict(payload, status="queued"))
+        conn = get_db_connection()
+        with conn, conn.cursor() as cur:
+            job_id = jobs.enqueue(cur, "catalog.import", payload)
+        conn.close()
+        flash(f"Import queued (job #{job_id}); refresh this page for the report.", "success")
+        return redirect(url_for("import_books"))
+
+    reports = sorted(
+        IMPORT_DIR.glob("*.report.json") if IMPORT_DIR.is_dir() else [],
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )[:10]
+    imports = [json.loads(p.read_text()) for p in reports]
+    return render_template(
+        "import_books.html",
+        imports=imports,
+        import_root=IMPORT_ROOT,
+        fields=importer.FIELDS,
+    )
+
+
+# --- Schema migrations ---
+# migrations/*.sql, applied by `flask db-migrate` (run it on every deploy)
+@app.cli.command("db-migrate")
+@click.option("--to", "target", type=int, help="Stop after this migration number.")
+def db_migrate_command(target):
+    """Apply pending schema migrations."""
+    conn = get_db_connection()
+    try:
+        ran = migrate.migrate(conn, target=target, log=click.echo)
+    finally:
+        conn.close()
+    click.echo(f"{len(ran)} migration(s) applied" if ran else "Schema is up to date")
+
+
+@app.cli.command("db-status")
+def db_status_command():
+    """List migrations and whether they are applied."""
+    conn = get_db_connection()
+    try:
+        rows = migrate.status(conn)
+    finally:
+        conn.close()
+    for version, name, applied_at, edited in rows:
+        state = f"applied {applied_at:%Y-%m-%d %H:%M}" if applied_at else "pending"
+        click.echo(f"{version:04d} {name:<30} {state}{' (file edited since!)' if edited else ''}")
+
+
+# Representative forms of the hot queries, for `flask db-explain`
+HOT_QUERIES = [
+    ("store: newest", "SELECT b.id FROM books b ORDER BY b.id DESC LIMIT 13", ()),
+    (
+        "store: category, price",
+        "SELECT b.id FROM books b WHERE b.category_id = %s ORDER BY b.price, b.id LIMIT 13",
+        (1,),
+    ),
+    ("store: search", f"SELECT b.id FROM books b WHERE {SEARCH_WHERE} LIMIT 13", ("crime & punish:*",)),
+    (
+        "book page: neighbours",
+        "SELECT n.neighbor_id FROM book_neighbors n WHERE n.book_id = %s ORDER BY n.rank",
+        (1,),
+    ),
+    (
+        "edit_book: duplicate title",
+        "SELECT 1 FROM books WHERE LOWER(title) = LOWER(%s) AND author_id = %s AND id <> %s",
+        ("x", 1, 1),
+    ),
+    ("add_author: duplicate name", "SELECT 1 FROM authors WHERE LOWER(name) = LOWER(%s)", ("x",)),
+    ("add_category: duplicate name", "SELECT 1 FROM categories WHERE LOWER(name) = LOWER(%s)", ("x",)),
+    (
+        "admin: books per author",
+        "SELECT COUNT(*) FROM books WHERE author_id = %s",
+        (1,),
+    ),
+    (
+        "wishlist page",
+        """
+        SELECT w.book_id FROM wishlists w WHERE w.user_id = %s
+        ORDER BY w.created_at DESC, w.book_id DESC LIMIT 25
+        """,
+        (1,),
+    ),
+    ("delete book: wishlists", "SELECT 1 FROM wishlists WHERE book_id = %s", (1,)),
+    (
+        "job queue: claim",
+        """
+        SELECT id FROM jobs WHERE status = 'queued' AND run_at <= now()
+        ORDER BY run_at, id LIMIT 1
+        """,
+        (),
+    ),
+]
+
+
+@app.cli.command("db-explain")
+@click.option("--min-rows", default=1000, help="Ignore sequential scans of smaller tables.")
+def db_explain_command(min_rows):
+    """EXPLAIN the hot queries and flag sequential scans of big tables."""
+    conn = get_db_connection()
+    flagged = 0
+    try:
+        with conn, conn.cursor() as cur:
+            for label, sql, params in HOT_QUERIES:
+                scans = migrate.seq_scans(cur, sql, params, min_rows)
+                flagged += bool(scans)
+                detail = ", ".join(f"{t} (~{n} rows)" for t, n in scans)
+                click.echo(f"{'SEQ SCAN' if scans else 'ok':<9} {label}{': ' + detail if detail else ''}")
+    finally:
+        conn.close()
+    if flagged:
+        raise SystemExit(1)
+
+
 if __name__ == "__main__":
     app.run(debug=True)
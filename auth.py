@@ -0,0 +1,140 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from functools import cache
+
+from psycopg2.extras import execute_values
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Password hashing and login throttling.
+# Hashing is deliberately slow, so it runs on a few threads per worker with a
+# bounded queue: a burst of logins waits (briefly) or is turned away instead
+# of occupying every request thread. hashlib releases the GIL while hashing,
+# so other requests keep running. Throttle counters live in Postgres
+# (login_throttle, see migrations/) so every worker sees the same numbers.
+
+
+class Busy(Exception):
+    """No hashing slot became free in time."""
+
+
+class HashPool:
+    """ThreadPoolExecutor with at most `workers` hashes running and `queue` waiting."""
+
+    def __init__(self, workers=2, queue=8, timeout=10.0):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Created on first use, i.e. in the gunicorn worker, not the master
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="pwhash"
+                )
+            return self._executor
+
+    def run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise Busy("hash queue full")
+        try:
+            future = self._pool().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise Busy("hashing timed out") from None
+
+    def check(self, pwhash, password):
+        return self.run(check_password_hash, pwhash, password)
+
+    def generate(self, password, method):
+        return self.run(generate_password_hash, password, method)
+
+
+@cache
+def hash_prefix(method):
+    """Stored-hash prefix ("scrypt:32768:8:1") that `method` produces today."""
+    return generate_password_hash("", method).split("$", 1)[0]
+
+
+@cache
+def dummy_hash(method):
+    # Checked when no account matches, so unknown emails take as long as known ones
+    return generate_password_hash("not-a-password", method)
+
+
+def needs_rehash(pwhash, method):
+    return pwhash.split("$", 1)[0] != hash_prefix(method)
+
+
+# --- Accounts ---
+# One query over both tables; admin rows first (they win a shared email)
+ACCOUNT_SQL = """
+    SELECT 'admin' AS role, id, full_name, password_hash FROM admin WHERE email = %s
+    UNION ALL
+    SELECT 'user', id, full_name, password_hash FROM users WHERE email = %s
+    ORDER BY role
+"""
+ACCOUNT_TABLES = {"admin": "admin", "user": "users"}
+
+
+def set_password_hash(cur, role, account_id, pwhash):
+    table = ACCOUNT_TABLES[role]
+    cur.execute(f"UPDATE {table} SET password_hash = %s WHERE id = %s;", (pwhash, account_id))
+
+
+# --- Throttling ---
+# A limit is (key, max hits, window seconds). A key's window starts with its
+# first hit; once it has `max hits` inside the window it is blocked until the
+# window ends.
+THROTTLE_SQL = """
+    SELECT key, hits, EXTRACT(EPOCH FROM expires_at - now()) AS retry_after
+    FROM login_throttle WHERE key = ANY(%s) AND expires_at > now()
+"""
+
+
+def throttle_params(limits):
+    return ([key for key, _, _ in limits],)
+
+
+def retry_after(rows, limits):
+    """Seconds until every limit has room again (0 if none is exhausted)."""
+    max_hits = {key: n for key, n, _ in limits}
+    waits = [
+        float(r["retry_after"]) for r in rows if r["hits"] >= max_hits.get(r["key"], 0)
+    ]
+    return int(max(waits, default=0)) + (1 if waits else 0)
+
+
+def hit(cur, limits):
+    """Count one attempt against every limit, in one statement."""
+    execute_values(
+        cur,
+        """
+        INSERT INTO login_throttle (key, hits, expires_at)
+        SELECT key, 1, now() + make_interval(secs => window_s)
+        FROM (VALUES %s) AS v (key, window_s)
+        ON CONFLICT (key) DO UPDATE SET
+          hits = CASE WHEN login_throttle.expires_at > now()
+                      THEN login_throttle.hits + 1 ELSE 1 END,
+          expires_at = CASE WHEN login_throttle.expires_at > now()
+                            THEN login_throttle.expires_at ELSE EXCLUDED.expires_at END;
+        """,
+        [(key, window) for key, _, window in limits],
+    )
+
+
+def clear(cur, keys):
+    cur.execute("DELETE FROM login_throttle WHERE key = ANY(%s);", (list(keys),))
+
+
+def purge(cur):
+    cur.execute("DELETE FROM login_throttle WHERE expires_at <= now();")
+    return cur.rowcount
@@ -0,0 +1,81 @@
+class QueryBatch:
+    """Collect several SELECTs and fetch them in a single round trip.
+
+    Every query becomes a scalar subquery of one outer SELECT: row sets come
+    back as a JSON array (json_agg), single rows as a JSON object and scalars
+    as-is. psycopg2 decodes the JSON, so rows arrive as plain dicts (numeric
+    columns become floats, timestamps ISO strings).
+
+        batch = QueryBatch()
+        batch.rows("books", "SELECT ... ORDER BY b.id DESC LIMIT 24", ())
+        batch.scalar("total", "SELECT COUNT(*) FROM books", ())
+        result = batch.run(cur)   # {"books": [...], "total": 42}
+
+    Entries added with cached() are served from a TTLCache when present and
+    only queried (then stored) on a miss.
+    """
+
+    KINDS = ("rows", "one", "scalar")
+
+    def __init__(self):
+        self._parts = []  # (name, kind, sql, params)
+        self._cached = {}  # name -> (cache, key)
+        self._hits = {}
+
+    def add(self, kind, name, sql, params=()):
+        if kind not in self.KINDS:
+            raise ValueError(f"unknown batch kind: {kind}")
+        self._parts.append((name, kind, sql.strip().rstrip(";"), list(params)))
+        return self
+
+    def rows(self, name, sql, params=()):
+        return self.add("rows", name, sql, params)
+
+    def one(self, name, sql, params=()):
+        return self.add("one", name, sql, params)
+
+    def scalar(self, name, sql, params=()):
+        return self.add("scalar", name, sql, params)
+
+    def cached(self, cache, key, kind, sql, params=()):
+        value = cache.get(key)
+        if value is not None:
+            self._hits[key] = value
+        else:
+            self._cached[key] = cache
+            self.add(kind, key, sql, params)
+        return self
+
+    def __len__(self):
+        return len(self._parts)
+
+    def sql(self):
+        """The combined statement and its params."""
+        columns, params = [], []
+        for name, kind, sql, part_params in self._parts:
+            if kind == "rows":
+                # rows keep the subquery's ORDER BY: json_agg reads them in order
+                expr = f"(SELECT coalesce(json_agg(t), '[]'::json) FROM ({sql}) t)"
+            elif kind == "one":
+                expr = f"(SELECT row_to_json(t) FROM ({sql}) t LIMIT 1)"
+            else:
+                expr = f"({sql})"
+            columns.append(f'{expr} AS "{name}"')
+            params += part_params
+        return "SELECT " + ",\n       ".join(columns) + ";", params
+
+    def run(self, cur):
+        result = dict(self._hits)
+        if not self._parts:
+            return result
+        sql, params = self.sql()
+        cur.execute(sql, params)
+        row = cur.fetchone()
+        if not isinstance(row, dict):
+            row = dict(zip([d[0] for d in cur.description], row))
+        for name, *_ in self._parts:
+            result[name] = row[name]
+            cache = self._cached.get(name)
+            if cache is not None and row[name] is not None:
+                cache.set(name, row[name])
+        return result
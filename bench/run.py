@@ -0,0 +1,272 @@
+"""Drive the app through WSGI with concurrent clients and report latency per route.
+
+    BENCH_DATABASE_URL=postgresql://localhost/bookstore_bench \\
+        python -m bench.run --concurrency 8 --requests 500 --baseline bench/results/<old>.json
+
+Each scenario sends its requests from `--concurrency` threads, each with its
+own Flask test client (no HTTP server in the way, so the numbers are the
+app's own: routing, SQL, templates). Query counts and SQL time come from the
+Server-Timing header. Results go to bench/results/<commit>.json.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+SERVER_TIMING_RE = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+sys.path.insert(0, str(ROOT))
+from bench.seed import WORDS  # noqa: E402
+
+
+# --- Scenarios ---
+# name -> (role, request builder); a builder gets (rng, dataset) and returns
+# (method, path). role is None (anonymous), "user" or "admin".
+def _word(rng):
+    return rng.choice(WORDS)
+
+
+SCENARIOS = {
+    "index": (None, lambda rng, d: ("GET", "/")),
+    "store": (None, lambda rng, d: ("GET", "/store")),
+    "store_search": (None, lambda rng, d: ("GET", f"/store?q={_word(rng)}")),
+    "store_search_sorted": (
+        None,
+        lambda rng, d: ("GET", f"/store?q={_word(rng)}+{_word(rng)}&sort=price_asc"),
+    ),
+    "store_category": (
+        None,
+        lambda rng, d: ("GET", f"/store?category_id={rng.randint(1, d['categories'])}&sort=title_asc"),
+    ),
+    "store_deep_page": (
+        None,
+        lambda rng, d: ("GET", f"/store?sort=price_desc&page={rng.randint(50, max(50, d['books'] // 24))}"),
+    ),
+    "book_view": (None, lambda rng, d: ("GET", f"/book/{rng.randint(1, d['books'])}")),
+    "api_books": (
+        None,
+        lambda rng, d: ("GET", f"/api/v1/books?category_id={rng.randint(1, d['categories'])}&fields=id,title,price"),
+    ),
+    "admin": (
+        "admin",
+        lambda rng, d: ("GET", "/admin" if rng.random() < 0.7 else f"/admin?q={_word(rng)}"),
+    ),
+    "wishlist_toggle": (
+        "user",
+        lambda rng, d: ("POST", f"/wishlist/toggle/{rng.randint(1, d['books'])}"),
+    ),
+}
+
+
+def dataset(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT (SELECT COALESCE(max(id), 0) FROM books) AS books,
+                   (SELECT COALESCE(max(id), 0) FROM authors) AS authors,
+                   (SELECT COALESCE(max(id), 0) FROM categories) AS categories,
+                   (SELECT COALESCE(max(id), 0) FROM users) AS users,
+                   (SELECT COALESCE(min(id), 0) FROM admin) AS admin_id,
+                   (SELECT reltuples::bigint FROM pg_class WHERE relname = 'wishlists') AS wishlists;
+            """
+        )
+        names = [c.name for c in cur.description]
+        return dict(zip(names, cur.fetchone()))
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, round(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_scenario(app, name, data, args):
+    role, build = SCENARIOS[name]
+    samples = []  # (seconds, status, queries, db_ms, cache_hit)
+    lock = threading.Lock()
+    todo = iter(range(args.requests))
+
+    def signed_in_client(rng):
+        client = app.test_client()
+        if role:
+            with client.session_transaction() as sess:
+                sess["role"] = role
+                sess["user_id"] = data["admin_id"] if role == "admin" else rng.randint(1, data["users"])
+        return client
+
+    def client_loop(worker):
+        rng = random.Random(f"{args.seed}-{name}-{worker}")
+        client = signed_in_client(rng)
+        while True:
+            with lock:
+                if next(todo, None) is None:
+                    return
+            method, path = build(rng, data)
+            started = time.perf_counter()
+            response = client.open(path, method=method)
+            response.get_data()  # drain streamed bodies too
+            elapsed = time.perf_counter() - started
+            m = SERVER_TIMING_RE.search(response.headers.get("Server-Timing", ""))
+            sample = (
+                elapsed,
+                response.status_code,
+                int(m.group(2)) if m else None,
+                float(m.group(1)) if m else None,
+                response.headers.get("X-Cache") == "HIT",
+            )
+            response.close()
+            with lock:
+                samples.append(sample)
+
+    # warm-up: pool connections, template compilation, catalog cache
+    rng = random.Random(f"{args.seed}-{name}-warmup")
+    client = signed_in_client(rng)
+    for _ in range(args.warmup):
+        method, path = build(rng, data)
+        client.open(path, method=method).close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies = sorted(s[0] * 1000 for s in samples)
+    queries = [s[2] for s in samples if s[2] is not None]
+    db_ms = [s[3] for s in samples if s[3] is not None]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for s in samples if s[1] >= 400),
+        "throughput_rps": round(len(samples) / wall, 1) if wall else None,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+        "db_ms_per_request": round(sum(db_ms) / len(db_ms), 2) if db_ms else None,
+        "page_cache_hits": sum(1 for s in samples if s[4]),
+    }
+
+
+# --- Reporting ---
+COLUMNS = ("requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request")
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], cwd=ROOT).returncode != 0
+        return out + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_table(results, baseline=None):
+    head = f"{'scenario':<22}" + "".join(f"{c:>20}" for c in COLUMNS)
+    print(head)
+    print("-" * len(head))
+    for name, r in results.items():
+        old = (baseline or {}).get(name)
+        cells = []
+        for c in COLUMNS:
+            value = r.get(c)
+            cell = "-" if value is None else str(value)
+            if old and isinstance(value, (int, float)) and old.get(c):
+                cell += f" ({(value - old[c]) / old[c] * 100:+.0f}%)"
+            cells.append(f"{cell:>20}")
+        print(f"{name:<22}" + "".join(cells))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("scenarios", nargs="*", help=f"default: all of {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=300, help="per scenario")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--page-cache", action="store_true", help="keep the anonymous page cache on (off by default)"
+    )
+    parser.add_argument("--baseline", type=Path, help="earlier results file to compare with")
+    parser.add_argument("--out", type=Path, help="default: bench/results/<commit>.json")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        sys.exit("Set BENCH_DATABASE_URL to the database filled by `python -m bench.seed`.")
+    # The app reads its settings at import time
+    os.environ["DATABASE_URL"] = url
+    os.environ["SERVER_TIMING"] = "1"
+    os.environ.setdefault("DB_POOL_MAX", str(args.concurrency + 2))
+    os.environ.setdefault("SLOW_QUERY_MS", "2000")  # keep the report readable
+    if not args.page_cache:
+        os.environ["PAGE_CACHE_TTL"] = "0"
+    from app import app, get_db_connection
+
+    app.config["WTF_CSRF_ENABLED"] = False
+    with app.app_context():
+        conn = get_db_connection()
+        data = dataset(conn)
+        conn.close()
+    if not data["books"]:
+        sys.exit("The benchmark database is empty; run `python -m bench.seed` first.")
+    print(
+        f"{data['books']} books, {data['authors']} authors, {data['categories']} categories, "
+        f"{data['users']} users, ~{data['wishlists']} wishlist rows; concurrency {args.concurrency}"
+    )
+
+    results = {}
+    for name in args.scenarios or SCENARIOS:
+        if SCENARIOS[name][0] == "user" and not data["users"]:
+            print(f"skipping {name}: no users")
+            continue
+        results[name] = run_scenario(app, name, data, args)
+        print(f"  {name}: p50 {results[name]['p50_ms']} ms", flush=True)
+
+    baseline = json.loads(args.baseline.read_text())["scenarios"] if args.baseline else None
+    print_table(results, baseline)
+
+    commit = git_commit()
+    out = args.out or RESULTS_DIR / f"{commit}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(
+        json.dumps(
+            {
+                "commit": commit,
+                "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "dataset": data,
+                "settings": {
+                    "concurrency": args.concurrency,
+                    "requests": args.requests,
+                    "seed": args.seed,
+                    "page_cache": args.page_cache,
+                    "python": sys.version.split()[0],
+                },
+                "scenarios": results,
+            },
+            indent=2,
+        )
+    )
+    print(f"Saved {out}")
+
+
+if __name__ == "__main__":
+    main()
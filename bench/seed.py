@@ -0,0 +1,197 @@
+"""Fill a scratch database with a synthetic catalog for benchmarks.
+
+    BENCH_DATABASE_URL=postgresql://localhost/bookstore_bench \\
+        python -m bench.seed --books 1000000 --authors 100000 --wishlists 3000000
+
+Rows are generated inside Postgres (generate_series + a seeded random()),
+so a million books take minutes, not hours, and the same --seed gives the
+same data. The database is migrated first and its catalog tables are
+emptied, so never point this at a database you care about.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import psycopg2
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import migrate  # noqa: E402
+import related  # noqa: E402
+
+BENCH_PASSWORD = "bench-password"
+ADMIN_EMAIL = "admin@bench.test"
+CHUNK = 100_000
+
+WORDS = """
+shadow river garden winter empire silent golden broken hidden last night city
+light storm iron glass secret journey letters house island dream fire stone
+memory crown forest ocean song mirror road star war peace love death time
+kingdom wolf raven summer daughter king queen stranger machine code history
+science murder detective mountain harbor wind ghost promise truth lies bridge
+""".split()
+FIRST_NAMES = """
+Ada Alan Anne Boris Clara David Elena Frank Grace Hugo Irene James Karin Leo
+Maria Nikolai Olga Paul Rosa Samuel Tara Victor Wanda Yusuf Zora
+""".split()
+LAST_NAMES = """
+Adams Baker Chen Dubois Evans Fischer Garcia Hughes Ivanova Jensen Kowalski
+Lopez Moreau Novak Okafor Petrov Quinn Rossi Silva Tanaka Ueda Vargas Weber
+""".split()
+
+
+def dsn_from_env():
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        sys.exit("Set BENCH_DATABASE_URL to a scratch database (it will be overwritten).")
+    return url
+
+
+def step(label, conn, sql, params=None):
+    started = time.perf_counter()
+    with conn, conn.cursor() as cur:
+        cur.execute(sql, params)
+        rows = cur.rowcount
+    print(f"{label}: {rows} rows in {time.perf_counter() - started:.1f}s", flush=True)
+
+
+def chunked(label, conn, total, sql, params):
+    """Run an INSERT ... FROM generate_series(%(lo)s, %(hi)s) in commits of CHUNK rows."""
+    started = time.perf_counter()
+    for lo in range(1, total + 1, CHUNK):
+        hi = min(total, lo + CHUNK - 1)
+        with conn, conn.cursor() as cur:
+            cur.execute(sql, dict(params, lo=lo, hi=hi))
+        print(f"\r{label}: {hi}/{total}", end="", flush=True)
+    print(f"\r{label}: {total} in {time.perf_counter() - started:.1f}s", flush=True)
+
+
+def seed(conn, args):
+    migrate.migrate(conn)
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT setseed(%s);", (args.seed % 1000 / 1000,))
+        cur.execute(
+            "TRUNCATE wishlists, book_neighbors, related_terms, related_model,"
+            " books, authors, categories, users, admin"
+            " RESTART IDENTITY CASCADE;"
+        )
+        # Faster bulk load; a crash only loses the seed run
+        cur.execute("SET synchronous_commit = off;")
+
+    step(
+        "categories",
+        conn,
+        """
+        INSERT INTO categories (name)
+        SELECT initcap(w[1 + (i * 7) %% cardinality(w)]) || ' ' || i
+        FROM generate_series(1, %(n)s) i, (SELECT %(words)s::text[] AS w) words;
+        """,
+        dict(n=args.categories, words=WORDS),
+    )
+    step(
+        "authors",
+        conn,
+        """
+        INSERT INTO authors (name)
+        SELECT f[1 + floor(random() * cardinality(f))::int] || ' '
+               || l[1 + floor(random() * cardinality(l))::int] || ' ' || i
+        FROM generate_series(1, %(n)s) i,
+             (SELECT %(first)s::text[] AS f, %(last)s::text[] AS l) names;
+        """,
+        dict(n=args.authors, first=FIRST_NAMES, last=LAST_NAMES),
+    )
+    # Squared random() skews books towards the first categories/authors, like real catalogs
+    chunked(
+        "books",
+        conn,
+        args.books,
+        """
+        INSERT INTO books (title, author_id, description, category_id, price, cover, file, date_added)
+        SELECT
+          initcap(w[1 + floor(random() * cardinality(w))::int] || ' '
+                  || w[1 + floor(random() * cardinality(w))::int] || ' '
+                  || w[1 + floor(random() * cardinality(w))::int]),
+          1 + floor(power(random(), 2) * %(authors)s)::int,
+          array_to_string(ARRAY(
+            SELECT w[1 + floor(random() * cardinality(w))::int]
+            FROM generate_series(1, 20 + i %% 60)
+          ), ' '),
+          1 + floor(power(random(), 2) * %(categories)s)::int,
+          CASE WHEN random() < 0.05 THEN NULL ELSE round((2 + random() * 58)::numeric, 2) END,
+          '',
+          '',
+          current_date - floor(random() * 3650)::int
+        FROM generate_series(%(lo)s, %(hi)s) i, (SELECT %(words)s::text[] AS w) words;
+        """,
+        dict(authors=args.authors, categories=args.categories, words=WORDS),
+    )
+
+    pwhash = generate_password_hash(BENCH_PASSWORD)
+    step(
+        "admin",
+        conn,
+        "INSERT INTO admin (full_name, email, password_hash) VALUES ('Bench Admin', %s, %s);",
+        (ADMIN_EMAIL, pwhash),
+    )
+    step(
+        "users",
+        conn,
+        """
+        INSERT INTO users (full_name, email, password_hash)
+        SELECT 'Bench User ' || i, 'user' || i || '@bench.test', %(pwhash)s
+        FROM generate_series(1, %(n)s) i;
+        """,
+        dict(n=args.users, pwhash=pwhash),
+    )
+    if args.users:
+        chunked(
+            "wishlists",
+            conn,
+            args.wishlists,
+            """
+            INSERT INTO wishlists (user_id, book_id, created_at)
+            SELECT 1 + floor(power(random(), 2) * %(users)s)::int,
+                   1 + floor(random() * %(books)s)::int,
+                   now() - random() * interval '365 days'
+            FROM generate_series(%(lo)s, %(hi)s)
+            ON CONFLICT DO NOTHING;
+            """,
+            dict(users=args.users, books=args.books),
+        )
+
+    started = time.perf_counter()
+    conn.autocommit = True  # VACUUM refuses to run in a transaction
+    with conn.cursor() as cur:
+        cur.execute("VACUUM ANALYZE;")
+    conn.autocommit = False
+    print(f"vacuum analyze: {time.perf_counter() - started:.1f}s", flush=True)
+    if args.related:
+        started = time.perf_counter()
+        related.rebuild(conn)
+        print(f"related books: {time.perf_counter() - started:.1f}s", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--authors", type=int, default=10_000)
+    parser.add_argument("--categories", type=int, default=500)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--wishlists", type=int, default=300_000, help="rows attempted (duplicates are skipped)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--related", action="store_true", help="also precompute related books (slow for large catalogs)")
+    args = parser.parse_args(argv)
+
+    conn = psycopg2.connect(dsn_from_env())
+    try:
+        seed(conn, args)
+    finally:
+        conn.close()
+    print(f"Done. Sign in as {ADMIN_EMAIL} / user<N>@bench.test with password {BENCH_PASSWORD!r}.")
+
+
+if __name__ == "__main__":
+    main()
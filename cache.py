@@ -0,0 +1,73 @@
+import threading
+import time
+
+
+class TTLCache:
+    """Small thread-safe in-process cache with per-entry expiry.
+
+    Each gunicorn worker has its own copy, so explicit invalidation only
+    reaches the worker that made the change; the TTL bounds how long the
+    other workers can serve stale data.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, ttl=300.0, maxsize=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = {}  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._stats["hits"] += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self._stats["misses"] += 1
+        return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires_at, value)
+            if self.maxsize and len(self._data) > self.maxsize:
+                # dicts keep insertion order: drop the oldest entry
+                del self._data[next(iter(self._data))]
+                self._stats["evictions"] += 1
+
+    def get_or_load(self, key, loader, ttl=None):
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, *keys):
+        """Drop the given keys, or everything when called without keys."""
+        with self._lock:
+            if not keys:
+                self._data.clear()
+            for key in keys:
+                self._data.pop(key, None)
+            self._stats["invalidations"] += 1
+
+    def invalidate_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if str(k).startswith(prefix)]:
+                del self._data[key]
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                size=len(self._data),
+                hit_ratio=round(self._stats["hits"] / lookups, 3) if lookups else None,
+            )
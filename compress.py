@@ -0,0 +1,89 @@
+import gzip
+import os
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional: gzip only
+    brotli = None
+
+# Response compression: content negotiation, on-the-fly compression for
+# dynamic responses and precompressed .br/.gz siblings for static files.
+
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE_TYPES = (
+    "application/javascript",
+    "application/json",
+    "application/manifest+json",
+    "application/xml",
+    "image/svg+xml",
+)
+STATIC_EXTS = {".css", ".js", ".mjs", ".json", ".map", ".svg", ".html", ".txt", ".xml", ".ico", ".webmanifest"}
+
+
+def available():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith("text/") or mimetype in COMPRESSIBLE_TYPES)
+
+
+def negotiate(accept_encodings):
+    """Best encoding the client accepts (werkzeug Accept), preferring br; None for identity."""
+    best, best_q = None, 0
+    for encoding in available():
+        q = accept_encodings[encoding]
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data, encoding, level):
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+# --- Precompressed static files ---
+def precompressed(path, encoding):
+    """The .br/.gz sibling of `path` if it exists and is not older than the file."""
+    sibling = f"{path}{SUFFIXES[encoding]}"
+    try:
+        if os.stat(sibling).st_mtime >= os.stat(path).st_mtime:
+            return sibling
+    except OSError:
+        pass
+    return None
+
+
+def precompress_tree(root, exclude=(), min_size=1024, force=False):
+    """Write .br/.gz next to every compressible file under `root`.
+
+    Skips up-to-date siblings (unless force) and drops siblings that would
+    not save at least 10%. Yields (relative path, encoding, size, compressed size).
+    """
+    root = Path(root)
+    for path in sorted(root.rglob("*")):
+        rel = path.relative_to(root)
+        if not path.is_file() or path.suffix.lower() not in STATIC_EXTS:
+            continue
+        if rel.parts and rel.parts[0] in exclude:
+            continue
+        data = None
+        for encoding in available():
+            if not force and precompressed(path, encoding):
+                continue
+            if data is None:
+                data = path.read_bytes()
+            if len(data) < min_size:
+                break
+            sibling = Path(f"{path}{SUFFIXES[encoding]}")
+            packed = compress(data, encoding, 11 if encoding == "br" else 9)
+            if len(packed) > len(data) * 0.9:
+                sibling.unlink(missing_ok=True)
+                continue
+            tmp = sibling.with_name(f".{sibling.name}.tmp")
+            tmp.write_bytes(packed)
+            os.replace(tmp, sibling)
+            yield str(rel), encoding, len(data), len(packed)
@@ -1,3 +1,5 @@
+# Original one-off setup script, kept for reference. The schema now lives in
+# migrations/ and is applied with `flask --app app db-migrate`.
 import os
 import psycopg2
 
@@ -0,0 +1,296 @@
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Raised when no connection frees up within the pool timeout."""
+
+
+class PooledConnection(extensions.connection):
+    """psycopg2 connection whose close() hands it back to its pool.
+
+    Routes keep calling conn.close() exactly like before; the physical
+    connection stays open and goes back to the idle list.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = None
+        self._checked_out = False
+        self.lease = 0  # bumped on every checkout
+        self._created_at = time.monotonic()
+        self._last_used = self._created_at
+
+    def cursor(self, *args, **kwargs):
+        wrap = self._pool.cursor_wrapper if self._pool is not None else None
+        if wrap is not None:
+            factory = kwargs.get("cursor_factory") or self.cursor_factory or extensions.cursor
+            kwargs["cursor_factory"] = wrap(factory)
+        return super().cursor(*args, **kwargs)
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        elif self._checked_out:
+            self._pool.putconn(self)
+        # already back in the pool: closing twice is a no-op
+
+    def release(self, lease):
+        """close(), but only if the connection is still on checkout `lease`.
+
+        Lets request teardown return what a route forgot to close without
+        touching a connection that went back and was checked out by another
+        thread in the meantime.
+        """
+        if self._pool is not None and self._checked_out and self.lease == lease:
+            self._pool.putconn(self)
+
+    def discard(self):
+        """Really close the physical connection."""
+        try:
+            super().close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of psycopg2 connections for one DSN.
+
+    - session setup (search_path) runs once per physical connection
+    - connections idle longer than `check_after` are pinged on checkout
+    - connections idle longer than `max_idle` or older than `max_lifetime`
+      are recycled
+    - getconn() waits up to `timeout` seconds once `maxconn` are in use
+    - `cursor_wrapper(cursor_class)`, if given, picks the class of every
+      cursor opened on a checked-out connection (used for query timing)
+    """
+
+    def __init__(
+        self,
+        dsn,
+        minconn=1,
+        maxconn=5,
+        timeout=10.0,
+        max_idle=300.0,
+        max_lifetime=1800.0,
+        check_after=30.0,
+        setup_sql="SET search_path TO public;",
+        cursor_wrapper=None,
+    ):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self.setup_sql = setup_sql
+        self.cursor_wrapper = cursor_wrapper
+        self.pid = os.getpid()
+
+        self._idle = deque()  # most recently used on the right
+        self._size = 0  # open connections: idle + checked out
+        self._cond = threading.Condition()
+        self._stats = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "recycled": 0,
+        }
+
+    # --- Physical connections ---
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, connection_factory=PooledConnection)
+        if self.setup_sql:
+            with conn.cursor() as cur:
+                cur.execute(self.setup_sql)
+            conn.commit()
+        conn._pool = self
+        with self._cond:
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _discard(self, conn, reason=None):
+        conn._pool = None
+        conn.discard()
+        with self._cond:
+            self._size -= 1
+            self._stats["connections_closed"] += 1
+            if reason:
+                self._stats[reason] += 1
+            self._cond.notify()
+
+    def _expired(self, conn, now):
+        if conn.closed:
+            return True
+        if self.max_lifetime and now - conn._created_at > self.max_lifetime:
+            return True
+        if self.max_idle and now - conn._last_used > self.max_idle:
+            return True
+        return False
+
+    def _healthy(self, conn, now):
+        if conn.closed:
+            return False
+        if now - conn._last_used < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    # --- Checkout / return ---
+    def warm(self):
+        """Open connections up to `minconn` so the first requests skip the handshake."""
+        opened = []
+        while True:
+            with self._cond:
+                if self._size >= self.minconn:
+                    break
+                self._size += 1
+            try:
+                opened.append(self._connect())
+            except psycopg2.Error:
+                with self._cond:
+                    self._size -= 1
+                break
+        with self._cond:
+            self._idle.extend(opened)
+            self._cond.notify(len(opened))
+
+    def _reserve(self):
+        """Pop an idle connection, or reserve a slot for a new one.
+
+        Returns (conn_or_None, stale) where stale are expired idle
+        connections the caller must discard outside the lock.
+        """
+        deadline = time.monotonic() + self.timeout
+        stale = []
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._idle:
+                    conn = self._idle.pop()
+                    if self._expired(conn, now):
+                        stale.append(conn)
+                        continue
+                    return conn, stale
+                if self._size - len(stale) < self.maxconn:
+                    self._size += 1
+                    return None, stale
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"no database connection available after {self.timeout}s"
+                    )
+                self._stats["waits"] += 1
+                self._cond.wait(remaining)
+
+    def getconn(self):
+        while True:
+            conn, stale = self._reserve()
+            for old in stale:
+                self._discard(old, "recycled")
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._healthy(conn, time.monotonic()):
+                self._discard(conn, "health_check_failures")
+                continue
+            conn.lease += 1  # before _checked_out, so release() never matches a stale lease
+            conn._checked_out = True
+            with self._cond:
+                self._stats["checkouts"] += 1
+            return conn
+
+    def putconn(self, conn):
+        if conn._pool is not self or not conn._checked_out:
+            return
+        conn._checked_out = False
+        if conn.closed:
+            self._discard(conn)
+            return
+        try:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._discard(conn)
+                return
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                # a route returned mid-transaction: never leak it to the next request
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+
+        conn._last_used = time.monotonic()
+        if self._expired(conn, conn._last_used):
+            self._discard(conn, "recycled")
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._stats,
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._size - len(self._idle),
+                maxconn=self.maxconn,
+                pid=self.pid,
+            )
+
+
+# --- One pool per DSN per worker process ---
+_pools = {}
+_orphaned = []
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn, **options):
+    """Return this process's pool for `dsn`, creating (and warming) it on first use.
+
+    gunicorn forks workers, so a pool inherited from the parent is left alone
+    (closing it would tear down the parent's sockets) and a fresh one is built.
+    """
+    with _pools_lock:
+        pool = _pools.get(dsn)
+        if pool is not None and pool.pid == os.getpid():
+            return pool
+        if pool is not None:
+            _orphaned.append(pool)
+        pool = ConnectionPool(dsn, **options)
+        _pools[dsn] = pool
+    pool.warm()
+    return pool
+
+
+def all_pools():
+    pid = os.getpid()
+    return [p for p in _pools.values() if p.pid == pid]
@@ -0,0 +1,20 @@
+import os
+
+# gunicorn settings for the web process (Procfile: gunicorn -c gunicorn.conf.py).
+# Requests spend most of their time waiting on Postgres over the network, and
+# psycopg2 releases the GIL while it waits, so each worker process runs
+# several request threads instead of one: in-flight requests per dyno are
+# workers x threads rather than workers.
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "3"))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+timeout = int(os.getenv("WEB_TIMEOUT", "30"))
+keepalive = 5
+
+# Routes hold one pooled connection at a time; twice the thread count leaves
+# headroom so a request that ever nests a checkout (e.g. a cached lookup made
+# while its own connection is open) cannot starve the other threads
+# (read by app.py in each worker)
+os.environ.setdefault("DB_POOL_MAX", str(threads * 2))
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+NO_STORE = "no-store, no-cache, must-revalidate, max-age=0, private"
+REVALIDATE_PRIVATE = "private, no-cache"
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def cache_policy(kind, max_age=None):
+    """Tag a view with its HTTP caching class.
+
+    "private"  authenticated/personal pages: never stored (the default)
+    "public"   catalog pages: ETag/Last-Modified from the catalog version,
+               shareable for anonymous visitors, 304 without rendering
+    "revalidate" stored but always revalidated with the response's own
+               ETag/Last-Modified (downloads whose URL outlives the content)
+    "immutable" content never changes under this URL (cached for a year)
+    max_age=None uses the app-wide default for the class.
+    Put it below @app.route so the registered view carries the tag.
+    """
+
+    def deco(f):
+        f.cache_policy = (kind, max_age)
+        return f
+
+    return deco
+
+
+def policy_for(view):
+    return getattr(view, "cache_policy", ("private", None))
+
+
+def make_etag(*parts):
+    raw = "\x1f".join(repr(p) for p in parts).encode()
+    return hashlib.sha1(raw).hexdigest()[:24]
+
+
+def source_fingerprint(root):
+    """Changes whenever templates or code change, so deploys bust ETags."""
+    commit = os.getenv("RENDER_GIT_COMMIT")
+    if commit:
+        return commit
+    root = Path(root)
+    files = list(root.glob("*.py")) + list((root / "templates").glob("*.html"))
+    return str(max((int(f.stat().st_mtime) for f in files), default=0))
+
+
+class VersionClock:
+    """Catalog change version, re-read at most every `ttl` seconds per worker.
+
+    `loader` returns (version, updated_at). `on_change` runs when another
+    worker (or a direct DB edit) moved the version since the last read.
+    """
+
+    def __init__(self, loader, ttl=5.0, on_change=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.on_change = on_change
+        self._value = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._value is not None and now < self._expires_at:
+                return self._value
+        value = self.loader()
+        with self._lock:
+            previous, self._value = self._value, value
+            self._expires_at = time.monotonic() + self.ttl
+        if previous is not None and previous[0] != value[0] and self.on_change:
+            self.on_change()
+        return value
+
+    def expire(self):
+        with self._lock:
+            self._expires_at = 0.0
@@ -0,0 +1,150 @@
+import base64
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: pages fall back to the original covers
+    Image = ImageOps = None
+
+# Widths offered in srcset and the formats generated for each
+VARIANT_WIDTHS = (120, 240, 480)
+VARIANT_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+PLACEHOLDER_WIDTH = 16
+
+# Generated files live next to the uploads, mirroring the cover's path:
+#   uploads/covers/dracula.jpg -> uploads/variants/covers/dracula.240.webp
+#   uploads/covers/ab/ab12...jpg -> uploads/variants/covers/ab/ab12....240.webp
+VARIANTS_PREFIX = "uploads/variants"
+COVERS_PREFIX = "uploads/covers/"
+
+_placeholders = {}
+_placeholders_lock = threading.Lock()
+
+
+def enabled():
+    return Image is not None
+
+
+def cover_rel_path(cover):
+    """Normalize a books.cover value to a path relative to /static (like the cover_url macros)."""
+    f = cover or ""
+    if f.startswith("static/"):
+        f = f[7:]
+    if not f:
+        return ""
+    return f if f.startswith("uploads/") else f"uploads/covers/{f}"
+
+
+def is_cover(cover_rel):
+    """Only uploaded covers get variants (never a variant of a variant)."""
+    return cover_rel.startswith(COVERS_PREFIX)
+
+
+def variant_rel_path(cover_rel, width, fmt):
+    stem = os.path.splitext(cover_rel[len("uploads/"):])[0]
+    return f"{VARIANTS_PREFIX}/{stem}.{width}.{fmt}"
+
+
+def _open(source, width):
+    img = Image.open(source)
+    # JPEG draft mode decodes at a reduced scale: much faster for thumbnails
+    img.draft("RGB", (width * 2, width * 4))
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    return img
+
+
+def _save_atomic(img, dest, pil_format):
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            img.save(out, pil_format, quality=80, optimize=True)
+        os.replace(tmp, dest)  # other workers see either nothing or the full file
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def make_variant(static_dir, cover_rel, width, fmt, force=False):
+    """Create (if needed) one resized variant; returns its absolute path or None."""
+    if not enabled() or width not in VARIANT_WIDTHS or fmt not in VARIANT_FORMATS:
+        return None
+    static_dir = Path(static_dir)
+    source = static_dir / cover_rel
+    dest = static_dir / variant_rel_path(cover_rel, width, fmt)
+    if dest.exists() and not force:
+        return dest
+    if not source.is_file():
+        return None
+    img = _open(source, width)
+    if img.width > width:
+        img.thumbnail((width, width * 4), Image.LANCZOS)
+    _save_atomic(img, dest, VARIANT_FORMATS[fmt])
+    return dest
+
+
+def make_placeholder(static_dir, cover_rel, force=False):
+    """Tiny blurred JPEG of the cover, stored next to the variants."""
+    if not enabled():
+        return None
+    static_dir = Path(static_dir)
+    source = static_dir / cover_rel
+    dest = static_dir / variant_rel_path(cover_rel, PLACEHOLDER_WIDTH, "jpeg")
+    if dest.exists() and not force:
+        return dest
+    if not source.is_file():
+        return None
+    img = _open(source, PLACEHOLDER_WIDTH)
+    img.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 4), Image.BILINEAR)
+    _save_atomic(img, dest, "JPEG")
+    return dest
+
+
+def make_all(static_dir, cover_rel, force=False):
+    """Every width/format plus the placeholder; used on upload and by the backfill."""
+    made = []
+    for width in VARIANT_WIDTHS:
+        for fmt in VARIANT_FORMATS:
+            if make_variant(static_dir, cover_rel, width, fmt, force):
+                made.append((width, fmt))
+    make_placeholder(static_dir, cover_rel, force)
+    return made
+
+
+def remove_variants(static_dir, cover_rel):
+    """Delete everything generated for a cover (when the cover itself is deleted)."""
+    static_dir = Path(static_dir)
+    for width in VARIANT_WIDTHS + (PLACEHOLDER_WIDTH,):
+        for fmt in VARIANT_FORMATS:
+            try:
+                (static_dir / variant_rel_path(cover_rel, width, fmt)).unlink(missing_ok=True)
+            except OSError:
+                pass
+    with _placeholders_lock:
+        _placeholders.pop(cover_rel, None)
+
+
+def placeholder_data_uri(static_dir, cover_rel):
+    """data: URI of the cover's placeholder ("" if it can't be made), memoized per worker."""
+    if not cover_rel or not enabled():
+        return ""
+    with _placeholders_lock:
+        if cover_rel in _placeholders:
+            return _placeholders[cover_rel]
+    try:
+        path = make_placeholder(static_dir, cover_rel)
+        uri = (
+            "data:image/jpeg;base64," + base64.b64encode(path.read_bytes()).decode()
+            if path
+            else ""
+        )
+    except OSError:
+        uri = ""
+    with _placeholders_lock:
+        _placeholders[cover_rel] = uri
+    return uri
@@ -0,0 +1,280 @@
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+import jobs
+import storage
+
+# Bulk catalog import: a CSV (with a header row) or JSON (list of objects)
+# manifest with these columns; cover/file are paths relative to the asset
+# directory, e.g. "Book Info/". Bad rows are reported and skipped, the rest
+# load in one transaction.
+FIELDS = ("title", "author", "category", "description", "price", "cover", "file")
+TITLE_MAX = 150  # books.title is VARCHAR(150)
+
+
+def read_manifest(path):
+    """[(line, row dict)]; line is the CSV line number or the JSON item number."""
+    path = Path(path)
+    if path.suffix.lower() == ".json":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get("books")
+        if not isinstance(data, list):
+            raise ValueError("JSON manifest must be a list of books (or {\"books\": [...]})")
+        return [
+            (i, {k.strip().lower(): v for k, v in item.items()} if isinstance(item, dict) else {})
+            for i, item in enumerate(data, 1)
+        ]
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        if not reader.fieldnames or "title" not in [h.strip().lower() for h in reader.fieldnames]:
+            raise ValueError(f"CSV manifest needs a header row with: {', '.join(FIELDS)}")
+        return [
+            (reader.line_num, {(k or "").strip().lower(): v for k, v in row.items()})
+            for row in reader
+        ]
+
+
+def _text(raw, key):
+    value = raw.get(key)
+    return "" if value is None else str(value).strip()
+
+
+def _asset(asset_dir, value, exts, label):
+    if not value:
+        raise ValueError(f"{label} is required")
+    path = (asset_dir / value).resolve()
+    if not path.is_relative_to(asset_dir):
+        raise ValueError(f"{label} must be inside the asset directory")
+    if path.suffix.lower().lstrip(".") not in exts:
+        raise ValueError(f"{label} type not allowed: {value}")
+    if not path.is_file():
+        raise ValueError(f"{label} not found: {value}")
+    return path
+
+
+def _validate(raw, asset_dir, cover_exts, file_exts):
+    title = _text(raw, "title")
+    if not title:
+        raise ValueError("title is required")
+    if len(title) > TITLE_MAX:
+        raise ValueError(f"title longer than {TITLE_MAX} characters")
+    author, category = _text(raw, "author"), _text(raw, "category")
+    if not author or not category:
+        raise ValueError("author and category are required")
+    price = None
+    if _text(raw, "price"):
+        try:
+            price = Decimal(_text(raw, "price"))
+        except InvalidOperation:
+            raise ValueError("price must be a number") from None
+        if not price.is_finite() or price < 0:
+            raise ValueError("price must be a valid non-negative number")
+    return {
+        "title": title,
+        "author": author,
+        "category": category,
+        "description": _text(raw, "description"),
+        "price": price,
+        "cover": _asset(asset_dir, _text(raw, "cover"), cover_exts, "cover"),
+        "file": _asset(asset_dir, _text(raw, "file"), file_exts, "file"),
+    }
+
+
+def _spool_file(path, tmp_dir):
+    with open(path, "rb") as f:
+        return storage.spool(f, tmp_dir, path.suffix)
+
+
+def _resolve_names(cur, table, names):
+    """Map lower(name) -> id for `names`, creating the missing ones in one batch."""
+    wanted = {}
+    for name in names:
+        wanted.setdefault(name.lower(), name)  # first spelling wins
+    ids, created = {}, 0
+    for _ in range(2):  # second pass picks up names another session just inserted
+        cur.execute(
+            f"SELECT id, LOWER(name) AS key FROM {table} WHERE LOWER(name) = ANY(%s);",
+            (list(wanted),),
+        )
+        ids.update((r["key"], r["id"]) for r in cur.fetchall())
+        missing = [name for key, name in wanted.items() if key not in ids]
+        if not missing:
+            break
+        rows = execute_values(
+            cur,
+            f"INSERT INTO {table} (name) VALUES %s ON CONFLICT DO NOTHING RETURNING id, LOWER(name) AS key;",
+            [(name,) for name in missing],
+            page_size=1000,
+            fetch=True,
+        )
+        ids.update((r["key"], r["id"]) for r in rows)
+        created += len(rows)
+    return ids, created
+
+
+def run_import(
+    conn,
+    rows,
+    asset_dir,
+    static_dir,
+    tmp_dir,
+    cover_exts,
+    file_exts,
+    workers=8,
+    dry_run=False,
+):
+    """Validate, hash assets in parallel, and load the good rows in one transaction.
+
+    Returns a JSON-friendly report; with dry_run everything runs except
+    placing files and committing.
+    """
+    asset_dir = Path(asset_dir).resolve()
+    errors = []
+    valid = []
+    seen = {}
+    for line, raw in rows:
+        try:
+            row = _validate(raw, asset_dir, cover_exts, file_exts)
+        except ValueError as e:
+            errors.append({"line": line, "error": str(e)})
+            continue
+        key = (row["title"].lower(), row["author"].lower())
+        if key in seen:
+            errors.append({"line": line, "error": f"duplicate of line {seen[key]}"})
+            continue
+        seen[key] = line
+        valid.append((line, row))
+
+    # Hash every distinct asset once, in parallel (I/O and hashlib release the GIL)
+    paths = {row[k] for _, row in valid for k in ("cover", "file")}
+    spooled, failed = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {path: pool.submit(_spool_file, path, tmp_dir) for path in paths}
+        for path, future in futures.items():
+            try:
+                spooled[path] = future.result()
+            except OSError as e:
+                failed[path] = e
+
+    report = {
+        "rows": len(rows),
+        "inserted": 0,
+        "authors_created": 0,
+        "categories_created": 0,
+        "assets": 0,
+        "dry_run": dry_run,
+        "errors": errors,
+    }
+    try:
+        staged = []
+        by_rel = {}  # blob path -> spooled file
+        for line, row in valid:
+            bad = failed.get(row["cover"]) or failed.get(row["file"])
+            if bad:
+                errors.append({"line": line, "error": f"cannot read asset: {bad}"})
+                continue
+            cover, file = spooled[row["cover"]], spooled[row["file"]]
+            row["cover_rel"] = storage.blob_rel_path("covers", cover.sha256, cover.ext)
+            row["file_rel"] = storage.blob_rel_path("files", file.sha256, file.ext)
+            by_rel[row["cover_rel"]], by_rel[row["file_rel"]] = cover, file
+            staged.append((line, row))
+
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            author_ids, report["authors_created"] = _resolve_names(
+                cur, "authors", [r["author"] for _, r in staged]
+            )
+            category_ids, report["categories_created"] = _resolve_names(
+                cur, "categories", [r["category"] for _, r in staged]
+            )
+
+            cur.execute(
+                """
+                CREATE TEMP TABLE import_books (
+                  line INTEGER, title TEXT, author_id INTEGER, category_id INTEGER,
+                  description TEXT, price NUMERIC, cover TEXT, file TEXT
+                ) ON COMMIT DROP;
+                """
+            )
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for line, r in staged:
+                writer.writerow(
+                    (
+                        line,
+                        r["title"],
+                        author_ids[r["author"].lower()],
+                        category_ids[r["category"].lower()],
+                        r["description"],
+                        r["price"],
+                        r["cover_rel"],
+                        r["file_rel"],
+                    )
+                )
+            buf.seek(0)
+            cur.copy_expert(
+                "COPY import_books FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (description));",
+                buf,
+            )
+
+            # Same rule as the edit form: one book per (title, author)
+            cur.execute(
+                """
+                DELETE FROM import_books s
+                USING books b
+                WHERE LOWER(b.title) = LOWER(s.title) AND b.author_id = s.author_id
+                RETURNING s.line;
+                """
+            )
+            for r in cur.fetchall():
+                errors.append({"line": r["line"], "error": "book already exists"})
+
+            cur.execute(
+                """
+                SELECT path, COUNT(*) AS refs FROM (
+                  SELECT cover AS path FROM import_books
+                  UNION ALL
+                  SELECT file FROM import_books
+                ) p GROUP BY path;
+                """
+            )
+            blobs = {r["path"]: (by_rel[r["path"]], r["refs"]) for r in cur.fetchall()}
+            report["assets"] = len(blobs)
+            if not dry_run:
+                storage.place_many(cur, blobs, static_dir)
+
+            cur.execute(
+                """
+                INSERT INTO books (title, author_id, category_id, description, price, cover, file)
+                SELECT title, author_id, category_id, description, price, cover, file
+                FROM import_books ORDER BY line;
+                """
+            )
+            report["inserted"] = cur.rowcount
+            cur.execute("SELECT DISTINCT cover FROM import_books;")
+            jobs.enqueue_many(
+                cur, "covers.variants", [{"cover": r["cover"]} for r in cur.fetchall()]
+            )
+            if report["inserted"]:
+                jobs.enqueue(cur, "related.rebuild")  # cheaper than one refresh per book
+
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        for s in spooled.values():
+            storage.discard(s)
+
+    errors.sort(key=lambda e: e["line"])
+    return report
@@ -0,0 +1,293 @@
+import json
+import os
+import random
+import select
+import socket
+import threading
+import traceback
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+
+# Durable background jobs in Postgres (jobs/job_schedules tables: migrations/).
+# enqueue() writes through the caller's cursor, so a job exists only if the
+# transaction that asked for it commits. Workers claim rows with
+# FOR UPDATE SKIP LOCKED, so any number of them can run side by side.
+# Handlers may run more than once (a worker can die mid-job): keep them idempotent.
+
+CHANNEL = "jobs"
+
+_handlers = {}  # kind -> (func, max_attempts)
+_schedules = {}  # name -> (every_seconds, kind, payload)
+
+
+def job(kind, max_attempts=5):
+    """Register the handler for a job kind; it is called with the payload dict."""
+
+    def deco(f):
+        _handlers[kind] = (f, max_attempts)
+        return f
+
+    return deco
+
+
+def periodic(name, every, kind, payload=None):
+    """Enqueue `kind` every `every` seconds (once across all workers)."""
+    _schedules[name] = (int(every), kind, payload or {})
+
+
+def enqueue(cur, kind, payload=None, delay=0):
+    """Queue a job inside the caller's transaction; returns the job id."""
+    _, max_attempts = _handlers.get(kind, (None, 5))
+    cur.execute(
+        """
+        INSERT INTO jobs (kind, payload, run_at, max_attempts)
+        VALUES (%s, %s, now() + make_interval(secs => %s), %s)
+        RETURNING id;
+        """,
+        (kind, json.dumps(payload or {}), delay, max_attempts),
+    )
+    row = cur.fetchone()
+    cur.execute(f"NOTIFY {CHANNEL};")  # delivered on commit, wakes idle workers
+    return row["id"] if isinstance(row, dict) else row[0]
+
+
+def enqueue_many(cur, kind, payloads):
+    """enqueue() for a batch of payloads in one statement."""
+    if not payloads:
+        return
+    _, max_attempts = _handlers.get(kind, (None, 5))
+    execute_values(
+        cur,
+        "INSERT INTO jobs (kind, payload, max_attempts) VALUES %s;",
+        [(kind, json.dumps(p), max_attempts) for p in payloads],
+        page_size=1000,
+    )
+    cur.execute(f"NOTIFY {CHANNEL};")
+
+
+def backoff(attempts):
+    """Seconds before retry n: 15s, 30s, 1m, 2m ... capped at 1h, with jitter."""
+    return min(3600, 15 * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+class Worker:
+    """Poll-and-listen loop that runs queued jobs one at a time.
+
+    `run_job(func, payload)` wraps each handler call (the app uses it to give
+    every job a fresh app context). While a job runs, its locked_at is
+    refreshed every `heartbeat` seconds; a job whose locked_at is older than
+    `stale_after` seconds (its worker died) goes back in the queue, or is
+    marked failed once it has used up its attempts.
+    """
+
+    def __init__(
+        self, dsn, run_job=None, poll_interval=5.0, stale_after=900, heartbeat=60, name=None
+    ):
+        self.dsn = dsn
+        self.run_job = run_job or (lambda func, payload: func(payload))
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.heartbeat = min(heartbeat, stale_after / 3)
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.conn = None
+        self._stopping = False
+
+    def connect(self):
+        self.conn = psycopg2.connect(self.dsn, cursor_factory=RealDictCursor)
+        self.conn.autocommit = True  # every statement below is its own transaction
+        with self.conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL};")
+            for name, (every, kind, payload) in _schedules.items():
+                cur.execute(
+                    """
+                    INSERT INTO job_schedules (name, kind, payload, every_seconds)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (name) DO UPDATE
+                    SET kind = EXCLUDED.kind, payload = EXCLUDED.payload,
+                        every_seconds = EXCLUDED.every_seconds;
+                    """,
+                    (name, kind, json.dumps(payload), every),
+                )
+
+    def stop(self, *_):
+        self._stopping = True
+
+    def run(self):
+        self.connect()
+        while not self._stopping:
+            self.requeue_stale()
+            self.enqueue_due_schedules()
+            while not self._stopping and self.run_once():
+                pass
+            self.wait()
+        self.conn.close()
+
+    def wait(self):
+        """Sleep until NOTIFY or the poll interval, whichever comes first."""
+        if select.select([self.conn], [], [], self.poll_interval) != ([], [], []):
+            self.conn.poll()
+            self.conn.notifies.clear()
+
+    def enqueue_due_schedules(self):
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                WITH due AS (
+                    UPDATE job_schedules s
+                    SET next_run_at = now() + make_interval(secs => s.every_seconds)
+                    WHERE s.name IN (
+                        SELECT name FROM job_schedules
+                        WHERE next_run_at <= now()
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING s.kind, s.payload
+                )
+                INSERT INTO jobs (kind, payload, max_attempts)
+                SELECT due.kind, due.payload, COALESCE(h.max_attempts, 5)
+                FROM due
+                LEFT JOIN unnest(%s::text[], %s::int[]) AS h (kind, max_attempts)
+                  ON h.kind = due.kind;
+                """,
+                (list(_handlers), [m for _, m in _handlers.values()]),
+            )
+
+    def requeue_stale(self):
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE jobs
+                SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                    finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE now() END,
+                    last_error = 'worker ' || COALESCE(locked_by, '?') || ' stopped responding',
+                    locked_by = NULL, locked_at = NULL
+                WHERE status = 'running'
+                  AND locked_at < now() - make_interval(secs => %s)
+                RETURNING id, kind, status, last_error;
+                """,
+                (self.stale_after,),
+            )
+            for row in cur.fetchall():
+                print(f"Job {row['id']} ({row['kind']}) abandoned, now {row['status']}: {row['last_error']}")
+
+    def claim(self):
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1,
+                    locked_at = now(), locked_by = %s
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE status = 'queued' AND run_at <= now()
+                    ORDER BY run_at, id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id, kind, payload, attempts, max_attempts;
+                """,
+                (self.name,),
+            )
+            return cur.fetchone()
+
+    def run_once(self):
+        """Run one due job; returns False when the queue is empty."""
+        row = self.claim()
+        if row is None:
+            return False
+        func, _ = _handlers.get(row["kind"], (None, None))
+        done = threading.Event()
+        beat = threading.Thread(target=self.keep_alive, args=(row, done), daemon=True)
+        beat.start()
+        try:
+            if func is None:
+                raise LookupError(f"no handler for job kind {row['kind']!r}")
+            self.run_job(func, row["payload"])
+        except Exception:
+            error = traceback.format_exc(limit=5)
+        else:
+            error = None
+        finally:
+            done.set()
+            beat.join()
+        if error:
+            self.fail(row, error)
+        else:
+            self.finish(row)
+        return True
+
+    def keep_alive(self, row, done):
+        """Refresh the running job's locked_at so requeue_stale() leaves it alone."""
+        while not done.wait(self.heartbeat):
+            try:
+                with self.conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        UPDATE jobs SET locked_at = now()
+                        WHERE id = %s AND status = 'running' AND locked_by = %s;
+                        """,
+                        (row["id"], self.name),
+                    )
+            except psycopg2.Error as e:
+                print(f"Job {row['id']} heartbeat failed: {e}")
+
+    def finish(self, row):
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE jobs SET status = 'done', finished_at = now(), last_error = NULL
+                WHERE id = %s;
+                """,
+                (row["id"],),
+            )
+
+    def fail(self, row, error):
+        print(f"Job {row['id']} ({row['kind']}) failed:", error.strip().splitlines()[-1])
+        retry = row["attempts"] < row["max_attempts"]
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE jobs
+                SET status = %s, last_error = %s, locked_by = NULL, locked_at = NULL,
+                    run_at = now() + make_interval(secs => %s),
+                    finished_at = CASE WHEN %s THEN NULL ELSE now() END
+                WHERE id = %s;
+                """,
+                (
+                    "queued" if retry else "failed",
+                    error,
+                    backoff(row["attempts"]) if retry else 0,
+                    retry,
+                    row["id"],
+                ),
+            )
+
+
+def stats(cur):
+    """Job counts by status plus the oldest due job's wait, for the admin view."""
+    cur.execute(
+        """
+        SELECT status, COUNT(*) AS n FROM jobs GROUP BY status;
+        """
+    )
+    counts = {r["status"]: r["n"] for r in cur.fetchall()}
+    cur.execute(
+        """
+        SELECT EXTRACT(EPOCH FROM now() - MIN(run_at)) AS lag
+        FROM jobs WHERE status = 'queued' AND run_at <= now();
+        """
+    )
+    lag = cur.fetchone()["lag"]
+    return {"counts": counts, "queue_lag_seconds": float(lag or 0)}
+
+
+def purge(cur, keep_days=7):
+    """Delete finished jobs older than `keep_days` (failed ones are kept)."""
+    cur.execute(
+        """
+        DELETE FROM jobs
+        WHERE status = 'done' AND finished_at < now() - make_interval(days => %s);
+        """,
+        (keep_days,),
+    )
+    return cur.rowcount
@@ -0,0 +1,234 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+# In-process metrics in Prometheus' text format, without extra dependencies.
+# Each gunicorn worker counts in its own Registry and writes a snapshot to a
+# shared directory every few seconds; /metrics adds up the snapshots of the
+# live workers, so any worker can answer a scrape.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Registry:
+    """Counters and histograms keyed by (name, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}  # name -> (type, help)
+        self._counters = {}  # key -> value
+        self._histograms = {}  # key -> [bucket bounds, bucket counts, sum, count]
+
+    def inc(self, name, help, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._help.setdefault(name, ("counter", help))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, help, value, buckets=LATENCY_BUCKETS, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._help.setdefault(name, ("histogram", help))
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [list(buckets), [0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(h[0]):
+                if value <= bound:
+                    h[1][i] += 1
+                    break
+            h[2] += value
+            h[3] += 1
+
+    def snapshot(self):
+        """JSON-able copy of everything recorded so far."""
+        with self._lock:
+            return {
+                "help": self._help,
+                "counters": [[n, list(map(list, l)), v] for (n, l), v in self._counters.items()],
+                "histograms": [
+                    [n, list(map(list, l)), b, list(c), s, cnt]
+                    for (n, l), (b, c, s, cnt) in self._histograms.items()
+                ],
+            }
+
+
+def merge(snapshots):
+    """Add up snapshots from several processes."""
+    help, counters, histograms = {}, {}, {}
+    for snap in snapshots:
+        help.update(snap["help"])
+        for name, labels, value in snap["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, bounds, counts, total, count in snap["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            h = histograms.setdefault(key, [bounds, [0] * len(bounds), 0.0, 0])
+            if h[0] != bounds:
+                continue  # bucket layout changed between deploys; skip the old one
+            h[1] = [a + b for a, b in zip(h[1], counts)]
+            h[2] += total
+            h[3] += count
+    return help, counters, histograms
+
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def _num(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots):
+    """Prometheus text exposition format (version 0.0.4)."""
+    help, counters, histograms = merge(snapshots)
+    lines = []
+    for name in sorted(help):
+        kind, text = help[name]
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{name}{_labels(labels)} {_num(value)}")
+        else:
+            for (n, labels), (bounds, counts, total, count) in sorted(histograms.items()):
+                if n != name:
+                    continue
+                running = 0
+                for bound, c in zip(bounds, counts):
+                    running += c
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', _num(float(bound)))])} {running}")
+                lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{_labels(labels)} {_num(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Multi-process collection ---
+class SnapshotDir:
+    """Per-process snapshot files (<pid>.json) in a directory shared by the workers."""
+
+    def __init__(self, directory, registry, every=10.0):
+        self.directory = Path(directory)
+        self.registry = registry
+        self.every = every
+        self._next = 0.0
+        self._lock = threading.Lock()  # request threads share one snapshot file
+
+    def maybe_write(self):
+        now = time.monotonic()
+        if now >= self._next:
+            self._next = now + self.every
+            self.write()
+
+    def write(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.directory / f".{os.getpid()}.tmp"
+        with self._lock:
+            tmp.write_text(json.dumps(self.registry.snapshot()))
+            os.replace(tmp, self.directory / f"{os.getpid()}.json")
+
+    def collect(self):
+        """This process's live numbers plus the last snapshot of every other live worker."""
+        snapshots = [self.registry.snapshot()]
+        for path in self.directory.glob("*.json"):
+            try:
+                pid = int(path.stem)
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                path.unlink(missing_ok=True)  # worker gone: its numbers go with it
+                continue
+            except PermissionError:
+                pass
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+
+# --- SQL timing ---
+_timed_classes = {}
+_timed_lock = threading.Lock()
+
+
+def timed_cursor(factory, on_query):
+    """Subclass of cursor class `factory` that reports every statement.
+
+    on_query(seconds, sql) runs after each execute/executemany/copy_expert
+    (also when the statement fails).
+    """
+    with _timed_lock:
+        cls = _timed_classes.get((factory, on_query))
+        if cls is not None:
+            return cls
+
+        def timed(method):
+            def wrapper(self, sql, *args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return method(self, sql, *args, **kwargs)
+                finally:
+                    on_query(time.perf_counter() - started, sql)
+
+            wrapper.__name__ = method.__name__
+            return wrapper
+
+        cls = type(
+            "Timed" + factory.__name__,
+            (factory,),
+            {
+                "execute": timed(factory.execute),
+                "executemany": timed(factory.executemany),
+                "copy_expert": timed(factory.copy_expert),
+            },
+        )
+        _timed_classes[(factory, on_query)] = cls
+        return cls
+
+
+class SlowQueryLog:
+    """The most recent slow statements of this process (newest first)."""
+
+    def __init__(self, threshold=0.1, size=50):
+        self.threshold = threshold
+        self._entries = deque(maxlen=size)
+
+    def maybe_add(self, seconds, sql, **context):
+        """Keep the statement if it was slow; returns the entry (or None)."""
+        if seconds < self.threshold:
+            return None
+        if isinstance(sql, bytes):
+            sql = sql.decode("utf-8", "replace")
+        entry = dict(
+            context, ms=round(seconds * 1000, 1), sql=" ".join(str(sql).split())[:2000], at=time.time()
+        )
+        self._entries.appendleft(entry)
+        return entry
+
+    def entries(self):
+        return list(self._entries)
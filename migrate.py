@@ -0,0 +1,122 @@
+import hashlib
+import json
+import re
+from pathlib import Path
+
+# Versioned schema migrations: migrations/NNNN_description.sql, applied in
+# order, each in its own transaction together with its schema_migrations
+# row. Applied files are never edited; add a new one instead (status()
+# flags edited files by checksum).
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+LOCK_ID = 0x6D696772  # pg_advisory_lock key: one migrator at a time
+FILE_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """[(version, name, path)] sorted by version."""
+    found = []
+    for path in Path(directory).glob("*.sql"):
+        m = FILE_RE.match(path.name)
+        if not m:
+            raise ValueError(f"migration file name must look like 0001_name.sql: {path.name}")
+        found.append((int(m.group(1)), m.group(2), path))
+    found.sort()
+    versions = [v for v, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise ValueError("two migrations share a version number")
+    return found
+
+
+def checksum(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def _ensure_table(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+          version INTEGER PRIMARY KEY,
+          name TEXT NOT NULL,
+          checksum CHAR(64) NOT NULL,
+          applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """
+    )
+
+
+def _applied(cur):
+    cur.execute("SELECT version, checksum, applied_at FROM schema_migrations;")
+    return {r[0]: (r[1], r[2]) for r in cur.fetchall()}
+
+
+def status(conn, directory=MIGRATIONS_DIR):
+    """[(version, name, applied_at or None, edited_since_applied)]."""
+    with conn, conn.cursor() as cur:
+        _ensure_table(cur)
+        applied = _applied(cur)
+    rows = []
+    for version, name, path in discover(directory):
+        done = applied.get(version)
+        rows.append(
+            (version, name, done and done[1], bool(done) and done[0] != checksum(path))
+        )
+    return rows
+
+
+def migrate(conn, directory=MIGRATIONS_DIR, target=None, log=print):
+    """Apply pending migrations up to `target` (default: all); returns their names."""
+    ran = []
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s);", (LOCK_ID,))
+        try:
+            with conn:
+                _ensure_table(cur)
+                applied = _applied(cur)
+            for version, name, path in discover(directory):
+                if version in applied or (target is not None and version > target):
+                    continue
+                log(f"Applying {path.name}")
+                with conn:  # the file and its bookkeeping row commit together
+                    cur.execute(path.read_text(encoding="utf-8"))
+                    cur.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s);",
+                        (version, name, checksum(path)),
+                    )
+                ran.append(path.name)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s);", (LOCK_ID,))
+            conn.commit()
+    return ran
+
+
+# --- Plan checks ---
+def _walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def seq_scans(cur, sql, params=(), min_rows=1000):
+    """Tables `sql` would read with a sequential scan, if they hold >= min_rows rows.
+
+    Small tables are skipped: scanning them is what the planner should do.
+    Returns [(table, estimated table rows)].
+    """
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    row = cur.fetchone()
+    result = row["QUERY PLAN"] if isinstance(row, dict) else row[0]
+    if isinstance(result, str):
+        result = json.loads(result)
+    plan = result[0]["Plan"]
+    found = []
+    for node in _walk(plan):
+        if node["Node Type"] != "Seq Scan":
+            continue
+        table = node["Relation Name"]
+        cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass;", (table,))
+        r = cur.fetchone()
+        rows = r["reltuples"] if isinstance(r, dict) else r[0]
+        if rows >= min_rows:
+            found.append((table, rows))
+    return found
@@ -0,0 +1,253 @@
+-- Initial schema: everything the app had before migrations (previously
+-- sql.txt plus the tables db.py created by hand). Every statement is
+-- idempotent, so databases set up the old way adopt it as-is.
+
+-- Catalog
+CREATE TABLE IF NOT EXISTS authors (
+  id SERIAL PRIMARY KEY,
+  name VARCHAR(255) NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS categories (
+  id SERIAL PRIMARY KEY,
+  name VARCHAR(255) NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS books (
+  id SERIAL PRIMARY KEY,
+  title VARCHAR(150) NOT NULL,
+  author_id INTEGER NOT NULL,
+  description TEXT NOT NULL,
+  category_id INTEGER NOT NULL,
+  price NUMERIC(10, 2),
+  cover VARCHAR(255) NOT NULL,
+  file VARCHAR(255) NOT NULL,
+  date_added DATE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Accounts
+CREATE TABLE IF NOT EXISTS admin (
+  id SERIAL PRIMARY KEY,
+  full_name VARCHAR(150) NOT NULL,
+  email VARCHAR(255) UNIQUE NOT NULL,
+  password_hash TEXT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS users (
+  id SERIAL PRIMARY KEY,
+  full_name VARCHAR(150) NOT NULL,
+  email VARCHAR(255) UNIQUE NOT NULL,
+  password_hash TEXT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Full-text search over books: title (A), author (B), category (C), description (D)
+ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION books_search_vector_refresh() RETURNS trigger AS $$
+BEGIN
+  NEW.search_vector :=
+    setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce((SELECT name FROM authors WHERE id = NEW.author_id), '')), 'B') ||
+    setweight(to_tsvector('english', coalesce((SELECT name FROM categories WHERE id = NEW.category_id), '')), 'C') ||
+    setweight(to_tsvector('english', coalesce(NEW.description, '')), 'D');
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS books_search_vector_update ON books;
+CREATE TRIGGER books_search_vector_update
+  BEFORE INSERT OR UPDATE OF title, description, author_id, category_id ON books
+  FOR EACH ROW EXECUTE FUNCTION books_search_vector_refresh();
+
+-- Renaming an author/category re-indexes their books (touching title fires the trigger above)
+CREATE OR REPLACE FUNCTION authors_search_vector_cascade() RETURNS trigger AS $$
+BEGIN
+  UPDATE books SET title = title WHERE author_id = NEW.id;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS authors_search_vector_cascade ON authors;
+CREATE TRIGGER authors_search_vector_cascade
+  AFTER UPDATE OF name ON authors
+  FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+  EXECUTE FUNCTION authors_search_vector_cascade();
+
+CREATE OR REPLACE FUNCTION categories_search_vector_cascade() RETURNS trigger AS $$
+BEGIN
+  UPDATE books SET title = title WHERE category_id = NEW.id;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS categories_search_vector_cascade ON categories;
+CREATE TRIGGER categories_search_vector_cascade
+  AFTER UPDATE OF name ON categories
+  FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+  EXECUTE FUNCTION categories_search_vector_cascade();
+
+-- Backfill existing rows, then index
+UPDATE books SET title = title WHERE search_vector IS NULL;
+CREATE INDEX IF NOT EXISTS books_search_vector_idx ON books USING GIN (search_vector);
+
+
+-- Planner row estimate for a query, without running it (used for store result counts)
+CREATE OR REPLACE FUNCTION count_estimate(query text) RETURNS bigint AS $$
+DECLARE
+  plan json;
+BEGIN
+  EXECUTE 'EXPLAIN (FORMAT JSON) ' || query INTO plan;
+  RETURN (plan -> 0 -> 'Plan' ->> 'Plan Rows')::bigint;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Catalog change version: bumped on any write to books/authors/categories.
+-- Drives HTTP ETags/Last-Modified and cross-worker cache invalidation.
+CREATE TABLE IF NOT EXISTS catalog_state (
+  id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  version BIGINT NOT NULL DEFAULT 1,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO catalog_state (id) VALUES (1) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+BEGIN
+  UPDATE catalog_state SET version = version + 1, updated_at = now() WHERE id = 1;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS books_catalog_version ON books;
+CREATE TRIGGER books_catalog_version
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON books
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+DROP TRIGGER IF EXISTS authors_catalog_version ON authors;
+CREATE TRIGGER authors_catalog_version
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON authors
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+DROP TRIGGER IF EXISTS categories_catalog_version ON categories;
+CREATE TRIGGER categories_catalog_version
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON categories
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+
+-- Content-addressed uploads: files live at uploads/<folder>/ab/<sha256>.<ext>
+-- and are shared between books; the file is deleted with its last reference.
+CREATE TABLE IF NOT EXISTS upload_blobs (
+  path TEXT PRIMARY KEY,            -- relative to /static, as stored in books
+  sha256 CHAR(64),                  -- NULL for files uploaded before hashing
+  size BIGINT,
+  refcount INTEGER NOT NULL CHECK (refcount >= 0),
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Existing uploads: one row per path, counting every book that uses it
+-- (same normalization as upload_rel_path() in app.py)
+INSERT INTO upload_blobs (path, refcount)
+SELECT path, COUNT(*)
+FROM (
+  SELECT CASE WHEN f LIKE 'uploads/%' THEN f ELSE 'uploads/covers/' || f END AS path
+  FROM (SELECT regexp_replace(cover, '^static/', '') AS f FROM books) c
+  WHERE f <> ''
+  UNION ALL
+  SELECT CASE WHEN f LIKE 'uploads/%' THEN f ELSE 'uploads/files/' || f END
+  FROM (SELECT regexp_replace(file, '^static/', '') AS f FROM books) c
+  WHERE f <> ''
+) refs
+GROUP BY path
+ON CONFLICT (path) DO NOTHING;
+
+
+-- Background jobs (run by `flask worker`), claimed with FOR UPDATE SKIP LOCKED
+CREATE TABLE IF NOT EXISTS jobs (
+  id BIGSERIAL PRIMARY KEY,
+  kind TEXT NOT NULL,
+  payload JSONB NOT NULL DEFAULT '{}',
+  status TEXT NOT NULL DEFAULT 'queued'
+    CHECK (status IN ('queued', 'running', 'done', 'failed')),
+  run_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  attempts INTEGER NOT NULL DEFAULT 0,
+  max_attempts INTEGER NOT NULL DEFAULT 5,
+  last_error TEXT,
+  locked_by TEXT,
+  locked_at TIMESTAMPTZ,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  finished_at TIMESTAMPTZ
+);
+CREATE INDEX IF NOT EXISTS jobs_due_idx ON jobs (run_at, id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS jobs_running_idx ON jobs (locked_at) WHERE status = 'running';
+
+-- Periodic jobs: the app registers them, any worker enqueues the due ones
+CREATE TABLE IF NOT EXISTS job_schedules (
+  name TEXT PRIMARY KEY,
+  kind TEXT NOT NULL,
+  payload JSONB NOT NULL DEFAULT '{}',
+  every_seconds INTEGER NOT NULL CHECK (every_seconds > 0),
+  next_run_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+
+-- Book counts per category/author on the admin dashboard (and the FK checks on delete)
+CREATE INDEX IF NOT EXISTS books_category_id_idx ON books (category_id);
+CREATE INDEX IF NOT EXISTS books_author_id_idx ON books (author_id);
+
+
+-- "Related books": each book's most similar titles, best first
+-- (computed by related.py on the job worker)
+CREATE TABLE IF NOT EXISTS book_neighbors (
+  book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+  rank SMALLINT NOT NULL,
+  neighbor_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+  score REAL NOT NULL,
+  PRIMARY KEY (book_id, rank)
+);
+CREATE INDEX IF NOT EXISTS book_neighbors_neighbor_id_idx ON book_neighbors (neighbor_id);
+
+-- New neighbours change book pages, so they move the catalog version too
+DROP TRIGGER IF EXISTS book_neighbors_catalog_version ON book_neighbors;
+CREATE TRIGGER book_neighbors_catalog_version
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON book_neighbors
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+
+-- Wishlists (previously created by hand, see db.py); the index serves the
+-- newest-first, keyset-paged "My Wishlist" page
+CREATE TABLE IF NOT EXISTS wishlists (
+  user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  book_id BIGINT NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (user_id, book_id)
+);
+CREATE INDEX IF NOT EXISTS wishlists_user_created_idx
+  ON wishlists (user_id, created_at DESC, book_id DESC);
+
+
+-- Login/sign-up throttle counters shared by all web workers (auth.py);
+-- expired rows are purged hourly by the job worker
+CREATE TABLE IF NOT EXISTS login_throttle (
+  key TEXT PRIMARY KEY,             -- e.g. login:account:<email>, login:ip:<addr>
+  hits INTEGER NOT NULL,
+  expires_at TIMESTAMPTZ NOT NULL
+);
+
+
+-- Contact form messages (previously created by hand, see db.py). outbox_id
+-- makes re-flushed outbox records no-ops; copy_sent_at marks sent copies.
+CREATE TABLE IF NOT EXISTS contact_messages (
+  id BIGSERIAL PRIMARY KEY,
+  name TEXT NOT NULL,
+  email TEXT NOT NULL,
+  subject TEXT NOT NULL,
+  message TEXT NOT NULL,
+  want_copy BOOLEAN DEFAULT FALSE,
+  ip INET,
+  user_agent TEXT,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+ALTER TABLE contact_messages ADD COLUMN IF NOT EXISTS outbox_id UUID UNIQUE;
+ALTER TABLE contact_messages ADD COLUMN IF NOT EXISTS copy_sent_at TIMESTAMPTZ;
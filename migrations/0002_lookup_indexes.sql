@@ -0,0 +1,29 @@
+-- Indexes behind the app's lookups by foreign key and by case-insensitive name.
+
+-- "Same title by the same author" checks (edit_book, bulk import)
+CREATE INDEX IF NOT EXISTS books_author_lower_title_idx ON books (author_id, LOWER(title));
+
+-- ON DELETE CASCADE from books (the primary key only covers user_id first)
+CREATE INDEX IF NOT EXISTS wishlists_book_id_idx ON wishlists (book_id);
+
+-- Author/category names are unique regardless of case, which is what the
+-- add/edit forms and the importer check with LOWER(name) = LOWER(%s).
+-- Stop with a readable list if existing rows would violate that.
+DO $$
+DECLARE
+  dupes TEXT;
+BEGIN
+  SELECT string_agg(k, ', ') INTO dupes
+  FROM (SELECT LOWER(name) AS k FROM authors GROUP BY 1 HAVING COUNT(*) > 1) d;
+  IF dupes IS NOT NULL THEN
+    RAISE EXCEPTION 'authors differing only in case: % (merge them, then migrate again)', dupes;
+  END IF;
+  SELECT string_agg(k, ', ') INTO dupes
+  FROM (SELECT LOWER(name) AS k FROM categories GROUP BY 1 HAVING COUNT(*) > 1) d;
+  IF dupes IS NOT NULL THEN
+    RAISE EXCEPTION 'categories differing only in case: % (merge them, then migrate again)', dupes;
+  END IF;
+END;
+$$;
+CREATE UNIQUE INDEX IF NOT EXISTS authors_lower_name_key ON authors (LOWER(name));
+CREATE UNIQUE INDEX IF NOT EXISTS categories_lower_name_key ON categories (LOWER(name));
@@ -0,0 +1,13 @@
+-- Vocabulary and IDF weights of the last full related-books fit (related.rebuild),
+-- so related.refresh() can vectorize edited books without refitting the catalog.
+
+CREATE TABLE IF NOT EXISTS related_terms (
+  term TEXT PRIMARY KEY,            -- w:<word>, a:<author id>, c:<category id>
+  idf REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS related_model (
+  id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  books INTEGER NOT NULL,           -- catalog size the weights were fitted on
+  built_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
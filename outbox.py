@@ -0,0 +1,122 @@
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# Write-behind spool: a request drops each record in a local directory (one
+# small JSON file, fsynced, renamed into place) and returns without touching
+# the database. A background thread in each worker hands them to `flush`
+# in batches; files are deleted only after `flush` returns, so a crash means
+# a retry, never a loss. `flush` must therefore be idempotent (records carry
+# a unique "outbox_id").
+
+
+class Full(Exception):
+    """The spool already holds `max_pending` records."""
+
+
+class Outbox:
+    def __init__(self, directory, flush, batch_size=100, interval=5.0, max_pending=10000):
+        self.directory = Path(directory)
+        self.flush_batch = flush
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = None  # per-process estimate, corrected on every flush
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, record):
+        """Spool one record (a JSON-able dict); returns its outbox_id."""
+        if self.pending() >= self.max_pending:
+            raise Full(f"{self.directory} holds {self.max_pending} records")
+        record = dict(record, outbox_id=str(uuid.uuid4()))
+        name = f"{time.time_ns()}-{record['outbox_id']}"
+        tmp = self.directory / f".{name}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.directory / f"{name}.json")
+        with self._lock:
+            self._pending += 1
+            full_batch = self._pending >= self.batch_size
+        self._start()
+        if full_batch:
+            self._wake.set()
+        return record["outbox_id"]
+
+    def resume(self):
+        """Start the flusher now if records are already spooled (left from
+        before a restart); otherwise the first put() starts it."""
+        if self.pending():
+            self._wake.set()  # flush first, then wait
+            self._start()
+
+    def pending(self):
+        with self._lock:
+            if self._pending is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._pending = sum(1 for _ in self.directory.glob("*.json"))
+            return self._pending
+
+    def flush(self):
+        """Hand every spooled record to `flush`, batch by batch; returns how many.
+
+        Workers share the directory, so only the one holding the lock flushes;
+        the others return 0 right away.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        flushed = 0
+        with open(self.directory / ".lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            while True:
+                paths = sorted(self.directory.glob("*.json"))  # oldest first
+                with self._lock:
+                    self._pending = len(paths)
+                if not paths:
+                    break
+                batch, records = paths[: self.batch_size], []
+                for path in batch:
+                    try:
+                        records.append(json.loads(path.read_text(encoding="utf-8")))
+                    except (OSError, ValueError) as e:
+                        print("Outbox: skipping unreadable record", path.name, e)
+                        path.rename(path.with_suffix(".bad"))
+                if records:
+                    self.flush_batch(records)
+                for path in batch:
+                    path.unlink(missing_ok=True)
+                flushed += len(records)
+        return flushed
+
+    def _start(self):
+        # One flusher thread per process, started on first use (after the fork)
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            first = self._thread is None
+            self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+            self._thread.start()
+        if first:
+            atexit.register(self._flush_quietly)  # worker shutdown: don't wait for the restart
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self._flush_quietly()
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print("Outbox flush error:", e)  # records stay spooled for the next try
@@ -0,0 +1,143 @@
+import base64
+import binascii
+import json
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+# Keyset ordering over books aliased as "b": an optional sort column plus b.id
+# as the tie-breaker, so every row has a unique, stable position.
+#   column:    SQL expression, or None to sort on b.id alone
+#   key:       row dict key holding the column's value
+#   desc:      sort direction (b.id follows the same direction)
+#   nullable:  NULLs sort last, as in the store's order_map
+#   kind:      "text", "numeric" or "timestamp": what a cursor value must parse as
+KeysetSort = namedtuple("KeysetSort", "column key desc nullable kind")
+
+KEYSET_SORTS = {
+    "newest": KeysetSort(None, None, True, False, None),
+    "title_asc": KeysetSort("b.title", "title", False, False, "text"),
+    "price_asc": KeysetSort("b.price", "price", False, True, "numeric"),
+    "price_desc": KeysetSort("b.price", "price", True, True, "numeric"),
+}
+
+
+# --- Cursor tokens ---
+def encode_cursor(values):
+    values = [
+        v.isoformat() if isinstance(v, datetime) else str(v) if isinstance(v, Decimal) else v
+        for v in values
+    ]
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return the list of values in a cursor token, or None if it is malformed."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def cursor_for(spec, row):
+    if spec.column is None:
+        return encode_cursor([row["id"]])
+    return encode_cursor([row[spec.key], row["id"]])
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _sort_value(kind, value):
+    """A cursor's sort value as a query parameter for a column of `kind`, or None."""
+    if kind == "text":
+        return value if isinstance(value, str) and "\x00" not in value else None
+    if kind == "numeric":
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            return None
+        try:
+            number = Decimal(str(value))
+        except InvalidOperation:
+            return None
+        return number if number.is_finite() and abs(number.adjusted()) < 100 else None
+    if kind == "timestamp" and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+# --- SQL fragments ---
+def keyset_order(spec, backward=False):
+    desc = spec.desc != backward
+    direction = "DESC" if desc else "ASC"
+    if spec.column is None:
+        return f"b.id {direction}"
+    nulls = " NULLS FIRST" if backward else (" NULLS LAST" if spec.nullable else "")
+    return f"{spec.column} {direction}{nulls}, b.id {direction}"
+
+
+def keyset_where(spec, values, backward=False):
+    """WHERE fragment + params selecting rows after (or before) a cursor.
+
+    Returns None when the cursor does not fit the sort (e.g. a cursor from
+    another sort pasted into the URL, or values of the wrong type).
+    """
+    desc = spec.desc != backward
+    op = "<" if desc else ">"
+
+    if spec.column is None:
+        if len(values) != 1 or not _is_id(values[0]):
+            return None
+        return f"b.id {op} %s", [values[0]]
+
+    if len(values) != 2 or not _is_id(values[1]):
+        return None
+    value, last_id = values
+    col = spec.column
+
+    if value is None:
+        if not spec.nullable:
+            return None
+        if backward:
+            return f"({col} IS NOT NULL OR ({col} IS NULL AND b.id {op} %s))", [last_id]
+        return f"({col} IS NULL AND b.id {op} %s)", [last_id]
+
+    value = _sort_value(spec.kind, value)
+    if value is None:
+        return None
+    sql = f"({col} {op} %s OR ({col} = %s AND b.id {op} %s)"
+    if spec.nullable and not backward:
+        sql += f" OR {col} IS NULL"
+    return sql + ")", [value, value, last_id]
+
+
+# --- Counting ---
+def count_query(cur, from_where_sql, params, mode="exact", exact_limit=10000):
+    """SQL + params for one row {"n": total, "estimated": bool}.
+
+    mode "exact" runs COUNT(*); "estimate" asks the planner via the
+    count_estimate() SQL function (no scan); "auto" counts exactly unless
+    the planner expects more than `exact_limit` rows. Fits in a QueryBatch.
+    """
+    exact = f"SELECT COUNT(*) {from_where_sql}"
+    if mode == "exact":
+        return f"SELECT ({exact}) AS n, false AS estimated", list(params)
+    query = cur.mogrify(f"SELECT 1 {from_where_sql}", params).decode()
+    if mode == "estimate":
+        return "SELECT count_estimate(%s) AS n, true AS estimated", [query]
+    return (
+        f"""
+        SELECT CASE WHEN e.n > %s THEN e.n ELSE ({exact}) END AS n,
+               e.n > %s AS estimated
+        FROM (SELECT count_estimate(%s) AS n) e
+        """,
+        [exact_limit, *params, exact_limit, query],
+    )
@@ -0,0 +1,286 @@
+import io
+import math
+import re
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+# "Related books": TF-IDF vectors over title, description, author and
+# category, compared by cosine similarity. The top TOP_K neighbours of each
+# book are stored in book_neighbors (see migrations/), so a book page reads them
+# with one indexed lookup. rebuild() recomputes everything (daily job);
+# refresh() recomputes only the books an edit can affect.
+
+TOP_K = 8
+MIN_SCORE = 0.05  # below this a "neighbour" shares little more than stopwords
+# Term frequency weights per field; author/category are one token each
+TITLE_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+AUTHOR_WEIGHT = 3.0
+CATEGORY_WEIGHT = 2.0
+BLOCK_CELLS = 16 * 1024 * 1024  # dense similarity block size (float32 cells, 64 MB)
+LOCK_ID = 0x6E656967  # pg_advisory_xact_lock key: one writer at a time
+
+TOKEN_RE = re.compile(r"[^\W\d_]{2,}")
+STOPWORDS = frozenset(
+    """
+    a an and are as at be but by for from has have he her his how in into is it
+    its of on or she that the their them they this to was were what when which
+    who will with you your book books
+    """.split()
+)
+
+
+def tokens(text):
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def features(title, description, author_id, category_id):
+    """Weighted term counts for one book."""
+    tf = Counter()
+    for t in tokens(title):
+        tf["w:" + t] += TITLE_WEIGHT
+    for t in tokens(description):
+        tf["w:" + t] += DESCRIPTION_WEIGHT
+    tf[f"a:{author_id}"] += AUTHOR_WEIGHT
+    tf[f"c:{category_id}"] += CATEGORY_WEIGHT
+    return tf
+
+
+def documents(rows):
+    """rows: (id, title, description, author_id, category_id) -> (ids, term counts)."""
+    ids, docs = [], []
+    for book_id, title, description, author_id, category_id in rows:
+        ids.append(book_id)
+        docs.append(features(title, description, author_id, category_id))
+    return ids, docs
+
+
+def fit_idf(docs):
+    """{term: idf} over a whole catalog (smoothed, as in scikit-learn)."""
+    df = Counter(term for doc in docs for term in doc)
+    return {term: unseen_idf(len(docs), n) for term, n in df.items()}
+
+
+def unseen_idf(books, df=0):
+    return math.log((1.0 + books) / (1.0 + df)) + 1.0
+
+
+def build_matrix(docs, idf, default_idf):
+    """L2-normalized CSR matrix, one row per doc; terms missing from `idf` get default_idf."""
+    indptr, indices, data = [0], [], []
+    vocab = {}
+    for doc in docs:
+        for term, tf in doc.items():
+            indices.append(vocab.setdefault(term, len(vocab)))
+            data.append((1.0 + math.log(tf)) * idf.get(term, default_idf))  # sublinear tf
+        indptr.append(len(indices))
+    X = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float32), indices, indptr), shape=(len(docs), len(vocab))
+    )
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return (sparse.diags((1.0 / norms).astype(np.float32)) @ X).tocsr()
+
+
+def top_neighbors(X, rows, k=TOP_K):
+    """Yield (row, [(other row, score), ...]) best first, for each index in `rows`."""
+    n = X.shape[0]
+    k = min(k, n - 1)
+    if k <= 0:
+        for r in rows:
+            yield r, []
+        return
+    XT = X.T.tocsc()
+    block = max(1, BLOCK_CELLS // n)
+    for start in range(0, len(rows), block):
+        chunk = np.asarray(rows[start : start + block])
+        S = (X[chunk] @ XT).toarray()
+        S[np.arange(len(chunk)), chunk] = -1.0  # not your own neighbour
+        best = np.argpartition(-S, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(S, best, axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        best = np.take_along_axis(best, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        for r, cols, vals in zip(chunk, best, scores):
+            yield int(r), [(int(c), float(v)) for c, v in zip(cols, vals) if v >= MIN_SCORE]
+
+
+BOOK_SQL = "SELECT id, title, description, author_id, category_id FROM books"
+
+
+def _store(cur, neighbors):
+    """Replace the neighbour rows of the books in `neighbors` (book id -> [(id, score)])."""
+    cur.execute("DELETE FROM book_neighbors WHERE book_id = ANY(%s);", (list(neighbors),))
+    buf = io.StringIO()
+    count = 0
+    for book_id, ranked in neighbors.items():
+        for rank, (other, score) in enumerate(ranked, 1):
+            buf.write(f"{book_id}\t{rank}\t{other}\t{score:.6f}\n")
+            count += 1
+    buf.seek(0)
+    cur.copy_expert(
+        "COPY book_neighbors (book_id, rank, neighbor_id, score) FROM STDIN;", buf
+    )
+    return count
+
+
+def _store_model(cur, idf, books):
+    cur.execute("TRUNCATE related_terms;")
+    buf = io.StringIO()
+    for term, weight in idf.items():
+        buf.write(f"{term}\t{weight:.6f}\n")
+    buf.seek(0)
+    cur.copy_expert("COPY related_terms (term, idf) FROM STDIN;", buf)
+    cur.execute(
+        """
+        INSERT INTO related_model (id, books) VALUES (1, %s)
+        ON CONFLICT (id) DO UPDATE SET books = EXCLUDED.books, built_at = now();
+        """,
+        (books,),
+    )
+
+
+def dependents(cur, book_ids):
+    """Books that list any of `book_ids` as a neighbour (refresh them after a delete)."""
+    cur.execute(
+        """
+        SELECT DISTINCT book_id FROM book_neighbors
+        WHERE neighbor_id = ANY(%s) AND NOT book_id = ANY(%s);
+        """,
+        (list(book_ids), list(book_ids)),
+    )
+    # works with plain and RealDictCursor cursors
+    return [r["book_id"] if isinstance(r, dict) else r[0] for r in cur.fetchall()]
+
+
+def _rebuild(cur):
+    cur.execute(BOOK_SQL + " ORDER BY id;")
+    ids, docs = documents(cur.fetchall())
+    idf = fit_idf(docs)
+    X = build_matrix(docs, idf, unseen_idf(len(docs)))
+    neighbors = {
+        ids[r]: [(ids[c], score) for c, score in ranked]
+        for r, ranked in top_neighbors(X, list(range(len(ids))))
+    }
+    cur.execute("DELETE FROM book_neighbors;")
+    count = _store(cur, neighbors)
+    _store_model(cur, idf, len(ids))
+    return count
+
+
+def rebuild(conn):
+    """Recompute every book's neighbours and the stored IDF weights in one
+    transaction; returns the row count."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (LOCK_ID,))
+            count = _rebuild(cur)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return count
+
+
+def refresh(conn, book_ids):
+    """Recompute the neighbours of `book_ids` and of every book they now rank for.
+
+    Only the changed books and their candidates (same author or category,
+    plus the books that list them today) are read and vectorized, with the
+    IDF weights stored by the last rebuild(). A changed book gets its best
+    neighbours among those candidates. Another book keeps its stored list,
+    without the changed books, merged with their new scores. Neighbours
+    that share only words, and IDF drift, wait for the daily rebuild().
+    Returns the number of books recomputed.
+    """
+    book_ids = sorted({int(b) for b in book_ids})
+    if not book_ids:
+        return 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (LOCK_ID,))
+            cur.execute("SELECT books FROM related_model WHERE id = 1;")
+            model = cur.fetchone()
+            if model is None:  # never rebuilt: fit the catalog once
+                _rebuild(cur)
+                conn.commit()
+                return len(book_ids)
+            count = _refresh(cur, book_ids, model[0])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return count
+
+
+def _refresh(cur, book_ids, fitted_books):
+    cur.execute(BOOK_SQL + " WHERE id = ANY(%s) ORDER BY id;", (book_ids,))
+    changed_rows = cur.fetchall()
+    cur.execute(
+        "SELECT DISTINCT book_id FROM book_neighbors WHERE neighbor_id = ANY(%s);",
+        (book_ids,),
+    )
+    listing = [r[0] for r in cur.fetchall()]
+    cur.execute(
+        BOOK_SQL
+        + """
+        WHERE (author_id = ANY(%s) OR category_id = ANY(%s) OR id = ANY(%s))
+          AND NOT id = ANY(%s)
+        ORDER BY id;
+        """,
+        (
+            list({r[3] for r in changed_rows}),
+            list({r[4] for r in changed_rows}),
+            listing,
+            book_ids,
+        ),
+    )
+    ids, docs = documents(changed_rows + cur.fetchall())
+    terms = list({term for doc in docs for term in doc})
+    cur.execute("SELECT term, idf FROM related_terms WHERE term = ANY(%s);", (terms,))
+    X = build_matrix(docs, dict(cur.fetchall()), unseen_idf(fitted_books))
+
+    changed = list(range(len(changed_rows)))
+    neighbors = {
+        ids[r]: [(ids[c], score) for c, score in ranked]
+        for r, ranked in top_neighbors(X, changed)
+    }
+
+    # Everyone else: new scores against the changed books (changed x others)
+    first, others = len(changed), len(ids) - len(changed)
+    S = (X[changed] @ X[first:].T).tocsc()
+    best = S.max(axis=0).toarray().ravel() if changed and others else np.zeros(others)
+    candidates = {ids[first + i] for i in np.flatnonzero(best >= MIN_SCORE)}
+    candidates.update(b for b in listing if b not in neighbors)
+    cur.execute(
+        """
+        SELECT book_id, neighbor_id, score FROM book_neighbors
+        WHERE book_id = ANY(%s) ORDER BY book_id, rank;
+        """,
+        (list(candidates),),
+    )
+    stored = {}
+    for book_id, other, score in cur.fetchall():
+        stored.setdefault(book_id, []).append((other, score))
+
+    changed_ids = set(book_ids)
+    for i in range(others):
+        book_id = ids[first + i]
+        if book_id not in candidates:
+            continue
+        old = stored.get(book_id, [])
+        kept = [(o, sc) for o, sc in old if o not in changed_ids]
+        col = slice(S.indptr[i], S.indptr[i + 1])
+        new = [
+            (ids[c], float(sc)) for c, sc in zip(S.indices[col], S.data[col]) if sc >= MIN_SCORE
+        ]
+        if len(kept) == len(old) and not any(
+            len(old) < TOP_K or sc > old[-1][1] for _, sc in new
+        ):
+            continue  # listed no changed book and none of them beats its weakest
+        neighbors[book_id] = sorted(kept + new, key=lambda n: -n[1])[:TOP_K]
+    if neighbors:
+        _store(cur, neighbors)
+    return len(neighbors)
@@ -0,0 +1,146 @@
+import os
+import random
+import threading
+import time
+
+import psycopg2
+
+# Read replicas for catalog pages. A background thread in each worker checks
+# every replica each `check_interval` seconds: how far behind the primary it
+# is, and which catalog version (catalog_state, see migrations/) it has
+# replayed. A replica is only used if it is reachable, lags at most `max_lag`
+# seconds and has at least the catalog version the caller asks for, so a page
+# never shows (or caches) data older than what this worker already knows about.
+# Requests only read the last result; they never wait for a check.
+
+STATUS_SQL = """
+    SELECT CASE
+             WHEN NOT pg_is_in_recovery() THEN 0
+             WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+             ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END AS lag,
+           (SELECT version FROM catalog_state WHERE id = 1) AS version
+"""
+
+
+class Replica:
+    def __init__(self, dsn):
+        self.dsn = dsn
+        self.lag = None  # seconds, None until the first successful check
+        self.version = None
+        self.checked_at = 0.0
+        self.down_until = 0.0
+        self.error = None
+        self.conn = None  # the checker's own connection, not a pooled one
+
+    def usable(self, now, max_lag, min_version, max_age):
+        return (
+            now >= self.down_until
+            and now - self.checked_at <= max_age
+            and self.lag is not None
+            and self.lag <= max_lag
+            and (min_version is None or (self.version or 0) >= min_version)
+        )
+
+    def as_dict(self):
+        return {
+            "lag": self.lag,
+            "version": self.version,
+            "down": time.monotonic() < self.down_until,
+            "error": self.error,
+        }
+
+
+class ReplicaSet:
+    """Picks a fresh-enough replica for a read, or None to use the primary.
+
+    The status checks run on a daemon thread (started on the first pick()
+    in each process) over one direct connection per replica, opened with a
+    `probe_timeout` second connect and statement timeout. A check result
+    older than a few intervals counts as unknown, so a stuck check sends
+    reads to the primary instead of trusting old numbers.
+    """
+
+    def __init__(self, dsns, max_lag=5.0, check_interval=2.0, retry_after=30.0, probe_timeout=2.0):
+        self.replicas = [Replica(dsn) for dsn in dsns]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self.probe_timeout = probe_timeout
+        self.max_age = 3 * check_interval + 2 * probe_timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stop = threading.Event()
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    # --- Status checks (background thread) ---
+    def start(self):
+        """Start this process's checker thread (again after a fork)."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for replica in self.replicas:
+                replica.conn = None  # inherited from the parent: not ours to use
+            threading.Thread(target=self._run, name="replica-checks", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            for replica in self.replicas:
+                if time.monotonic() >= replica.down_until:
+                    self.check(replica)
+            if self._stop.wait(self.check_interval):
+                return
+
+    def _connect(self, dsn):
+        timeout_ms = int(self.probe_timeout * 1000)
+        conn = psycopg2.connect(
+            dsn,
+            connect_timeout=max(1, round(self.probe_timeout)),
+            options=f"-c statement_timeout={timeout_ms}",
+            application_name="replica-check",
+        )
+        conn.autocommit = True
+        return conn
+
+    def check(self, replica):
+        try:
+            if replica.conn is None or replica.conn.closed:
+                replica.conn = self._connect(replica.dsn)
+            with replica.conn.cursor() as cur:
+                cur.execute(STATUS_SQL)
+                lag, version = cur.fetchone()
+            replica.lag, replica.version, replica.error = float(lag), version, None
+            replica.checked_at = time.monotonic()
+        except psycopg2.Error as e:
+            if replica.conn is not None:
+                replica.conn.close()
+                replica.conn = None
+            self.mark_down(replica.dsn, e)
+
+    # --- Request side ---
+    def pick(self, min_version=None):
+        """DSN of a usable replica (random among them), or None. Never blocks."""
+        self.start()
+        now = time.monotonic()
+        usable = [
+            r for r in self.replicas if r.usable(now, self.max_lag, min_version, self.max_age)
+        ]
+        return random.choice(usable).dsn if usable else None
+
+    def mark_down(self, dsn, error=None):
+        """Skip `dsn` for `retry_after` seconds (it failed to connect or answer)."""
+        for replica in self.replicas:
+            if replica.dsn == dsn:
+                replica.down_until = time.monotonic() + self.retry_after
+                replica.lag = None
+                replica.error = str(error).strip() if error else None
+                print(f"Replica unavailable, reading from the primary: {replica.error}")
+
+    def status(self):
+        return [r.as_dict() for r in self.replicas]
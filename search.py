@@ -0,0 +1,25 @@
+import re
+
+# Text search configuration used for both the stored vector and queries
+TS_CONFIG = "english"
+
+# Max number of words taken from the search box
+MAX_TERMS = 8
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Filter / rank fragments over books aliased as "b"; each takes one tsquery param
+SEARCH_WHERE = f"b.search_vector @@ to_tsquery('{TS_CONFIG}', %s)"
+SEARCH_RANK = f"ts_rank_cd(b.search_vector, to_tsquery('{TS_CONFIG}', %s))"
+
+
+def build_tsquery(q):
+    """Turn search box text into a prefix-matching tsquery.
+
+    "crime punish" -> "crime:* & punish:*". Returns None when the text has
+    no searchable words, so callers can skip the filter.
+    """
+    words = _WORD.findall((q or "").lower())[:MAX_TERMS]
+    if not words:
+        return None
+    return " & ".join(f"{w}:*" for w in words)
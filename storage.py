@@ -0,0 +1,140 @@
+import hashlib
+import os
+import tempfile
+from collections import Counter, namedtuple
+from pathlib import Path
+
+from psycopg2.extras import execute_values
+
+CHUNK_SIZE = 64 * 1024
+
+# An upload hashed into a temp file, not yet placed in the store
+Spooled = namedtuple("Spooled", "tmp_path sha256 size ext")
+
+
+def spool(fileobj, tmp_dir, ext):
+    """Stream an upload to a temp file while hashing it (sha256)."""
+    tmp_dir = Path(tmp_dir)
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return Spooled(Path(tmp), digest.hexdigest(), size, ext.lower().lstrip("."))
+
+
+def discard(spooled):
+    if spooled is not None:
+        spooled.tmp_path.unlink(missing_ok=True)
+
+
+def blob_rel_path(folder, sha256, ext):
+    """uploads/<folder>/ab/ab12...ef.<ext> (relative to /static)."""
+    return f"uploads/{folder}/{sha256[:2]}/{sha256}.{ext}"
+
+
+def place(cur, spooled, static_dir, folder):
+    """Reference the blob inside the caller's transaction, then put the file in place.
+
+    The row is taken first so a concurrent release() can't delete the file
+    between our check and our commit; os.replace is atomic and idempotent
+    (same name = same bytes), so racing workers never collide. Returns the
+    path to store in books.cover / books.file.
+    """
+    rel = blob_rel_path(folder, spooled.sha256, spooled.ext)
+    cur.execute(
+        """
+        INSERT INTO upload_blobs (path, sha256, size, refcount)
+        VALUES (%s, %s, %s, 1)
+        ON CONFLICT (path) DO UPDATE SET refcount = upload_blobs.refcount + 1;
+        """,
+        (rel, spooled.sha256, spooled.size),
+    )
+    _put(spooled, Path(static_dir) / rel)
+    return rel
+
+
+def place_many(cur, blobs, static_dir):
+    """Bulk place(): `blobs` maps a blob path to (spooled, number of new references)."""
+    execute_values(
+        cur,
+        """
+        INSERT INTO upload_blobs (path, sha256, size, refcount) VALUES %s
+        ON CONFLICT (path) DO UPDATE SET refcount = upload_blobs.refcount + EXCLUDED.refcount;
+        """,
+        [(rel, s.sha256, s.size, n) for rel, (s, n) in blobs.items()],
+        page_size=1000,
+    )
+    for rel, (spooled, _) in blobs.items():
+        _put(spooled, Path(static_dir) / rel)
+
+
+def _put(spooled, dest):
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.exists():
+        spooled.tmp_path.unlink(missing_ok=True)  # duplicate upload: free
+    else:
+        os.replace(spooled.tmp_path, dest)
+
+
+def release(cur, rel):
+    """Drop one reference inside the caller's transaction.
+
+    Returns True when that was the last one; the caller then schedules
+    collect() (the row stays at refcount 0 until then).
+    """
+    return bool(rel) and release_many(cur, [rel]) == [rel]
+
+
+def release_many(cur, rels):
+    """Drop one reference per entry of `rels` (repeats count) in one statement.
+
+    Returns the paths left without references.
+    """
+    counts = Counter(rel for rel in rels if rel)
+    if not counts:
+        return []
+    rows = execute_values(
+        cur,
+        """
+        WITH released AS (
+            UPDATE upload_blobs u SET refcount = u.refcount - v.n
+            FROM (VALUES %s) AS v (path, n)
+            WHERE u.path = v.path
+            RETURNING u.path, u.refcount
+        )
+        SELECT path FROM released WHERE refcount <= 0;
+        """,
+        list(counts.items()),
+        fetch=True,
+    )
+    # works with plain and RealDictCursor cursors
+    return [r["path"] if isinstance(r, dict) else r[0] for r in rows]
+
+
+def collect(cur, rel, static_dir):
+    """Delete an unreferenced blob: the row, then the file, before commit.
+
+    The deleted row stays locked until commit, so a concurrent place() of the
+    same content waits and then writes the file again. Returns True if the
+    blob was removed (False if it was re-used in the meantime).
+    """
+    cur.execute(
+        "DELETE FROM upload_blobs WHERE path = %s AND refcount <= 0 RETURNING path;",
+        (rel,),
+    )
+    if cur.fetchone() is None:
+        return False
+    (Path(static_dir) / rel).unlink(missing_ok=True)
+    return True
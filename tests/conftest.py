@@ -0,0 +1,94 @@
+import os
+
+import psycopg2
+import pytest
+
+# The suite needs a scratch Postgres database (it is emptied on every run):
+#   TEST_DATABASE_URL=postgresql://localhost/bookstore_test python -m pytest
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+if TEST_DATABASE_URL:
+    # The app reads its settings at import time
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    os.environ["PAGE_CACHE_TTL"] = "0"  # count what the routes themselves do
+    os.environ["CATALOG_VERSION_TTL"] = "300"  # the version check is not a page query
+
+
+@pytest.fixture(scope="session")
+def app_module():
+    if not TEST_DATABASE_URL:
+        pytest.skip("set TEST_DATABASE_URL to a scratch database")
+    import app
+    import migrate
+
+    conn = psycopg2.connect(app.database_dsn())
+    try:
+        migrate.migrate(conn, log=lambda msg: None)
+        seed(conn)
+    finally:
+        conn.close()
+    app.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app
+
+
+def seed(conn):
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            "TRUNCATE wishlists, book_neighbors, related_terms, related_model,"
+            " books, authors, categories, users, admin"
+            " RESTART IDENTITY CASCADE;"
+        )
+        cur.execute("INSERT INTO categories (name) VALUES ('Fiction'), ('History');")
+        cur.execute("INSERT INTO authors (name) VALUES ('Ada Adams'), ('Boris Baker');")
+        for i in range(1, 31):
+            cur.execute(
+                """
+                INSERT INTO books (title, author_id, description, category_id, price, cover, file)
+                VALUES (%s, %s, %s, %s, %s, '', '');
+                """,
+                (f"Book {i}", 1 + i % 2, f"Description of book {i}", 1 + i % 2, None if i % 7 == 0 else 5 + i),
+            )
+        cur.execute("INSERT INTO book_neighbors (book_id, neighbor_id, rank, score) VALUES (1, 2, 1, 0.5);")
+        cur.execute(
+            "INSERT INTO users (full_name, email, password_hash) VALUES ('Test User', 'user@test.example', 'x');"
+        )
+
+
+@pytest.fixture()
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture()
+def user_client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess["role"] = "user"
+        sess["user_id"] = 1
+    return client
+
+
+@pytest.fixture()
+def admin_client(app_module):
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess["role"] = "admin"
+        sess["user_id"] = 1
+    return client
+
+
+@pytest.fixture()
+def queries(app_module, monkeypatch):
+    """SQL statements run through the pool while the test is active."""
+    import metrics
+    from dbpool import get_pool
+
+    statements = []
+    pool = get_pool(app_module.database_dsn(), **app_module.DB_POOL_OPTIONS)
+    wrap = pool.cursor_wrapper
+
+    def on_query(seconds, sql):
+        statements.append(sql)
+
+    monkeypatch.setattr(pool, "cursor_wrapper", lambda factory: metrics.timed_cursor(wrap(factory), on_query))
+    return statements
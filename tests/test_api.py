@@ -0,0 +1,48 @@
+import pytest
+
+from pagination import encode_cursor
+
+SUPERSCRIPT_TWO = "%C2%B2"  # "²".isdigit() is True, int("²") raises
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        f"/api/v1/books?limit={SUPERSCRIPT_TWO}",
+        f"/api/v1/books?category_id={SUPERSCRIPT_TWO}",
+        f"/api/v1/books?author_id={SUPERSCRIPT_TWO}",
+        f"/api/v1/authors?limit={SUPERSCRIPT_TWO}",
+    ],
+)
+def test_api_rejects_non_ascii_digits(client, path):
+    response = client.get(path)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_store_ignores_non_ascii_category(client):
+    assert client.get(f"/store?category_id={SUPERSCRIPT_TWO}").status_code == 200
+
+
+def test_wishlist_lookup_skips_non_ascii_ids(user_client):
+    response = user_client.get(f"/api/wishlist?ids=1,{SUPERSCRIPT_TWO}")
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("values", [[True], [False], [-1], [2**63], ["5"]])
+def test_relevance_cursor_must_be_an_offset(client, values):
+    response = client.get(f"/api/v1/books?q=book&after={encode_cursor(values)}")
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("values", [[True], [False], ["5"]])
+def test_authors_cursor_must_be_an_id(client, values):
+    response = client.get(f"/api/v1/authors?after={encode_cursor(values)}")
+    assert response.status_code == 400
+
+
+def test_bulk_action_skips_non_ascii_ids(admin_client):
+    response = admin_client.post("/admin/books/bulk", data={"ids": ["²"], "action": "delete"})
+    assert response.status_code == 302
+    with admin_client.session_transaction() as sess:
+        assert sess["_flashes"] == [("warning", "Select at least one book.")]
@@ -0,0 +1,26 @@
+import psycopg2
+import pytest
+
+
+def prices(app_module):
+    conn = psycopg2.connect(app_module.database_dsn())
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT id, price FROM books ORDER BY id;")
+            return cur.fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("mode", ["set", "percent"])
+@pytest.mark.parametrize("value", ["nan", "NaN", "inf", "-inf", "1e999"])
+def test_reprice_rejects_non_finite_values(app_module, admin_client, mode, value):
+    before = prices(app_module)
+    response = admin_client.post(
+        "/admin/books/bulk",
+        data={"ids": ["1", "2"], "action": "reprice", "price_mode": mode, "price_value": value},
+    )
+    assert response.status_code == 302
+    with admin_client.session_transaction() as sess:
+        assert sess["_flashes"] == [("danger", "Enter a valid price (or a percentage above -100).")]
+    assert prices(app_module) == before
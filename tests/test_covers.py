@@ -0,0 +1,43 @@
+import pytest
+from PIL import Image
+
+
+@pytest.fixture()
+def cover(app_module):
+    path = app_module.COVERS_DIR / "test" / "cover.jpg"
+    path.parent.mkdir(exist_ok=True)
+    Image.new("RGB", (600, 900), "navy").save(path)
+    yield "uploads/covers/test/cover.jpg"
+    path.unlink()
+    path.parent.rmdir()
+    variants = app_module.STATIC_DIR / "uploads" / "variants" / "covers" / "test"
+    for variant in variants.glob("*"):
+        variant.unlink()
+    if variants.exists():
+        variants.rmdir()
+
+
+def test_listed_width_is_generated(client, cover):
+    response = client.get(f"/covers/240.jpeg/{cover}")
+    assert response.status_code == 200
+    assert response.mimetype == "image/jpeg"
+
+
+@pytest.mark.parametrize("width", [16, 100, 4000])
+def test_unlisted_width_is_not_found(client, cover, width):
+    assert client.get(f"/covers/{width}.jpeg/{cover}").status_code == 404
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "uploads/variants/covers/test/cover.240.jpeg",
+        "uploads/covers/../variants/covers/test/cover.240.jpeg",
+        "uploads/files/book.pdf",
+    ],
+)
+def test_only_uploaded_covers_get_variants(app_module, client, cover, path):
+    client.get(f"/covers/240.jpeg/{cover}")  # the variant exists
+    before = sorted((app_module.STATIC_DIR / "uploads" / "variants").rglob("*"))
+    assert client.get(f"/covers/120.jpeg/{path}").status_code == 404
+    assert sorted((app_module.STATIC_DIR / "uploads" / "variants").rglob("*")) == before
@@ -0,0 +1,32 @@
+import pytest
+
+
+def etag_of(response):
+    etag, _ = response.get_etag()
+    return etag
+
+
+def test_unchanged_page_revalidates_with_304(client):
+    client.get("/store")  # the first render starts the session (CSRF token)
+    etag = etag_of(client.get("/store"))
+    response = client.get("/store", headers={"If-None-Match": f'W/"{etag}"'})
+    assert response.status_code == 304
+
+
+@pytest.mark.parametrize("toggle", ["/api/wishlist/25", "/wishlist/toggle/25"])
+def test_wishlist_toggle_changes_listing_etag(user_client, toggle):
+    user_client.get("/store")
+    first = user_client.get("/store")
+    etag = etag_of(first)
+    assert user_client.get("/store", headers={"If-None-Match": f'W/"{etag}"'}).status_code == 304
+
+    assert user_client.post(toggle).status_code in (200, 302)
+    with user_client.session_transaction() as sess:
+        sess.pop("_flashes", None)  # the form toggle flashes a message
+
+    response = user_client.get("/store", headers={"If-None-Match": f'W/"{etag}"'})
+    assert response.status_code == 200
+    assert etag_of(response) != etag
+    assert response.get_data() != first.get_data()  # the heart on book 25 flipped
+
+    user_client.post(toggle)  # leave the wishlist as it was
@@ -0,0 +1,94 @@
+import time
+
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+
+import jobs
+
+
+@pytest.fixture()
+def worker(app_module):
+    worker = jobs.Worker(app_module.database_dsn(), stale_after=60, heartbeat=0.05, name="test-worker")
+    worker.connect()
+    with worker.conn.cursor() as cur:
+        cur.execute("TRUNCATE jobs, job_schedules;")
+    yield worker
+    worker.conn.close()
+
+
+def insert_running(worker, kind, attempts, max_attempts):
+    with worker.conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO jobs (kind, status, attempts, max_attempts, locked_by, locked_at)
+            VALUES (%s, 'running', %s, %s, 'gone', now() - interval '2 minutes')
+            RETURNING id;
+            """,
+            (kind, attempts, max_attempts),
+        )
+        return cur.fetchone()["id"]
+
+
+def job_row(worker, job_id):
+    with worker.conn.cursor() as cur:
+        cur.execute("SELECT * FROM jobs WHERE id = %s;", (job_id,))
+        return cur.fetchone()
+
+
+def test_stale_job_with_attempts_left_is_requeued(worker):
+    job_id = insert_running(worker, "covers.variants", 1, 5)
+    worker.requeue_stale()
+    row = job_row(worker, job_id)
+    assert row["status"] == "queued"
+    assert row["locked_by"] is None
+
+
+def test_stale_job_without_attempts_left_fails(worker):
+    job_id = insert_running(worker, "catalog.import", 1, 1)
+    worker.requeue_stale()
+    row = job_row(worker, job_id)
+    assert row["status"] == "failed"
+    assert "stopped responding" in row["last_error"]
+    assert row["finished_at"] is not None
+
+
+def test_heartbeat_keeps_a_long_job_claimed(app_module, worker):
+    seen = {}
+
+    def slow(payload):
+        with psycopg2.connect(app_module.database_dsn(), cursor_factory=RealDictCursor) as conn:
+            with conn.cursor() as cur:
+                # as if the job had been running for an hour
+                cur.execute("UPDATE jobs SET locked_at = now() - interval '1 hour';")
+                conn.commit()
+                time.sleep(0.3)
+                cur.execute("SELECT locked_at > now() - interval '1 second' AS fresh FROM jobs;")
+                seen["fresh"] = cur.fetchone()["fresh"]
+
+    jobs._handlers["test.slow"] = (slow, 1)
+    try:
+        with worker.conn.cursor() as cur:
+            jobs.enqueue(cur, "test.slow")
+        assert worker.run_once()
+    finally:
+        del jobs._handlers["test.slow"]
+    assert seen["fresh"]
+
+
+def test_scheduled_jobs_use_the_handlers_max_attempts(worker):
+    jobs._handlers["test.once"] = (lambda payload: None, 1)
+    try:
+        with worker.conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO job_schedules (name, kind, every_seconds)
+                VALUES ('once', 'test.once', 60), ('unknown', 'test.unknown', 60);
+                """
+            )
+        worker.enqueue_due_schedules()
+        with worker.conn.cursor() as cur:
+            cur.execute("SELECT kind, max_attempts FROM jobs ORDER BY kind;")
+            assert [tuple(r.values()) for r in cur.fetchall()] == [("test.once", 1), ("test.unknown", 5)]
+    finally:
+        del jobs._handlers["test.once"]
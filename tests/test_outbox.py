@@ -0,0 +1,21 @@
+import json
+import time
+
+import outbox
+
+
+def test_resume_sends_records_left_from_a_previous_run(tmp_path):
+    (tmp_path / "1-left.json").write_text(json.dumps({"outbox_id": "left"}))
+    sent = []
+    box = outbox.Outbox(tmp_path, sent.extend, interval=60)
+    box.resume()
+    deadline = time.monotonic() + 5
+    while not sent and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sent == [{"outbox_id": "left"}]
+
+
+def test_resume_with_an_empty_spool_starts_nothing(tmp_path):
+    box = outbox.Outbox(tmp_path, lambda records: None)
+    box.resume()
+    assert box._thread is None
@@ -0,0 +1,41 @@
+import pytest
+
+from pagination import KEYSET_SORTS, encode_cursor, keyset_where
+
+BAD_CURSORS = [[[1, 2], 5], [{"a": 1}, 5], ["abc", 5], [True, 5], ["NaN", 5], [10, True], [10, "5"]]
+
+
+@pytest.mark.parametrize("values", BAD_CURSORS)
+def test_keyset_where_rejects_values_of_the_wrong_type(values):
+    assert keyset_where(KEYSET_SORTS["price_asc"], values) is None
+
+
+def test_keyset_where_checks_each_sort_column():
+    assert keyset_where(KEYSET_SORTS["title_asc"], [12.5, 5]) is None
+    assert keyset_where(KEYSET_SORTS["title_asc"], ["Book 5", 5]) is not None
+    assert keyset_where(KEYSET_SORTS["price_desc"], ["12.50", 5]) is not None
+    assert keyset_where(KEYSET_SORTS["price_desc"], [None, 5]) is not None
+    assert keyset_where(KEYSET_SORTS["newest"], [False]) is None
+
+
+@pytest.mark.parametrize("values", BAD_CURSORS)
+def test_store_falls_back_to_the_first_page(client, values):
+    response = client.get(f"/store?sort=price_asc&after={encode_cursor(values)}")
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("values", BAD_CURSORS)
+def test_api_rejects_malformed_cursor(client, values):
+    response = client.get(f"/api/v1/books?sort=price_asc&after={encode_cursor(values)}")
+    assert response.status_code == 400
+
+
+def test_api_cursor_pages_match_database_order(client):
+    seen, after = [], ""
+    while True:
+        body = client.get(f"/api/v1/books?sort=price_asc&fields=id,price&limit=7&after={after}").get_json()
+        seen += [book["id"] for book in body["data"]]
+        if not body["next"]:
+            break
+        after = body["next"]
+    assert len(seen) == len(set(seen)) == 30
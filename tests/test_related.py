@@ -0,0 +1,71 @@
+import psycopg2
+import pytest
+
+import metrics
+import related
+
+
+@pytest.fixture()
+def statements():
+    return []
+
+
+@pytest.fixture()
+def conn(app_module, statements):
+    cursor = metrics.timed_cursor(psycopg2.extensions.cursor, lambda seconds, sql: statements.append(sql))
+    conn = psycopg2.connect(app_module.database_dsn(), cursor_factory=cursor)
+    yield conn
+    with conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM books WHERE id > 30;")
+    related.rebuild(conn)
+    conn.close()
+
+
+def add_book(conn, title, description, author_id, category_id):
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO books (title, author_id, description, category_id, cover, file)
+            VALUES (%s, %s, %s, %s, '', '') RETURNING id;
+            """,
+            (title, author_id, description, category_id),
+        )
+        return cur.fetchone()[0]
+
+
+def neighbors(conn, book_id):
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT neighbor_id FROM book_neighbors WHERE book_id = %s ORDER BY rank;", (book_id,))
+        return [r[0] for r in cur.fetchall()]
+
+
+def test_rebuild_stores_the_idf_weights(conn):
+    related.rebuild(conn)
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT books FROM related_model;")
+        assert cur.fetchone()[0] == 30
+        cur.execute("SELECT term FROM related_terms WHERE term IN ('a:1', 'c:2', 'w:description');")
+        assert len(cur.fetchall()) == 3
+
+
+def test_refresh_scores_an_edit_without_reading_the_catalog(conn, statements):
+    atlas = add_book(conn, "Harbor Lighthouse Atlas", "lighthouse harbor charts", 2, 2)
+    related.rebuild(conn)
+    secrets = add_book(conn, "Harbor Lighthouse Secrets", "lighthouse harbor keepers", 2, 1)
+
+    statements.clear()
+    assert related.refresh(conn, [secrets]) >= 2
+    assert neighbors(conn, secrets)[0] == atlas
+    assert secrets in neighbors(conn, atlas)[:1]
+    reads = [sql for sql in statements if "FROM books" in sql]
+    assert reads and all("WHERE" in sql for sql in reads)
+    assert not any("related_terms;" in sql for sql in statements)  # the weights stay
+
+
+def test_refresh_before_any_rebuild_fits_the_catalog(conn):
+    with conn, conn.cursor() as cur:
+        cur.execute("TRUNCATE related_model, related_terms;")
+    related.refresh(conn, [1])
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT books FROM related_model;")
+        assert cur.fetchone()[0] == 30
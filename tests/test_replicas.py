@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+import replicas
+from dbpool import get_pool
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return predicate()
+
+
+@pytest.fixture()
+def replica_set(app_module, monkeypatch):
+    # The test database stands in for a replica (lag 0); its own DSN gets its own pool
+    dsn = app_module.with_param(app_module.database_dsn(), "application_name", "replica")
+    rs = replicas.ReplicaSet([dsn], check_interval=0.05, probe_timeout=1)
+    monkeypatch.setattr(app_module, "replica_set", rs)
+    yield rs
+    rs.stop()
+
+
+def test_unreachable_replica_never_blocks_pick():
+    rs = replicas.ReplicaSet(["postgresql://192.0.2.1/x?sslmode=disable"], check_interval=0.05, probe_timeout=1)
+    try:
+        started = time.monotonic()
+        assert rs.pick() is None
+        assert time.monotonic() - started < 0.1
+        assert wait_until(lambda: rs.status()[0]["down"])
+    finally:
+        rs.stop()
+
+
+def test_busy_replica_pool_falls_back_without_marking_it_down(app_module, client, replica_set, monkeypatch):
+    assert wait_until(lambda: replica_set.pick() is not None)
+    pool = get_pool(replica_set.replicas[0].dsn, **app_module.DB_POOL_OPTIONS)
+    monkeypatch.setattr(pool, "timeout", 0.05)
+    held = [pool.getconn() for _ in range(pool.maxconn)]
+    try:
+        assert client.get("/store").status_code == 200
+    finally:
+        for conn in held:
+            conn.close()
+    assert not replica_set.status()[0]["down"]
+    assert replica_set.pick() is not None
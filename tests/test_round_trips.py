@@ -0,0 +1,28 @@
+import pytest
+
+# Each catalog page reads everything it needs in one statement (QueryBatch);
+# /about only shows cached counts. Measured with a warm catalog version clock.
+
+
+@pytest.fixture(autouse=True)
+def warm(client):
+    client.get("/about")
+
+
+@pytest.mark.parametrize(
+    "path",
+    ["/", "/store", "/store?q=book&sort=price_asc", "/store?category_id=1&page=2", "/book/1"],
+)
+def test_catalog_page_is_one_round_trip(app_module, client, queries, path):
+    app_module.catalog_cache.invalidate()
+    for _ in range(2):  # uncached reference data joins the page's statement
+        queries.clear()
+        response = client.get(path)
+        assert response.status_code == 200
+        assert len(queries) == 1, queries
+
+
+def test_warm_about_runs_no_queries(client, queries):
+    response = client.get("/about")
+    assert response.status_code == 200
+    assert queries == []
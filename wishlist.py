@@ -0,0 +1,40 @@
+# Wishlist queries (wishlists table: migrations/). All take the caller's cursor;
+# rows may be plain tuples or RealDictCursor dicts.
+
+
+def toggle(cur, user_id, book_id):
+    """Add or remove one book in a single statement.
+
+    Returns True if the book is now wishlisted, False if it was removed,
+    None if the book does not exist.
+    """
+    cur.execute(
+        """
+        WITH removed AS (
+            DELETE FROM wishlists WHERE user_id = %s AND book_id = %s
+            RETURNING book_id
+        ), added AS (
+            INSERT INTO wishlists (user_id, book_id)
+            SELECT %s, id FROM books
+            WHERE id = %s AND NOT EXISTS (SELECT 1 FROM removed)
+            ON CONFLICT DO NOTHING
+            RETURNING book_id
+        )
+        SELECT EXISTS (SELECT 1 FROM added) AS added,
+               EXISTS (SELECT 1 FROM removed) AS removed;
+        """,
+        (user_id, book_id, user_id, book_id),
+    )
+    row = cur.fetchone()
+    added, removed = (row["added"], row["removed"]) if isinstance(row, dict) else row
+    if not added and not removed:
+        return None
+    return bool(added)
+
+
+def book_ids(cur, user_id):
+    """Every book id on the user's wishlist, as a frozenset."""
+    cur.execute("SELECT book_id FROM wishlists WHERE user_id = %s;", (user_id,))
+    return frozenset(
+        r["book_id"] if isinstance(r, dict) else r[0] for r in cur.fetchall()
+    )